@@ -0,0 +1,554 @@
+"""
+Filesystem backends for File Organizer
+The scan, stat, mkdir, rename, copy and exists calls of a run go through a
+backend, so the same code runs on the local disk, in memory, or with
+simulated network latency
+
+Every backend has the methods of LocalBackend: scandir, stat, exists,
+makedirs, create, rename, copy and remove.
+"""
+
+import errno
+import os
+import random
+import stat
+import threading
+import time
+
+# Cross-device copies: bytes per zero-copy call, and buffer for the fallback
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# errno values meaning "zero-copy not supported here, use a plain copy"
+ZERO_COPY_UNSUPPORTED = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EPERM
+}
+
+def copy_data(source, target, size, offset=0, throttle=None):
+    """
+    Copy file contents from offset to size, in chunks.
+    
+    Tries kernel-side zero-copy calls first (os.copy_file_range, then
+    os.sendfile) and falls back to a buffered copy when the platform or
+    filesystem doesn't support them.
+    
+    Args:
+        source: Open source file (binary)
+        target: Open target file (binary)
+        size: Number of bytes the finished copy should have
+        offset: Byte offset to start (or resume) from
+        throttle: Optional Throttle; each chunk waits for its byte tokens,
+            and chunks shrink to a fraction of a second's budget
+        
+    Returns:
+        Name of the copy strategy that was used
+    """
+    import shutil
+    
+    src_fd = source.fileno()
+    dst_fd = target.fileno()
+    chunk_size = COPY_CHUNK_SIZE
+    if throttle is not None and throttle.chunk_size:
+        chunk_size = min(chunk_size, throttle.chunk_size)
+    
+    def copy_chunks(copy, offset):
+        while offset < size:
+            count = min(chunk_size, size - offset)
+            if throttle is not None:
+                throttle.transfer(count)
+                start = time.perf_counter()
+            copied = copy(count, offset)
+            if throttle is not None:
+                throttle.observe('copy', time.perf_counter() - start)
+            if copied == 0:
+                break
+            offset += copied
+    
+    if hasattr(os, 'copy_file_range'):
+        try:
+            copy_chunks(lambda count, offset: os.copy_file_range(src_fd, dst_fd, count, offset, offset),
+                        offset)
+            return 'copy_file_range'
+        except OSError as e:
+            if e.errno not in ZERO_COPY_UNSUPPORTED:
+                raise
+    
+    if hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            copy_chunks(lambda count, offset: os.sendfile(dst_fd, src_fd, offset, count), offset)
+            return 'sendfile'
+        except OSError as e:
+            if e.errno not in ZERO_COPY_UNSUPPORTED:
+                raise
+    
+    source.seek(offset)
+    target.seek(offset)
+    if throttle is None:
+        shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+    else:
+        copy_chunks(lambda count, offset: target.write(source.read(count)), offset)
+    return 'copy'
+
+def check_unchanged(record, source):
+    """
+    Make sure an opened source file still matches its scan.
+    
+    Args:
+        record: FileRecord from the scan
+        source: Open source file
+    
+    Raises:
+        OSError: If the file's size or mtime changed since it was scanned
+    """
+    st = os.fstat(source.fileno())
+    if st.st_size != record.size or st.st_mtime_ns != record.mtime_ns:
+        raise OSError(errno.EAGAIN, "File changed since it was scanned", record.path)
+
+def partial_copy_path(record, destination):
+    """
+    Get the temporary path used while copying a file across filesystems.
+    
+    The name depends on the source file identity rather than the chosen
+    destination name, so a later run finds it again and can resume.
+    """
+    folder = os.path.dirname(destination)
+    return os.path.join(folder, f".{record.name}.{record.device}-{record.inode}.part")
+
+class LocalBackend:
+    """The local disk, through os and shutil."""
+    
+    def scandir(self, path):
+        """
+        List a folder.
+        
+        Returns:
+            Context manager yielding os.DirEntry-like entries (name, path,
+            is_file(), is_dir(), is_symlink(), stat())
+        """
+        return os.scandir(path)
+    
+    def stat(self, path, follow_symlinks=True):
+        """Get an os.stat_result for a path."""
+        return os.stat(path, follow_symlinks=follow_symlinks)
+    
+    def exists(self, path, follow_symlinks=True):
+        """Check whether a path exists (a dangling symlink counts without following)."""
+        if follow_symlinks:
+            return os.path.exists(path)
+        return os.path.lexists(path)
+    
+    def makedirs(self, path):
+        """Create a folder and its parents, if missing."""
+        os.makedirs(path, exist_ok=True)
+    
+    def create(self, path):
+        """
+        Create an empty file, failing if the path is taken.
+        
+        Raises:
+            FileExistsError: If something already exists at the path
+        """
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+    
+    def rename(self, source, destination):
+        """
+        Rename a file, replacing the destination.
+        
+        Raises:
+            OSError: With errno.EXDEV if the paths are on different filesystems
+        """
+        os.replace(source, destination)
+    
+    def copy(self, record, destination, throttle=None):
+        """
+        Copy a file to another filesystem, leaving the source.
+        
+        Data goes to a hidden .part file first. If one is left over from an
+        interrupted run and the source hasn't changed since, the copy resumes
+        from its current size. Permissions and timestamps are preserved, and
+        symlinks are recreated as links.
+        
+        The source must still have the size and mtime it was scanned with,
+        before and after the copy, and the copy must have exactly that many
+        bytes; otherwise nothing is put in place and the source is kept.
+        
+        Args:
+            record: FileRecord of the source
+            destination: Final target path (a claimed placeholder)
+            throttle: Optional Throttle for the copied bytes
+            
+        Returns:
+            Name of the copy strategy that was used
+        
+        Raises:
+            OSError: If the copy fails or the source changed during the move
+        """
+        import shutil
+        
+        source_path = record.path
+        part_path = partial_copy_path(record, destination)
+        
+        if os.path.islink(source_path):
+            # Recreate the link itself on the other filesystem
+            os.symlink(os.readlink(source_path), part_path)
+            os.replace(part_path, destination)
+            return 'symlink'
+        
+        offset = 0
+        try:
+            st = os.stat(part_path)
+            if st.st_size <= record.size and st.st_mtime_ns >= record.mtime_ns:
+                offset = st.st_size
+        except FileNotFoundError:
+            pass
+        
+        with open(source_path, 'rb') as source:
+            check_unchanged(record, source)
+            mode = 'r+b' if offset else 'wb'
+            with open(part_path, mode) as target:
+                strategy = copy_data(source, target, record.size, offset, throttle)
+                copied = os.fstat(target.fileno()).st_size
+            try:
+                check_unchanged(record, source)
+                if copied != record.size:
+                    raise OSError(errno.EIO, f"Copied {copied} of {record.size} bytes", source_path)
+            except OSError:
+                os.remove(part_path)
+                raise
+        
+        shutil.copystat(source_path, part_path)
+        os.replace(part_path, destination)
+        return strategy
+    
+    def remove(self, path):
+        """Delete a file."""
+        os.remove(path)
+
+LOCAL_FS = LocalBackend()
+
+class MemoryEntries:
+    """
+    Listing of an in-memory folder, used like os.scandir().
+    
+    Names are copied when the listing starts, so files can be moved
+    while it is read, as with a real directory.
+    """
+    
+    def __init__(self, backend, folder, names):
+        self.backend = backend
+        self.folder = folder
+        self.names = names
+    
+    def __iter__(self):
+        for name in self.names:
+            path = os.path.join(self.folder, name)
+            if self.backend.exists(path):
+                yield MemoryEntry(self.backend, name, path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        pass
+
+class MemoryEntry:
+    """One entry of a MemoryEntries listing, like os.DirEntry."""
+    
+    __slots__ = ('backend', 'name', 'path')
+    
+    def __init__(self, backend, name, path):
+        self.backend = backend
+        self.name = name
+        self.path = path
+    
+    def is_file(self, follow_symlinks=True):
+        return self.path in self.backend.files
+    
+    def is_dir(self, follow_symlinks=True):
+        return self.path in self.backend.folders
+    
+    def is_symlink(self):
+        return False
+    
+    def stat(self, follow_symlinks=True):
+        return self.backend.stat(self.path)
+
+class MemoryBackend:
+    """
+    A filesystem kept in dictionaries, for benchmarks and tests.
+    
+    Files have a size, mtime, inode and device but no contents, so a
+    million-file folder takes a few hundred MB and no disk at all.
+    Folders can be given their own device id to make renames between
+    them fail with EXDEV, like separate mounts. There are no symlinks.
+    """
+    
+    def __init__(self, device=1):
+        """
+        Args:
+            device: Device id of the root folder
+        """
+        self.files = {}
+        self.folders = {os.sep: {}}
+        self.devices = {os.sep: device}
+        self.lock = threading.RLock()
+        self.next_inode = 2
+        self.clock = time.time_ns()
+    
+    def _inode(self):
+        self.next_inode += 1
+        return self.next_inode
+    
+    def _parent(self, path):
+        folder, name = os.path.split(path)
+        names = self.folders.get(folder)
+        if names is None:
+            raise FileNotFoundError(errno.ENOENT, "No such folder", folder)
+        return names, name
+    
+    def _device(self, folder):
+        while folder not in self.devices:
+            folder = os.path.dirname(folder)
+        return self.devices[folder]
+    
+    def add_file(self, path, size=0, mtime_ns=None):
+        """
+        Create a file (and its folders) directly, for building test trees.
+        
+        Args:
+            path: Absolute file path
+            size: Size in bytes
+            mtime_ns: Modification time (default: the backend's clock)
+        """
+        path = os.path.normpath(path)
+        with self.lock:
+            self.makedirs(os.path.dirname(path))
+            names, name = self._parent(path)
+            names[name] = None
+            device = self._device(os.path.dirname(path))
+            self.files[path] = [size, mtime_ns or self.clock, self._inode(), device]
+    
+    def scandir(self, path):
+        path = os.path.normpath(path)
+        with self.lock:
+            names = self.folders.get(path)
+            if names is None:
+                if path in self.files:
+                    raise NotADirectoryError(errno.ENOTDIR, "Not a folder", path)
+                raise FileNotFoundError(errno.ENOENT, "No such folder", path)
+            return MemoryEntries(self, path, list(names))
+    
+    def stat(self, path, follow_symlinks=True):
+        path = os.path.normpath(path)
+        with self.lock:
+            info = self.files.get(path)
+            if info is not None:
+                size, mtime_ns, inode, device = info
+                mode = stat.S_IFREG | 0o644
+            elif path in self.folders:
+                size, mtime_ns, inode, device = 0, self.clock, hash(path) & 0xFFFFFFFF, self._device(path)
+                mode = stat.S_IFDIR | 0o755
+            else:
+                raise FileNotFoundError(errno.ENOENT, "No such file or folder", path)
+        seconds = mtime_ns // 10 ** 9
+        return os.stat_result(
+            (mode, inode, device, 1, 0, 0, size, seconds, seconds, seconds),
+            {'st_mtime_ns': mtime_ns}
+        )
+    
+    def exists(self, path, follow_symlinks=True):
+        path = os.path.normpath(path)
+        return path in self.files or path in self.folders
+    
+    def makedirs(self, path, device=None):
+        """
+        Create a folder and its parents, if missing.
+        
+        Args:
+            path: Folder path
+            device: Device id for a new folder (default: its parent's)
+        """
+        path = os.path.normpath(path)
+        with self.lock:
+            if path in self.files:
+                raise FileExistsError(errno.EEXIST, "A file is in the way", path)
+            if path in self.folders:
+                return
+            self.makedirs(os.path.dirname(path))
+            names, name = self._parent(path)
+            names[name] = None
+            self.folders[path] = {}
+            if device is not None:
+                self.devices[path] = device
+    
+    def create(self, path):
+        path = os.path.normpath(path)
+        with self.lock:
+            names, name = self._parent(path)
+            if name in names:
+                raise FileExistsError(errno.EEXIST, "File exists", path)
+            names[name] = None
+            self.files[path] = [0, self.clock, self._inode(), self._device(os.path.dirname(path))]
+    
+    def rename(self, source, destination):
+        source = os.path.normpath(source)
+        destination = os.path.normpath(destination)
+        with self.lock:
+            info = self.files.get(source)
+            if info is None:
+                raise FileNotFoundError(errno.ENOENT, "No such file", source)
+            names, name = self._parent(destination)
+            if destination in self.folders:
+                raise IsADirectoryError(errno.EISDIR, "Is a folder", destination)
+            if info[3] != self._device(os.path.dirname(destination)):
+                raise OSError(errno.EXDEV, "Cross-device link", source)
+            
+            source_names, source_name = self._parent(source)
+            del source_names[source_name]
+            del self.files[source]
+            names[name] = None
+            self.files[destination] = info
+    
+    def copy(self, record, destination, throttle=None):
+        destination = os.path.normpath(destination)
+        with self.lock:
+            info = self.files.get(os.path.normpath(record.path))
+            if info is None:
+                raise FileNotFoundError(errno.ENOENT, "No such file", record.path)
+            size, mtime_ns = info[0], info[1]
+        if throttle is not None:
+            throttle.transfer(size)
+        with self.lock:
+            names, name = self._parent(destination)
+            names[name] = None
+            device = self._device(os.path.dirname(destination))
+            self.files[destination] = [size, mtime_ns, self._inode(), device]
+        return 'copy'
+    
+    def remove(self, path):
+        path = os.path.normpath(path)
+        with self.lock:
+            if path not in self.files:
+                raise FileNotFoundError(errno.ENOENT, "No such file", path)
+            names, name = self._parent(path)
+            del names[name]
+            del self.files[path]
+
+class LatencyBackend:
+    """
+    Wrap a backend and make every call take longer, like a network mount.
+    
+    Each call sleeps for its configured latency (plus optional jitter
+    from a seeded generator) before being passed on, and is counted;
+    stat() on a listed entry counts as a stat call. With
+    no jitter, the same run always waits the same, so the effect of
+    workers and other concurrency settings can be measured on a laptop.
+    """
+    
+    CALLS = ('scandir', 'stat', 'exists', 'makedirs', 'create', 'rename', 'copy', 'remove')
+    
+    def __init__(self, backend, latency=0.0, latencies=None, jitter=0.0, seed=0):
+        """
+        Args:
+            backend: Backend to pass calls on to
+            latency: Seconds added to every call
+            latencies: Dictionary of call name -> seconds, overriding latency
+            jitter: Up to this many extra seconds per call, at random
+            seed: Seed for the jitter
+        """
+        unknown = set(latencies or ()) - set(self.CALLS)
+        if unknown:
+            raise ValueError(f"Unknown backend calls: {', '.join(sorted(unknown))}")
+        self.backend = backend
+        self.latencies = {name: latency for name in self.CALLS}
+        self.latencies.update(latencies or {})
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.counts = {name: 0 for name in self.CALLS}
+        self.lock = threading.Lock()
+    
+    def _wait(self, name):
+        delay = self.latencies[name]
+        with self.lock:
+            self.counts[name] += 1
+            if self.jitter:
+                delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+    
+    def scandir(self, path):
+        self._wait('scandir')
+        return LatencyEntries(self, self.backend.scandir(path))
+    
+    def stat(self, path, follow_symlinks=True):
+        self._wait('stat')
+        return self.backend.stat(path, follow_symlinks)
+    
+    def exists(self, path, follow_symlinks=True):
+        self._wait('exists')
+        return self.backend.exists(path, follow_symlinks)
+    
+    def makedirs(self, path):
+        self._wait('makedirs')
+        self.backend.makedirs(path)
+    
+    def create(self, path):
+        self._wait('create')
+        self.backend.create(path)
+    
+    def rename(self, source, destination):
+        self._wait('rename')
+        self.backend.rename(source, destination)
+    
+    def copy(self, record, destination, throttle=None):
+        self._wait('copy')
+        return self.backend.copy(record, destination, throttle)
+    
+    def remove(self, path):
+        self._wait('remove')
+        self.backend.remove(path)
+
+class LatencyEntries:
+    """Listing from a LatencyBackend, whose entries wait on stat()."""
+    
+    def __init__(self, backend, entries):
+        self.backend = backend
+        self.entries = entries
+    
+    def __iter__(self):
+        for entry in self.entries:
+            yield LatencyEntry(self.backend, entry)
+    
+    def __enter__(self):
+        self.entries.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        return self.entries.__exit__(*exc_info)
+
+class LatencyEntry:
+    """One entry of a LatencyEntries listing."""
+    
+    __slots__ = ('backend', 'entry', 'name', 'path')
+    
+    def __init__(self, backend, entry):
+        self.backend = backend
+        self.entry = entry
+        self.name = entry.name
+        self.path = entry.path
+    
+    def is_file(self, follow_symlinks=True):
+        return self.entry.is_file(follow_symlinks=follow_symlinks)
+    
+    def is_dir(self, follow_symlinks=True):
+        return self.entry.is_dir(follow_symlinks=follow_symlinks)
+    
+    def is_symlink(self):
+        return self.entry.is_symlink()
+    
+    def stat(self, follow_symlinks=True):
+        self.backend._wait('stat')
+        return self.entry.stat(follow_symlinks=follow_symlinks)
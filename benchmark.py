@@ -0,0 +1,401 @@
+"""
+Benchmark for File Organizer
+Times each stage (scan, categorize, unique names, move, report) on a
+generated folder tree and saves the results as JSON; with --max-memory,
+also checks that a run stays under its memory ceiling. The tree can live
+in memory instead of on disk, with optional simulated latency per call
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import organizer
+from backends import LatencyBackend, MemoryBackend
+from config import FILE_CATEGORIES
+
+# Share of generated files per category, roughly what a Downloads folder looks like
+EXTENSION_MIX = {
+    'Images': 0.30,
+    'Documents': 0.25,
+    'Videos': 0.05,
+    'Audio': 0.08,
+    'Archives': 0.07,
+    'Code': 0.10,
+    'Executables': 0.03,
+    'Books': 0.02,
+    'Other': 0.10,
+}
+
+# Extensions used for the 'Other' share
+UNKNOWN_EXTENSIONS = ['.dat', '.bin', '.tmp', '.log', '']
+
+# Base names that collide often (camera and scanner defaults, browser copies)
+COMMON_NAMES = ['IMG_0001', 'scan', 'document', 'download', 'image', 'report (1)', 'untitled']
+
+# --backend choices
+BACKENDS = ('disk', 'memory')
+
+def generate_tree(root, files, depth=0, folders_per_level=4, collisions=0.3, file_size=0, seed=1,
+                  fs=None):
+    """
+    Create a synthetic folder tree with files to organize.
+    
+    Args:
+        root: Empty folder to fill
+        files: Number of files to create
+        depth: Subfolder levels below root (0 = flat)
+        folders_per_level: Subfolders per folder when depth > 0
+        collisions: Share of files using one of a few common names
+        file_size: Bytes written to each file
+        seed: Random seed, so runs are comparable
+        fs: Optional MemoryBackend to create the tree in instead of on disk
+    
+    Returns:
+        List of folders that received files
+    """
+    rng = random.Random(seed)
+    if fs is not None:
+        fs.makedirs(root)
+    
+    folders = [root]
+    level = [root]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(folders_per_level):
+                folder = os.path.join(parent, f"sub{i}")
+                if fs is not None:
+                    fs.makedirs(folder)
+                else:
+                    os.makedirs(folder, exist_ok=True)
+                next_level.append(folder)
+        folders.extend(next_level)
+        level = next_level
+    
+    categories = list(EXTENSION_MIX)
+    weights = [EXTENSION_MIX[category] for category in categories]
+    data = b'x' * file_size
+    
+    for i in range(files):
+        category = rng.choices(categories, weights)[0]
+        if category == 'Other':
+            extension = rng.choice(UNKNOWN_EXTENSIONS)
+        else:
+            extension = rng.choice(FILE_CATEGORIES[category])
+        
+        if rng.random() < collisions:
+            stem = rng.choice(COMMON_NAMES)
+        else:
+            stem = f"file_{i:07d}"
+        
+        folder = rng.choice(folders)
+        path = os.path.join(folder, stem + extension)
+        if fs is not None:
+            if fs.exists(path):
+                path = os.path.join(folder, f"{stem}_{i}{extension}")
+            fs.add_file(path, file_size)
+            continue
+        if os.path.exists(path):
+            path = os.path.join(folder, f"{stem}_{i}{extension}")
+        with open(path, 'wb') as f:
+            f.write(data)
+    
+    return folders
+
+def timed(results, stage, count, func, *args, **kwargs):
+    """
+    Run one stage and record its wall time.
+    
+    Returns:
+        Whatever func returned
+    """
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    results[stage] = {
+        'seconds': round(seconds, 4),
+        'files': count,
+        'files_per_sec': round(count / seconds) if seconds > 0 else None,
+    }
+    print(f"  {stage:<20} {seconds:9.3f}s  {results[stage]['files_per_sec'] or 0:>10} files/s")
+    return value
+
+def git_commit():
+    """Get the current commit hash, or None outside a git checkout."""
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        )
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(files, depth=0, collisions=0.3, file_size=0, workers=1, seed=1, keep=False,
+                  backend='disk', latency=0.0, engine='sync'):
+    """
+    Generate a tree and time each organizer stage on it.
+    
+    With the memory backend, the tree only exists in a MemoryBackend, so
+    the stages are timed without the disk; a latency adds that many
+    seconds to every filesystem call of the timed stages, like a network
+    mount, to show how well workers hide it. With the async engine,
+    scanning, classification, names and moves are timed together as
+    one 'pipeline' stage.
+    
+    Args:
+        files: Number of files to generate
+        depth: Subfolder levels (scan is recursive when > 0)
+        collisions: Share of files with a common name
+        file_size: Bytes per file
+        workers: Worker threads for move_files (in-flight calls for the async engine)
+        seed: Random seed
+        keep: If True, don't delete the temporary tree
+        backend: 'disk' or 'memory'
+        latency: Seconds added to each filesystem call
+        engine: 'sync' or 'async'
+    
+    Returns:
+        Dictionary of stage name -> timing
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    
+    root = tempfile.mkdtemp(prefix='organizer-bench-')
+    memory = MemoryBackend() if backend == 'memory' else None
+    fs = memory or organizer.LOCAL_FS
+    if latency:
+        fs = LatencyBackend(fs, latency)
+    results = {}
+    try:
+        where = 'in memory' if memory is not None else f"in {root}"
+        print(f"\n🏗️  Generating {files} files (depth {depth}) {where}")
+        start = time.perf_counter()
+        generate_tree(
+            root, files, depth, collisions=collisions, file_size=file_size, seed=seed, fs=memory
+        )
+        print(f"  generated in {time.perf_counter() - start:.1f}s\n")
+        
+        recursive = depth > 0
+        exclude = list(FILE_CATEGORIES) + ['Other']
+        
+        if engine == 'async':
+            # All stages at once; --workers is the in-flight limit
+            options = organizer.Options(recursive=recursive, engine='async', in_flight=workers)
+            operations = timed(
+                results, 'pipeline', files,
+                lambda: list(organizer.iter_pipeline(root, options, fs=fs))
+            )
+        else:
+            records = timed(
+                results, 'scan_folder', files,
+                lambda: list(organizer.iter_files(root, recursive=recursive, exclude=exclude, fs=fs))
+            )
+            categorized = timed(results, 'categorize_files', len(records), organizer.categorize_files, records)
+            
+            def allocate_names():
+                name_index = organizer.NameIndex(fs)
+                for category, category_records in categorized.items():
+                    folder = os.path.join(root, category)
+                    for record in category_records:
+                        organizer.get_unique_filename(os.path.join(folder, record.name), name_index)
+            
+            timed(results, 'get_unique_filename', len(records), allocate_names)
+            
+            def move():
+                organizer.create_category_folders(root, list(categorized), fs)
+                return organizer.move_files(categorized, root, workers=workers, fs=fs)
+            
+            operations = timed(results, 'move_files', len(records), move)
+        
+        def report():
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                organizer.generate_report(operations, os.path.join(root, 'report.csv'))
+        
+        timed(results, 'generate_report', len(operations), report)
+        
+        failed = sum(1 for operation in operations if operation.status != 'Success')
+        if failed:
+            print(f"\n⚠️  {failed} moves failed")
+        if latency:
+            calls = sum(fs.counts.values())
+            print(f"\n🐌 {calls} filesystem calls at {latency * 1000:g} ms each")
+    finally:
+        if keep:
+            print(f"\n📁 Kept tree: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    return results
+
+def measure_memory(files, max_memory=None, depth=0, collisions=0.3, seed=1):
+    """
+    Organize a generated tree and measure the peak memory Python allocated.
+    
+    The report is written too, outside the tree, like a normal run.
+    
+    Args:
+        files: Number of files to generate
+        max_memory: Memory ceiling in MB (None = normal in-memory run)
+        depth: Subfolder levels (scan is recursive when > 0)
+        collisions: Share of files with a common name
+        seed: Random seed
+    
+    Returns:
+        Peak traced bytes during organize()
+    """
+    root = tempfile.mkdtemp(prefix='organizer-bench-')
+    try:
+        tree = os.path.join(root, 'tree')
+        os.mkdir(tree)
+        generate_tree(tree, files, depth, collisions=collisions, seed=seed)
+        options = organizer.Options(
+            recursive=depth > 0,
+            max_memory=max_memory,
+            report=os.path.join(root, 'report.csv')
+        )
+        
+        tracemalloc.start()
+        try:
+            organizer.organize(tree, options)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    
+    return peak
+
+def check_memory(files, max_memory, depth=0, collisions=0.3, seed=1):
+    """
+    Check that a run with a memory ceiling stays under it.
+    
+    Measures the same tree with and without the ceiling, so the result
+    also shows how much the in-memory run needs at this size.
+    
+    Returns:
+        Dictionary with both peaks, the ceiling and whether it held
+    """
+    ceiling = int(max_memory * 1024 * 1024)
+    print(f"\n🧠 Memory check: {files} files, ceiling {max_memory:g} MB")
+    
+    peak = measure_memory(files, None, depth, collisions, seed)
+    print(f"  {'in memory':<20} {peak / 1024 / 1024:9.1f} MB")
+    bounded = measure_memory(files, max_memory, depth, collisions, seed)
+    print(f"  {'--max-memory':<20} {bounded / 1024 / 1024:9.1f} MB")
+    
+    held = bounded <= ceiling
+    print(f"  {'✅ ceiling held' if held else '❌ ceiling exceeded'}")
+    return {
+        'max_memory_bytes': ceiling,
+        'peak_bytes': peak,
+        'bounded_peak_bytes': bounded,
+        'held': held,
+    }
+
+def compare(results, baseline_path):
+    """Print how each stage changed against an earlier results file."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    
+    print(f"\n📈 Compared with {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for stage, timing in results['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old or not old['seconds']:
+            continue
+        ratio = timing['seconds'] / old['seconds']
+        print(f"  {stage:<20} {old['seconds']:9.3f}s → {timing['seconds']:9.3f}s  ({ratio:.2f}x)")
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(
+        description='⏱️  File Organizer benchmark - time each stage on a synthetic tree',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark.py --files 10000
+  python benchmark.py --files 100000 --depth 3 --workers 8
+  python benchmark.py --files 100000 --compare reports/benchmark-old.json
+  python benchmark.py --files 1000000 --max-memory 32
+  python benchmark.py --files 1000000 --backend memory
+  python benchmark.py --files 2000 --backend memory --latency 2 --workers 16
+  python benchmark.py --files 2000 --backend memory --latency 2 --engine async --workers 64
+        """
+    )
+    parser.add_argument('--files', type=int, default=10000, help='Files to generate (default: 10000)')
+    parser.add_argument('--depth', type=int, default=0, help='Subfolder levels, 0 = flat (default: 0)')
+    parser.add_argument('--collisions', type=float, default=0.3,
+                        help='Share of files with a common name (default: 0.3)')
+    parser.add_argument('--file-size', type=int, default=0, help='Bytes per file (default: 0)')
+    parser.add_argument('--workers', type=int, default=1, help='Workers for move_files (default: 1)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--output', default='./reports/benchmark.json',
+                        help='Results file (default: ./reports/benchmark.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--keep', action='store_true', help="Don't delete the generated tree")
+    parser.add_argument('--max-memory', type=float, default=None, metavar='MB',
+                        help='Also check that a run with this memory ceiling stays under it; '
+                             'exits with status 1 if not')
+    parser.add_argument('--backend', choices=BACKENDS, default='disk',
+                        help='Where the generated tree lives (default: disk)')
+    parser.add_argument('--latency', type=float, default=0.0, metavar='MS',
+                        help='Milliseconds added to every filesystem call (default: 0)')
+    parser.add_argument('--engine', choices=organizer.ENGINES, default='sync',
+                        help='Run the stages one after another or all at once (default: sync)')
+    args = parser.parse_args()
+    
+    stages = run_benchmark(
+        args.files, args.depth, args.collisions, args.file_size, args.workers, args.seed, args.keep,
+        args.backend, args.latency / 1000, args.engine
+    )
+    
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'files': args.files,
+            'depth': args.depth,
+            'collisions': args.collisions,
+            'file_size': args.file_size,
+            'workers': args.workers,
+            'seed': args.seed,
+            'backend': args.backend,
+            'latency_ms': args.latency,
+            'engine': args.engine,
+        },
+        'stages': stages,
+    }
+    if args.max_memory:
+        results['params']['max_memory'] = args.max_memory
+        results['memory'] = check_memory(
+            args.files, args.max_memory, args.depth, args.collisions, args.seed
+        )
+    
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Results saved: {args.output}")
+    
+    if args.compare:
+        compare(results, args.compare)
+    
+    if args.max_memory and not results['memory']['held']:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,178 @@ FILE_CATEGORIES = {
     ],
 }
 
+# Content signatures used when a file's extension is missing or unknown.
+# Each entry is (category, [(offset, bytes), ...]); every pattern must
+# match. An offset of None means "anywhere in the header". Entries are
+# checked in order, so specific ones (e.g. OOXML) come before generic
+# ones (plain ZIP).
+CONTENT_SIGNATURES = [
+    ('Documents', [(0, b'%PDF-')]),
+    ('Documents', [(0, b'{\\rtf')]),
+    ('Books', [(0, b'PK\x03\x04'), (None, b'application/epub+zip')]),
+    ('Documents', [(0, b'PK\x03\x04'), (None, b'[Content_Types].xml')]),
+    ('Documents', [(0, b'PK\x03\x04'), (None, b'application/vnd.oasis.opendocument')]),
+    ('Executables', [(0, b'PK\x03\x04'), (None, b'AndroidManifest.xml')]),
+    ('Archives', [(0, b'PK\x03\x04')]),
+    ('Images', [(0, b'\x89PNG\r\n\x1a\n')]),
+    ('Images', [(0, b'\xff\xd8\xff')]),
+    ('Images', [(0, b'GIF87a')]),
+    ('Images', [(0, b'GIF89a')]),
+    ('Images', [(0, b'RIFF'), (8, b'WEBP')]),
+    ('Images', [(4, b'ftypheic')]),
+    ('Images', [(0, b'8BPS')]),
+    ('Audio', [(0, b'RIFF'), (8, b'WAVE')]),
+    ('Audio', [(4, b'ftypM4A')]),
+    ('Audio', [(0, b'ID3')]),
+    ('Audio', [(0, b'\xff\xfb')]),
+    ('Audio', [(0, b'\xff\xf3')]),
+    ('Audio', [(0, b'\xff\xf2')]),
+    ('Audio', [(0, b'fLaC')]),
+    ('Audio', [(0, b'OggS')]),
+    ('Videos', [(0, b'RIFF'), (8, b'AVI ')]),
+    ('Videos', [(4, b'ftyp')]),
+    ('Videos', [(0, b'\x1a\x45\xdf\xa3')]),
+    ('Executables', [(0, b'\x7fELF')]),
+    ('Executables', [(0, b'MZ')]),
+    ('Executables', [(0, b'\xcf\xfa\xed\xfe')]),
+    ('Executables', [(0, b'\xce\xfa\xed\xfe')]),
+    ('Archives', [(0, b'\x1f\x8b')]),
+    ('Archives', [(0, b'BZh')]),
+    ('Archives', [(0, b'\xfd7zXZ\x00')]),
+    ('Archives', [(0, b"7z\xbc\xaf'\x1c")]),
+    ('Archives', [(0, b'Rar!\x1a\x07')]),
+    ('Archives', [(257, b'ustar')]),
+    ('Code', [(0, b'#!')]),
+]
+
+# Rules that send files somewhere other than their extension category.
+# Checked in order after classification; the first matching rule picks
+# the destination folder (relative to the organized folder, '/' allowed,
+# no '..' or absolute paths).
+# Every condition given must hold:
+#   category         - category from the extension (or content sniffing)
+#   min_size/max_size - bytes, or a string like '2 GB'
+#   older_than_days/newer_than_days - by modification time
+#   glob / regex     - matched against the file name
+#   subdir           - glob matched against the source folder relative to
+#                      the organized folder ('' for the folder itself)
+# Can be replaced at run time with --rules rules.json (same format).
+RULES = [
+    # {'category': 'Videos', 'min_size': '2 GB', 'destination': 'Videos/Large'},
+    # {'older_than_days': 90, 'destination': 'Archive'},
+    # {'glob': 'Screenshot*', 'destination': 'Images/Screenshots'},
+]
+
+class ExtensionClassifier:
+    """
+    Map file names to categories using a reverse suffix index.
+    
+    The index is built once from a category table, so classifying a file
+    is a handful of dict lookups instead of a scan over every category.
+    Multi-part suffixes such as '.tar.gz' are matched longest-first.
+    """
+    
+    def __init__(self, categories, default='Other', strict=False):
+        """
+        Build the suffix index.
+        
+        Args:
+            categories: Dictionary of category name -> list of extensions
+            default: Category returned when nothing matches
+            strict: If True, raise ValueError on conflicting mappings
+            
+        Raises:
+            ValueError: If strict and an extension maps to two categories
+        """
+        self.default = default
+        self.index = {}
+        self.conflicts = []
+        self.max_parts = 1
+        
+        for category, extensions in categories.items():
+            for extension in extensions:
+                suffix = extension.lower()
+                if not suffix.startswith('.'):
+                    suffix = '.' + suffix
+                
+                existing = self.index.get(suffix)
+                if existing is not None and existing != category:
+                    # First category wins, same as the old linear scan
+                    self.conflicts.append((suffix, existing, category))
+                    continue
+                
+                self.index[suffix] = category
+                self.max_parts = max(self.max_parts, suffix.count('.'))
+        
+        if strict and self.conflicts:
+            details = ', '.join(
+                f"{suffix} ({first} vs {second})"
+                for suffix, first, second in self.conflicts
+            )
+            raise ValueError(f"Conflicting extension mappings: {details}")
+    
+    def classify(self, filename):
+        """
+        Get the category for a single file name.
+        
+        Args:
+            filename: File name (e.g., 'backup.tar.gz')
+            
+        Returns:
+            Category name or the default if not found
+        """
+        name = filename.lower()
+        
+        # Like os.path.splitext, leading dots do not start an extension
+        start = 0
+        while start < len(name) and name[start] == '.':
+            start += 1
+        
+        # Collect up to max_parts dot positions from the right
+        dots = []
+        end = len(name)
+        while len(dots) < self.max_parts:
+            dot = name.rfind('.', start, end)
+            if dot < 0:
+                break
+            dots.append(dot)
+            end = dot
+        
+        # Longest suffix first
+        for dot in reversed(dots):
+            category = self.index.get(name[dot:])
+            if category is not None:
+                return category
+        
+        return self.default
+    
+    def classify_many(self, filenames):
+        """
+        Classify a batch of file names.
+        
+        Args:
+            filenames: Iterable of file names
+            
+        Returns:
+            List of category names in the same order
+        """
+        classify = self.classify
+        return [classify(filename) for filename in filenames]
+
+_classifier = None
+
+def get_classifier():
+    """
+    Get the shared classifier built from FILE_CATEGORIES.
+    
+    Returns:
+        ExtensionClassifier instance (built on first use)
+    """
+    global _classifier
+    if _classifier is None:
+        _classifier = ExtensionClassifier(FILE_CATEGORIES)
+    return _classifier
+
 def get_category(extension):
     """
     Get the category for a file extension.
@@ -48,10 +220,4 @@ def get_category(extension):
     Returns:
         Category name or 'Other' if not found
     """
-    extension = extension.lower()
-    
-    for category, extensions in FILE_CATEGORIES.items():
-        if extension in extensions:
-            return category
-    
-    return 'Other'
+    return get_classifier().index.get(extension.lower(), 'Other')
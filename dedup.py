@@ -0,0 +1,144 @@
+"""
+Duplicate detection for File Organizer
+Finds byte-identical files before they are moved
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start and the end of a file for the quick check
+SAMPLE_SIZE = 64 * 1024
+
+# Bytes hashed per update when hashing a whole file
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+DUPLICATE_ACTIONS = ('keep', 'skip', 'hardlink', 'report')
+
+def sample_digest(path, size):
+    """
+    Hash the first and last SAMPLE_SIZE bytes of a file.
+    
+    Args:
+        path: File path
+        size: File size from the scan
+    
+    Returns:
+        Hex digest (covers the whole file if it is small)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if size > 2 * SAMPLE_SIZE:
+            f.seek(-SAMPLE_SIZE, os.SEEK_END)
+        digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+def full_digest(path):
+    """
+    Hash a whole file through a read-only memory map.
+    
+    Args:
+        path: File path
+    
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for start in range(0, len(view), HASH_CHUNK_SIZE):
+                    digest.update(view[start:start + HASH_CHUNK_SIZE])
+    return digest.hexdigest()
+
+def group_by(records, key, pool):
+    """
+    Split records into groups by a hash function run on the pool.
+    
+    Records whose hash fails (e.g. deleted or unreadable) are dropped.
+    
+    Returns:
+        List of groups with more than one record
+    """
+    groups = {}
+    results = pool.map(lambda record: safe_call(key, record), records)
+    for record, value in zip(records, results):
+        if value is not None:
+            groups.setdefault(value, []).append(record)
+    return [group for group in groups.values() if len(group) > 1]
+
+def safe_call(key, record):
+    """Run a hash function, logging instead of raising on I/O errors."""
+    try:
+        return key(record)
+    except (OSError, ValueError) as e:
+        logger.error("Error hashing %s: %s", record.path, e)
+        return None
+
+def keep_order(record):
+    """Sort key preferring the shortest name, e.g. 'report.pdf' over 'report (1).pdf'."""
+    return (len(record.name), record.path)
+
+def find_duplicates(records, workers=4):
+    """
+    Find byte-identical files among scanned records.
+    
+    Files are first bucketed by the size already known from the scan;
+    only files sharing a size are read. Those get a cheap head/tail
+    sample hash, and only sample collisions are hashed in full. Hard
+    links to the same inode count as duplicates without being read.
+    Empty files are ignored.
+    
+    Args:
+        records: Iterable of FileRecord
+        workers: Number of files hashed in parallel
+    
+    Returns:
+        Dictionary of duplicate path -> FileRecord of the copy to keep
+    """
+    by_size = {}
+    for record in records:
+        if record.size > 0:
+            by_size.setdefault(record.size, []).append(record)
+    
+    identical = []
+    unique = []
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        
+        # Hard links are the same data already
+        by_inode = {}
+        for record in group:
+            by_inode.setdefault((record.device, record.inode), []).append(record)
+        identical.extend(links for links in by_inode.values() if len(links) > 1)
+        if len(by_inode) > 1:
+            unique.extend(min(links, key=keep_order) for links in by_inode.values())
+    
+    if unique:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            sampled = group_by(unique, lambda r: (r.size, sample_digest(r.path, r.size)), pool)
+            
+            # A small file's sample already covers all of it
+            identical.extend(group for group in sampled if group[0].size <= 2 * SAMPLE_SIZE)
+            large = [r for group in sampled if group[0].size > 2 * SAMPLE_SIZE for r in group]
+            identical.extend(group_by(large, lambda r: (r.size, full_digest(r.path)), pool))
+    
+    duplicates = {}
+    for same in identical:
+        same = sorted(same, key=keep_order)
+        for record in same[1:]:
+            duplicates[record.path] = same[0]
+    
+    # Merge chains from hard links (a -> b, b -> c becomes a -> c)
+    for path, original in duplicates.items():
+        while original.path in duplicates:
+            original = duplicates[original.path]
+        duplicates[path] = original
+    
+    return duplicates
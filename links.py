@@ -0,0 +1,263 @@
+"""
+Link trees for File Organizer
+Builds the category folders out of links to files left in place, and
+keeps them in step with the sources on later runs
+"""
+
+import errno
+import os
+import time
+
+from state_index import LOOKUP_CHUNK_SIZE, STATE_DIRNAME, WRITE_BATCH_SIZE, open_database
+
+# --link-mode choices
+LINK_MODES = ('hard', 'sym', 'reflink')
+
+# Strategy recorded on the Operation for each mode
+LINK_STRATEGIES = {'hard': 'hardlink', 'sym': 'symlink', 'reflink': 'reflink'}
+
+MANIFEST_FILENAME = 'links.sqlite'
+
+# ioctl request that shares a file's extents with another (from <linux/fs.h>)
+FICLONE = 0x40049409
+
+# errno values meaning "no reflinks here", so a hard link is made instead
+REFLINK_UNSUPPORTED = {
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.EINVAL, errno.ENOTTY,
+    errno.ENOSYS, errno.EBADF, errno.EPERM
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    device INTEGER NOT NULL,
+    link_inode INTEGER NOT NULL,
+    run INTEGER NOT NULL
+);
+"""
+
+def get_manifest_path(folder_path):
+    """
+    Get the location of the link manifest for an organized folder.
+    
+    Args:
+        folder_path: Folder being organized
+    
+    Returns:
+        Path to the SQLite file
+    """
+    return os.path.join(folder_path, STATE_DIRNAME, MANIFEST_FILENAME)
+
+def reflink(source, destination):
+    """
+    Make destination a copy-on-write clone of source (Btrfs, XFS, ...).
+    
+    Args:
+        source: File to clone
+        destination: Existing file to overwrite with the clone
+    
+    Raises:
+        OSError: If the filesystem can't clone (see REFLINK_UNSUPPORTED)
+    """
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        raise OSError(errno.ENOSYS, "reflinks are not supported on this platform")
+    
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+def make_link(record, destination, mode):
+    """
+    Link a file into place over a claimed placeholder, leaving the source.
+    
+    Hard links and symlinks are made under a temporary name and renamed
+    over the placeholder. Symlinks are relative, so the whole folder can
+    be moved. Reflinks fall back to a hard link where the filesystem
+    can't clone.
+    
+    Args:
+        record: FileRecord of the source
+        destination: Target path (a claimed placeholder)
+        mode: 'hard', 'sym' or 'reflink'
+    
+    Returns:
+        Name of the strategy that was used ('hardlink', 'symlink' or 'reflink')
+    """
+    import shutil
+    
+    if mode == 'reflink':
+        try:
+            reflink(record.path, destination)
+        except OSError as e:
+            if e.errno not in REFLINK_UNSUPPORTED:
+                raise
+            return make_link(record, destination, 'hard')
+        shutil.copystat(record.path, destination)
+        return 'reflink'
+    
+    folder = os.path.dirname(destination)
+    link_path = os.path.join(folder, f".{record.name}.{record.device}-{record.inode}.link")
+    if mode == 'sym':
+        os.symlink(os.path.relpath(record.path, folder), link_path)
+    else:
+        os.link(record.path, link_path)
+    os.replace(link_path, destination)
+    return LINK_STRATEGIES[mode]
+
+class LinkManifest:
+    """
+    On-disk record of the links built by earlier runs.
+    
+    Each link is stored with the size, mtime and identity its source had,
+    and the inode of the link itself. On a rerun, sources whose link is
+    still in place and unchanged are skipped; changed sources get a fresh
+    link; and links whose source was deleted are removed, but only if the
+    file at the link path is still the one this tool made.
+    
+    Also works as a sink: each linked Operation is recorded, in batches.
+    On a dry run the manifest is only read (see state_index.open_database).
+    """
+    
+    def __init__(self, folder_path, mode, dry_run=False):
+        """
+        Open (or create) the manifest for a folder.
+        
+        Args:
+            folder_path: Folder being organized
+            mode: Link mode of this run ('hard', 'sym' or 'reflink')
+            dry_run: If True, only report what would change, without
+                creating or writing the manifest
+        """
+        self.root = folder_path
+        self.mode = mode
+        self.dry_run = dry_run
+        self.path = get_manifest_path(folder_path)
+        self.db = open_database(self.path, SCHEMA, read_only=dry_run)
+        self.run = time.time_ns()
+        self.pending = []
+        self.current = 0
+        self.stale = 0
+    
+    def is_ours(self, link, link_inode):
+        """Check that a link path still holds the link this tool made."""
+        try:
+            return os.lstat(link).st_ino == link_inode
+        except OSError:
+            return False
+    
+    def remove_link(self, link, link_inode):
+        """Delete a link made by an earlier run, if it is still there."""
+        if self.dry_run or not self.is_ours(link, link_inode):
+            return
+        try:
+            os.remove(link)
+        except OSError:
+            pass
+    
+    def refresh(self, categorized):
+        """
+        Drop files whose link is up to date and clear out stale links.
+        
+        Args:
+            categorized: Dictionary of category -> list of FileRecord
+        
+        Returns:
+            Dictionary of the same shape with only the files to link
+        """
+        to_link = {}
+        seen = []
+        for category, records in categorized.items():
+            folder = os.path.join(self.root, category)
+            for start in range(0, len(records), LOOKUP_CHUNK_SIZE):
+                chunk = records[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = {
+                    row[0]: row[1:] for row in self.db.execute(
+                        f"SELECT source, link, mode, size, mtime_ns, inode, device, link_inode "
+                        f"FROM links WHERE source IN ({placeholders})",
+                        [record.path for record in chunk]
+                    )
+                }
+                for record in chunk:
+                    row = rows.get(record.path)
+                    if row is not None:
+                        link, mode, size, mtime_ns, inode, device, link_inode = row
+                        seen.append((self.run, record.path))
+                        if (mode == self.mode and os.path.dirname(link) == folder
+                                and (size, mtime_ns, inode, device) ==
+                                (record.size, record.mtime_ns, record.inode, record.device)
+                                and self.is_ours(link, link_inode)):
+                            self.current += 1
+                            continue
+                        self.stale += 1
+                        self.remove_link(link, link_inode)
+                    to_link.setdefault(category, []).append(record)
+        
+        if seen and not self.dry_run:
+            with self.db:
+                self.db.executemany("UPDATE links SET run = ? WHERE source = ?", seen)
+        return to_link
+    
+    def remove_orphans(self):
+        """
+        Remove links whose source no longer exists.
+        
+        Only entries refresh() didn't see are checked, so call this after
+        refresh().
+        
+        Returns:
+            Number of orphaned links found
+        """
+        self.flush()
+        orphans = []
+        rows = self.db.execute(
+            "SELECT source, link, link_inode FROM links WHERE run != ?", (self.run,)
+        )
+        for source, link, link_inode in rows:
+            if os.path.lexists(source):
+                continue
+            self.remove_link(link, link_inode)
+            orphans.append((source,))
+        
+        if orphans and not self.dry_run:
+            with self.db:
+                self.db.executemany("DELETE FROM links WHERE source = ?", orphans)
+        return len(orphans)
+    
+    def write(self, operation):
+        """Remember one linked Operation."""
+        if operation.status != 'Success' or self.dry_run:
+            return
+        record = operation.record
+        try:
+            link_inode = os.lstat(operation.new_path).st_ino
+        except OSError:
+            return
+        self.pending.append((
+            record.path, operation.new_path, self.mode, record.size, record.mtime_ns,
+            record.inode, record.device, link_inode, self.run
+        ))
+        if len(self.pending) >= WRITE_BATCH_SIZE:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered links to the database."""
+        if self.pending:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.pending
+                )
+            self.pending.clear()
+    
+    def close(self):
+        """Write remaining links and close the database."""
+        if not self.dry_run:
+            self.flush()
+        self.db.close()
@@ -0,0 +1,211 @@
+"""
+Run metrics for File Organizer
+Times each stage of a run and counts what it did, for --metrics-json
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Operation strategies that are plain renames or data copies
+COPY_STRATEGIES = ('copy_file_range', 'sendfile', 'copy')
+LINK_STRATEGIES = ('hardlink', 'symlink', 'reflink')
+
+def peak_memory():
+    """
+    Get the peak resident memory of this process.
+    
+    Returns:
+        Bytes, or None where the platform doesn't report it
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Metrics:
+    """
+    Stage timings and counters collected during one run.
+    
+    Stage times are exclusive: time spent in a nested stage (e.g. report
+    writing called from inside the move loop) is counted for that stage
+    only. Nested stages entered from worker threads add their own time
+    but are not subtracted from the caller's stage.
+    
+    Also works as a sink: each written Operation updates the move
+    counters.
+    """
+    
+    enabled = True
+    
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+    
+    def _enter(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(0.0)
+        return stack
+    
+    def _exit(self, stack, name, elapsed):
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+    
+    @contextmanager
+    def stage(self, name):
+        """Time a block of code as one stage."""
+        stack = self._enter()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._exit(stack, name, time.perf_counter() - start)
+    
+    def wrap(self, name, func):
+        """
+        Time every call of a function as the given stage.
+        
+        Returns:
+            Wrapped function
+        """
+        def timed(*args, **kwargs):
+            stack = self._enter()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._exit(stack, name, time.perf_counter() - start)
+        return timed
+    
+    def timed_iter(self, name, iterable, counter=None):
+        """
+        Time the work done producing each item of an iterable.
+        
+        Args:
+            name: Stage name
+            iterable: Iterable to pass through (e.g. iter_files)
+            counter: Optional counter incremented per item
+        
+        Yields:
+            Items of the iterable
+        """
+        iterator = iter(iterable)
+        next_item = self.wrap(name, iterator.__next__)
+        count = 0
+        try:
+            while True:
+                try:
+                    item = next_item()
+                except StopIteration:
+                    return
+                count += 1
+                yield item
+        finally:
+            if counter is not None:
+                self.count(counter, count)
+    
+    def count(self, name, amount=1):
+        """Add to a counter."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def write(self, operation):
+        """Count one finished Operation."""
+        strategy = operation.strategy
+        status = operation.status
+        counters = self.counters
+        with self.lock:
+            counters['operations'] = counters.get('operations', 0) + 1
+            if status == 'Success':
+                size = operation.record.size
+                counters['bytes_moved'] = counters.get('bytes_moved', 0) + size
+                if strategy == 'rename':
+                    key = 'renames'
+                elif strategy in COPY_STRATEGIES:
+                    key = 'copies'
+                    counters['bytes_copied'] = counters.get('bytes_copied', 0) + size
+                else:
+                    key = 'links' if strategy in LINK_STRATEGIES else 'other_moves'
+            elif status.startswith('Error'):
+                key = 'errors'
+            else:
+                key = 'not_moved'
+            counters[key] = counters.get(key, 0) + 1
+    
+    def to_dict(self):
+        """
+        Summarize the run.
+        
+        Returns:
+            Dictionary ready to be written as JSON
+        """
+        total = time.perf_counter() - self.start
+        files = self.counters.get('files_scanned', self.counters.get('operations', 0))
+        
+        stages = {}
+        for name, seconds in self.stages.items():
+            stages[name] = {
+                'seconds': round(seconds, 6),
+                'files_per_sec': round(files / seconds) if seconds > 0 else None,
+            }
+        
+        return {
+            'total_seconds': round(total, 6),
+            'files': files,
+            'files_per_sec': round(files / total) if total > 0 else None,
+            'bytes_per_sec': round(self.counters.get('bytes_moved', 0) / total) if total > 0 else None,
+            'peak_memory_bytes': peak_memory(),
+            'stages': stages,
+            'counters': dict(self.counters),
+        }
+    
+    def save(self, path):
+        """Write the summary to a JSON file."""
+        import json
+        
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+class NullMetrics:
+    """
+    Stand-in for Metrics when nothing is measured.
+    
+    Every method returns its input or does nothing, so instrumented code
+    runs at full speed.
+    """
+    
+    enabled = False
+    
+    @contextmanager
+    def stage(self, name):
+        yield
+    
+    def wrap(self, name, func):
+        return func
+    
+    def timed_iter(self, name, iterable, counter=None):
+        return iterable
+    
+    def count(self, name, amount=1):
+        pass
+    
+    def write(self, operation):
+        pass
+
+NULL_METRICS = NullMetrics()
@@ -3,21 +3,218 @@ File Organizer - Automated file organization tool
 Organizes files in a folder by type and generates a report
 """
 
+import errno
+import heapq
 import os
-import shutil
-import csv
-import argparse
+import stat
+import threading
+import time
 import logging
+from collections import deque, namedtuple
 from datetime import datetime
-from pathlib import Path
-from config import FILE_CATEGORIES, get_category
+from itertools import islice
+from backends import LOCAL_FS, partial_copy_path
+from config import FILE_CATEGORIES, get_classifier
+from metrics import NULL_METRICS, Metrics
+from sniffer import ContentSniffer
+from state_index import STATE_DIRNAME, StateIndex
 
-# Setup logging
-logging.basicConfig(
-    filename='organizer.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Logging is configured in main() (see setup_logging); importing this
+# module has no side effects. Per-file messages go to a child logger so
+# they can be sampled separately.
+#
+# Modules only some runs need (csv, shutil, argparse, hashing, inotify,
+# thread and process pools, logging handlers, ...) are imported at the top
+# of the functions that use them, so embedding the library through
+# organize() stays cheap to import.
+logger = logging.getLogger('organizer')
+file_logger = logging.getLogger('organizer.files')
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_BACKUP_COUNT = 5
+
+# Number of files classified per batch in iter_categorized
+CATEGORIZE_BATCH_SIZE = 4096
+
+# Report writing: rows per batched write, and seconds between flushes
+REPORT_BATCH_SIZE = 1000
+REPORT_FLUSH_INTERVAL = 5.0
+
+# Columns of the CSV report, in order
+REPORT_FIELDS = [
+    'timestamp', 'filename', 'original_path', 'new_path', 'category',
+    'size_bytes', 'status', 'strategy', 'bytes_per_sec', 'duplicate_of'
+]
+
+# Columns of a saved move plan, in order
+PLAN_FIELDS = [
+    'source', 'destination', 'category', 'size_bytes', 'mtime_ns', 'inode', 'device', 'link_to'
+]
+
+# Finished plan rows buffered before the checkpoint file is flushed
+PLAN_CHECKPOINT_BATCH = 100
+
+# Suffix of the checkpoint file kept next to a plan while it is applied
+PLAN_CHECKPOINT_SUFFIX = '.done'
+
+# Columns of the move journal, in order
+JOURNAL_FIELDS = ['source', 'destination', 'size_bytes', 'mtime_ns', 'strategy']
+
+# Moves buffered before the journal is written and synced to disk
+JOURNAL_BATCH_SIZE = 100
+
+# errno values meaning "can't hard-link here", so the file is moved instead
+HARDLINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+# Moves in flight per worker before the oldest result is written out
+MOVE_WINDOW_PER_WORKER = 4
+
+# Files moved per batch by iter_operations and with --max-memory
+OPERATION_BATCH_SIZE = 1000
+
+# Files per batch passed between the stages of the async engine
+PIPELINE_BATCH_SIZE = 256
+
+# Finished operations the async engine's report stage keeps in memory while
+# waiting to emit them in order; past this they go to temporary files
+PIPELINE_HOLD_LIMIT = 20000
+
+# --max-memory: estimated bytes per buffered record on top of its path and
+# name, memory kept back for batches, readers and names in flight, and the
+# most chunk files merged at once
+SPILL_RECORD_OVERHEAD = 330
+SPILL_RESERVED_BYTES = 8 * 1024 * 1024
+SPILL_MERGE_WIDTH = 32
+
+# Watch mode: seconds without events before a batch runs, seconds a file's
+# size and mtime must stay the same before it is moved, and the longest a
+# busy folder can delay a batch
+WATCH_DEBOUNCE = 2.0
+WATCH_SETTLE = 5.0
+WATCH_MAX_DELAY = 30.0
+
+SYMLINK_POLICIES = ('files', 'ignore', 'follow')
+
+# --engine choices: one stage after another, or all stages at once on asyncio
+ENGINES = ('sync', 'async')
+
+class FileRecord(namedtuple('FileRecord', ['path', 'name', 'size', 'mtime_ns', 'inode', 'device'])):
+    """
+    A file found by the scanner, with its stat result captured once.
+    
+    Later stages (categorize, move, report) read size and identity from
+    the record instead of asking the filesystem again.
+    """
+    
+    __slots__ = ()
+    
+    @classmethod
+    def from_stat(cls, path, st, name=None):
+        """Build a record from a path and an os.stat_result."""
+        if name is None:
+            name = os.path.basename(path)
+        return cls(path, name, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+    
+    @classmethod
+    def from_path(cls, path):
+        """Build a record by stat'ing a path (follows symlinks)."""
+        return cls.from_stat(path, os.stat(path))
+
+def iter_files(folder_path, recursive=False, max_depth=None, symlinks='files', exclude=(),
+               state=None, fs=None):
+    """
+    Walk a folder with scandir and yield files as they are found.
+    
+    The file type comes from the cached DirEntry information, and each
+    file is stat'ed exactly once to build its FileRecord.
+    
+    Args:
+        folder_path: Path to folder to scan
+        recursive: If True, descend into subdirectories
+        max_depth: Deepest subdirectory level to visit (None = no limit)
+        symlinks: 'files' to include symlinked files but not descend into
+            symlinked folders, 'ignore' to skip all symlinks, 'follow' to
+            also descend into symlinked folders
+        exclude: Folder names to skip at the top level (e.g. categories)
+        state: Optional StateIndex; folders unchanged since the last run
+            are not listed again
+        fs: Filesystem backend to scan (default: the local disk)
+        
+    Yields:
+        FileRecord for each file
+    """
+    if symlinks not in SYMLINK_POLICIES:
+        raise ValueError(f"Unknown symlink policy: {symlinks}")
+    
+    fs = fs or LOCAL_FS
+    exclude = set(exclude)
+    visited = set()
+    if symlinks == 'follow':
+        st = fs.stat(folder_path)
+        visited.add((st.st_dev, st.st_ino))
+    pending = [(folder_path, 0)]
+    
+    while pending:
+        path, depth = pending.pop()
+        subfolders = []
+        stored = None
+        
+        if state is not None:
+            try:
+                stored = state.unchanged_folder(path, fs.stat(path).st_mtime_ns)
+            except OSError as e:
+                logger.error("Error scanning folder %s: %s", path, e)
+                continue
+        
+        if stored is not None:
+            # Nothing added or removed here; only its subfolders may have changed
+            if recursive:
+                for name in stored:
+                    subfolder = os.path.join(path, name)
+                    if symlinks != 'follow':
+                        try:
+                            if stat.S_ISLNK(fs.stat(subfolder, follow_symlinks=False).st_mode):
+                                continue
+                        except OSError:
+                            continue
+                    subfolders.append((subfolder, name))
+        else:
+            try:
+                with fs.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            is_link = entry.is_symlink()
+                            if is_link and symlinks == 'ignore':
+                                continue
+                            
+                            if entry.is_file():
+                                yield FileRecord.from_stat(entry.path, entry.stat(), entry.name)
+                            elif recursive and entry.is_dir(follow_symlinks=(symlinks == 'follow')):
+                                subfolders.append((entry.path, entry.name))
+                        except OSError as e:
+                            logger.error("Error reading entry %s: %s", entry.path, e)
+            except OSError as e:
+                logger.error("Error scanning folder %s: %s", path, e)
+                continue
+        
+        if max_depth is not None and depth >= max_depth:
+            continue
+        
+        for subfolder, name in reversed(subfolders):
+            if depth == 0 and name in exclude:
+                continue
+            if symlinks == 'follow':
+                # Guard against symlink loops
+                try:
+                    st = fs.stat(subfolder)
+                except OSError as e:
+                    logger.error("Error reading folder %s: %s", subfolder, e)
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key in visited:
+                    continue
+                visited.add(key)
+            pending.append((subfolder, depth + 1))
 
 def scan_folder(folder_path):
     """
@@ -27,73 +224,542 @@ def scan_folder(folder_path):
         folder_path: Path to folder to scan
         
     Returns:
-        List of file paths
+        List of FileRecord
     """
-    files = []
+    files = list(iter_files(folder_path))
+    logger.info("Scanned folder: %s, found %d files", folder_path, len(files))
+    return files
+
+def organized_folders(rules=None):
+    """
+    Get the names of folders the organizer fills, so scans skip them.
     
-    try:
-        for item in os.listdir(folder_path):
-            full_path = os.path.join(folder_path, item)
-            if os.path.isfile(full_path):
-                files.append(full_path)
+    Args:
+        rules: Optional RuleTable whose destinations count too
+        
+    Returns:
+        List of top-level folder names
+    """
+    folders = list(FILE_CATEGORIES) + ['Other', STATE_DIRNAME]
+    if rules is not None:
+        folders += [destination.split('/')[0] for destination in rules.destinations]
+    return folders
+
+def open_rules(source, root):
+    """
+    Compile the configured rules for a folder.
+    
+    Args:
+        source: None for config.RULES, a list of rules, or a JSON file path
+        root: Folder being organized
         
-        logging.info(f"Scanned folder: {folder_path}, found {len(files)} files")
-        return files
+    Returns:
+        RuleTable, or None if there are no rules
         
-    except Exception as e:
-        logging.error(f"Error scanning folder {folder_path}: {e}")
-        return []
+    Raises:
+        ValueError: If a rule is invalid
+        OSError: If the rules file can't be read
+    """
+    from rules import RuleTable, load_rules
+    specs = load_rules(source)
+    return RuleTable(specs, root) if specs else None
+
+def open_throttle(options):
+    """
+    Build the Throttle asked for by the options.
+    
+    Args:
+        options: Options or parsed command-line options
+        
+    Returns:
+        Throttle, or None if no budget is set
+        
+    Raises:
+        ValueError: If the byte budget can't be parsed, or a budget
+            isn't more than 0
+    """
+    from rules import parse_size
+    from throttle import Throttle
+    
+    bytes_per_sec = getattr(options, 'max_bytes_per_sec', None)
+    ops_per_sec = getattr(options, 'max_ops_per_sec', None)
+    if bytes_per_sec is None and ops_per_sec is None:
+        return None
+    
+    return Throttle(
+        parse_size(bytes_per_sec) if bytes_per_sec is not None else None,
+        ops_per_sec,
+        burst=getattr(options, 'burst', 1.0),
+        adaptive=getattr(options, 'adaptive_throttle', False)
+    )
+
+def iter_categorized(files, state=None, sniffer=None, rules=None):
+    """
+    Classify files in batches as they arrive.
+    
+    A generator from iter_files is consumed while the folder is still
+    being walked, and only one batch is held at a time.
+    
+    Args:
+        files: Iterable of FileRecord
+        state: Optional StateIndex; unchanged files left behind by an
+            earlier run are dropped and known files reuse their category
+        sniffer: Optional ContentSniffer used for files whose extension
+            is missing or unknown
+        rules: Optional RuleTable that may send files elsewhere than
+            their category folder (e.g. 'Videos/Large')
+        
+    Yields:
+        (records, categories) lists of the same length for each batch
+    """
+    classifier = get_classifier()
+    files = iter(files)
+    
+    while True:
+        batch = list(islice(files, CATEGORIZE_BATCH_SIZE))
+        if not batch:
+            break
+        yield classify_batch(batch, classifier, state, sniffer, rules)
+
+def classify_batch(batch, classifier, state=None, sniffer=None, rules=None):
+    """
+    Classify one batch of files (see iter_categorized).
+    
+    Args:
+        batch: List of FileRecord
+        classifier: Classifier from config.get_classifier()
+        state: Optional StateIndex
+        sniffer: Optional ContentSniffer
+        rules: Optional RuleTable
+    
+    Returns:
+        (records, categories) lists of the same length; records may be
+        fewer than given if state dropped some
+    """
+    if state is not None:
+        batch, known = state.check_batch(batch)
+        categories = [known.get((record.device, record.inode)) for record in batch]
+        unknown = [i for i, category in enumerate(categories) if category is None]
+        if unknown:
+            names = [batch[i].name for i in unknown]
+            for i, category in zip(unknown, classifier.classify_many(names)):
+                categories[i] = category
+    else:
+        categories = classifier.classify_many([record.name for record in batch])
+    
+    if sniffer is not None:
+        # Fall back to file contents only where the extension didn't help
+        unknown = [i for i, category in enumerate(categories) if category == classifier.default]
+        if unknown:
+            sniffed = sniffer.sniff_many([batch[i] for i in unknown])
+            for i, category in zip(unknown, sniffed):
+                if category is not None:
+                    categories[i] = category
+    
+    if rules is not None:
+        categories = rules.apply(batch, categories)
+    
+    return batch, categories
 
-def categorize_files(files):
+def categorize_files(files, state=None, sniffer=None, rules=None):
     """
     Organize files into categories based on extension.
     
     Args:
-        files: List of file paths
+        files: Iterable of FileRecord
+        state: Optional StateIndex (see iter_categorized)
+        sniffer: Optional ContentSniffer (see iter_categorized)
+        rules: Optional RuleTable (see iter_categorized)
         
     Returns:
-        Dictionary with categories as keys and file lists as values
+        Dictionary with categories as keys and FileRecord lists as values
     """
     categorized = {}
+    for batch, categories in iter_categorized(files, state, sniffer, rules):
+        for record, category in zip(batch, categories):
+            if category not in categorized:
+                categorized[category] = []
+            
+            categorized[category].append(record)
+    
+    return categorized
+
+def spill_order(record):
+    """Sort key for spill chunks: files with the same name end up next to each other."""
+    return (os.path.normcase(record.name), record.path)
+
+class SpillSorter:
+    """
+    Categorized files kept in sorted chunk files on disk, for --max-memory.
+    
+    Records are buffered per category until the buffer would pass its
+    byte budget; then each category's buffer is sorted by name and
+    written to its own chunk file. Reading a category merges its chunks
+    (and whatever is still buffered) back in name order, so memory stays
+    flat however many files the folder holds, and files sharing a name
+    come out together for DiskNameIndex.
+    
+    Chunks live in a temporary folder (honours TMPDIR) that close() removes.
+    """
+    
+    def __init__(self, max_bytes, folder=None):
+        """
+        Args:
+            max_bytes: Memory budget for buffered records
+            folder: Where to create the chunk folder (default: system temp)
+        """
+        import tempfile
+        
+        self.max_bytes = max_bytes
+        self.folder = tempfile.mkdtemp(prefix='organizer-spill-', dir=folder)
+        self.buffers = {}
+        self.buffered = 0
+        self.chunks = {}
+        self.counts = {}
+        self.files = 0
+    
+    def add(self, records, categories):
+        """
+        Add a classified batch (as yielded by iter_categorized).
+        
+        Args:
+            records: List of FileRecord
+            categories: Category of each record
+        """
+        buffers = self.buffers
+        counts = self.counts
+        for record, category in zip(records, categories):
+            buffer = buffers.get(category)
+            if buffer is None:
+                buffer = buffers[category] = []
+            buffer.append(record)
+            counts[category] = counts.get(category, 0) + 1
+            self.buffered += SPILL_RECORD_OVERHEAD + len(record.path) + len(record.name)
+            if self.buffered >= self.max_bytes:
+                self.spill()
+    
+    @property
+    def total(self):
+        """Number of files added."""
+        return sum(self.counts.values())
+    
+    def categories(self):
+        """Categories that received files, in first-seen order."""
+        return list(self.counts)
     
-    for filepath in files:
-        filename = os.path.basename(filepath)
-        _, ext = os.path.splitext(filename)
-        category = get_category(ext)
+    def new_chunk(self):
+        """Get a path for the next chunk file."""
+        self.files += 1
+        return os.path.join(self.folder, f"{self.files}.csv")
+    
+    def write_chunk(self, records):
+        """
+        Write sorted records to a new chunk file.
         
-        if category not in categorized:
-            categorized[category] = []
+        Returns:
+            Path of the chunk
+        """
+        import csv
         
-        categorized[category].append(filepath)
+        path = self.new_chunk()
+        with open(path, 'w', newline='', encoding='utf-8', errors='surrogateescape') as f:
+            writer = csv.writer(f)
+            for record in records:
+                writer.writerow(record)
+        return path
     
-    return categorized
+    def read_chunk(self, path):
+        """
+        Read records back from a chunk file.
+        
+        Yields:
+            FileRecord in the order they were written
+        """
+        import csv
+        
+        with open(path, newline='', encoding='utf-8', errors='surrogateescape') as f:
+            for source, name, size, mtime_ns, inode, device in csv.reader(f):
+                yield FileRecord(source, name, int(size), int(mtime_ns), int(inode), int(device))
+    
+    def spill(self):
+        """Sort every buffer and write it out as a chunk."""
+        for category, buffer in self.buffers.items():
+            buffer.sort(key=spill_order)
+            self.chunks.setdefault(category, []).append(self.write_chunk(buffer))
+        self.buffers.clear()
+        self.buffered = 0
+    
+    def merge(self, chunks):
+        """Merge sorted chunk files into one stream."""
+        return heapq.merge(*(self.read_chunk(path) for path in chunks), key=spill_order)
+    
+    def records(self, category):
+        """
+        Get a category's files in name order.
+        
+        Chunks are merged in passes of at most SPILL_MERGE_WIDTH files,
+        so the number of open files stays bounded too.
+        
+        Yields:
+            FileRecord
+        """
+        chunks = self.chunks.pop(category, [])
+        while len(chunks) > SPILL_MERGE_WIDTH:
+            group, chunks = chunks[:SPILL_MERGE_WIDTH], chunks[SPILL_MERGE_WIDTH:]
+            chunks.append(self.write_chunk(self.merge(group)))
+            for path in group:
+                os.remove(path)
+        
+        buffer = self.buffers.pop(category, [])
+        buffer.sort(key=spill_order)
+        yield from heapq.merge(self.merge(chunks), buffer, key=spill_order)
+        for path in chunks:
+            os.remove(path)
+    
+    def batches(self, size):
+        """
+        Read the files back category by category in fixed-size batches.
+        
+        Args:
+            size: Max records per batch
+            
+        Yields:
+            Dictionary of category -> list of FileRecord (one category each)
+        """
+        for category in self.categories():
+            records = self.records(category)
+            while True:
+                batch = list(islice(records, size))
+                if not batch:
+                    break
+                yield {category: batch}
+    
+    def close(self):
+        """Delete the chunk files."""
+        import shutil
+        
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.buffers = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def spill_categorized(files, max_memory, state=None, sniffer=None, rules=None):
+    """
+    Classify files into a SpillSorter instead of a dictionary.
+    
+    Args:
+        files: Iterable of FileRecord
+        max_memory: Memory ceiling in bytes for the whole run
+        state: Optional StateIndex (see iter_categorized)
+        sniffer: Optional ContentSniffer (see iter_categorized)
+        rules: Optional RuleTable (see iter_categorized)
+        
+    Returns:
+        SpillSorter holding the classified files (close it when done)
+        
+    Raises:
+        ValueError: If the ceiling doesn't leave room for buffering
+    """
+    if max_memory <= SPILL_RESERVED_BYTES:
+        raise ValueError(
+            f"Memory ceiling must be above {SPILL_RESERVED_BYTES // (1024 * 1024)} MB"
+        )
+    spill = SpillSorter(max_memory - SPILL_RESERVED_BYTES)
+    try:
+        for batch, categories in iter_categorized(files, state, sniffer, rules):
+            spill.add(batch, categories)
+    except BaseException:
+        spill.close()
+        raise
+    return spill
 
-def create_category_folders(base_path, categories):
+def create_category_folders(base_path, categories, fs=None):
     """
     Create folders for each category.
     
     Args:
         base_path: Base directory where folders will be created
         categories: List of category names
+        fs: Filesystem backend (default: the local disk)
     """
+    fs = fs or LOCAL_FS
     for category in categories:
         folder_path = os.path.join(base_path, category)
         try:
-            os.makedirs(folder_path, exist_ok=True)
-            logging.info(f"Created folder: {folder_path}")
+            fs.makedirs(folder_path)
+            logger.info("Created folder: %s", folder_path)
         except Exception as e:
-            logging.error(f"Error creating folder {folder_path}: {e}")
+            logger.error("Error creating folder %s: %s", folder_path, e)
+
+class NameIndex:
+    """
+    In-memory index of the names taken in each destination folder.
+    
+    Each folder is listed once on first use. After that, picking a free
+    name is a set lookup, and numbered suffixes come from a per-stem
+    counter instead of probing name_1, name_2, ... on disk.
+    
+    Names are allocated by the planner (plan_operation) and by worker
+    threads retrying a taken name (claim_destination), both under
+    self.lock.
+    """
+    
+    def __init__(self, fs=None):
+        """
+        Args:
+            fs: Filesystem backend the folders are on (default: the local disk)
+        """
+        self.fs = fs or LOCAL_FS
+        self.folders = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+    
+    def names(self, folder):
+        """
+        Get the set of taken names for a folder, listing it on first use.
+        
+        Args:
+            folder: Destination folder path
+            
+        Returns:
+            Set of normalized (os.path.normcase) names
+        
+        Raises:
+            OSError: If the folder exists but can't be listed (e.g. a file
+                is in the way)
+        """
+        names = self.folders.get(folder)
+        if names is None:
+            try:
+                with self.fs.scandir(folder) as entries:
+                    names = {os.path.normcase(entry.name) for entry in entries}
+            except FileNotFoundError:
+                names = set()
+            self.folders[folder] = names
+        return names
+    
+    def mark_taken(self, destination):
+        """Record that a path exists (e.g., created by another process)."""
+        folder, filename = os.path.split(destination)
+        self.names(folder).add(os.path.normcase(filename))
+    
+    def allocate(self, destination):
+        """
+        Pick a free name for a destination and mark it as taken.
+        
+        Args:
+            destination: Wanted target file path
+            
+        Returns:
+            The wanted path, or the first free base_N.ext variant
+        """
+        folder, filename = os.path.split(destination)
+        names = self.names(folder)
+        
+        key = os.path.normcase(filename)
+        if key not in names:
+            names.add(key)
+            return destination
+        
+        stem, ext = os.path.splitext(filename)
+        counter_key = (folder, os.path.normcase(stem), os.path.normcase(ext))
+        counter = self.counters.get(counter_key, 1)
+        
+        while os.path.normcase(f"{stem}_{counter}{ext}") in names:
+            counter += 1
+        
+        self.counters[counter_key] = counter + 1
+        filename = f"{stem}_{counter}{ext}"
+        names.add(os.path.normcase(filename))
+        return os.path.join(folder, filename)
+
+class DiskNameIndex:
+    """
+    Name allocation that asks the disk instead of listing folders.
+    
+    Used with --max-memory, where a NameIndex would grow with every file.
+    Only the most recently handed-out names are remembered (they may not
+    be claimed on disk yet), and a numbered-suffix counter is kept for
+    the last name only: SpillSorter hands out files sorted by name, so
+    files sharing a name arrive together. claim_destination's O_EXCL
+    still catches anything this misses; in a dry run, where nothing is
+    claimed, a generated name far from its original may show up twice.
+    """
+    
+    def __init__(self, recent=OPERATION_BATCH_SIZE * 4, fs=None):
+        """
+        Args:
+            recent: Number of handed-out names to remember
+            fs: Filesystem backend the folders are on (default: the local disk)
+        """
+        self.fs = fs or LOCAL_FS
+        self.recent = deque()
+        self.recent_names = set()
+        self.limit = recent
+        self.last = None
+        self.counter = 1
+        self.lock = threading.Lock()
+    
+    def taken(self, path):
+        """Check whether a path was handed out recently or exists."""
+        return os.path.normcase(path) in self.recent_names or self.fs.exists(path, follow_symlinks=False)
+    
+    def mark_taken(self, destination):
+        """Record that a path exists (e.g., created by another process)."""
+        key = os.path.normcase(destination)
+        if key in self.recent_names:
+            return
+        self.recent.append(key)
+        self.recent_names.add(key)
+        if len(self.recent) > self.limit:
+            self.recent_names.discard(self.recent.popleft())
+    
+    def allocate(self, destination):
+        """
+        Pick a free name for a destination and mark it as taken.
+        
+        Args:
+            destination: Wanted target file path
+            
+        Returns:
+            The wanted path, or the first free base_N.ext variant
+        """
+        key = os.path.normcase(destination)
+        if key != self.last:
+            self.last = key
+            self.counter = 1
+            if not self.taken(destination):
+                self.mark_taken(destination)
+                return destination
+        
+        base, ext = os.path.splitext(destination)
+        counter = self.counter
+        while self.taken(f"{base}_{counter}{ext}"):
+            counter += 1
+        
+        self.counter = counter + 1
+        destination = f"{base}_{counter}{ext}"
+        self.mark_taken(destination)
+        return destination
 
-def get_unique_filename(destination):
+def get_unique_filename(destination, name_index=None):
     """
     Generate unique filename if file already exists.
     
     Args:
         destination: Target file path
+        name_index: Optional NameIndex to answer from memory
         
     Returns:
         Unique file path
     """
+    if name_index is not None:
+        return name_index.allocate(destination)
+    
     if not os.path.exists(destination):
         return destination
     
@@ -105,134 +771,2631 @@ def get_unique_filename(destination):
     
     return f"{base}_{counter}{ext}"
 
-def move_files(categorized, base_path, dry_run=False):
+def plan_operation(record, category, wanted, name_index):
     """
-    Move files to their category folders.
+    Make the Operation for one file, with a free name at its destination.
+    
+    A destination folder that can't be listed (e.g. a file is in the way)
+    fails this file only: the Operation comes back with an Error status.
     
     Args:
-        categorized: Dictionary of categorized files
-        base_path: Base directory
-        dry_run: If True, don't actually move files
-        
+        record: FileRecord to move
+        category: Category (destination folder name)
+        wanted: Target path before any numbered suffix
+        name_index: NameIndex or DiskNameIndex to allocate the name from
+    
     Returns:
-        List of dictionaries with move operation details
+        Operation, 'Pending' or with an Error status
     """
-    operations = []
-    
-    for category, files in categorized.items():
-        category_folder = os.path.join(base_path, category)
-        
-        for filepath in files:
-            filename = os.path.basename(filepath)
-            destination = os.path.join(category_folder, filename)
-            destination = get_unique_filename(destination)
-            
-            operation = {
-                'timestamp': datetime.now().isoformat(),
-                'filename': filename,
-                'original_path': filepath,
-                'new_path': destination,
-                'category': category,
-                'size_bytes': os.path.getsize(filepath) if os.path.exists(filepath) else 0,
-                'status': 'Pending'
-            }
-            
-            if dry_run:
-                operation['status'] = 'Dry Run'
-                logging.info(f"[DRY RUN] Would move: {filepath} → {destination}")
-            else:
-                try:
-                    shutil.move(filepath, destination)
-                    operation['status'] = 'Success'
-                    logging.info(f"Moved: {filepath} → {destination}")
-                except Exception as e:
-                    operation['status'] = f'Error: {str(e)}'
-                    logging.error(f"Failed to move {filepath}: {e}")
-            
-            operations.append(operation)
-    
-    return operations
+    try:
+        with name_index.lock:
+            destination = get_unique_filename(wanted, name_index)
+    except OSError as e:
+        file_logger.error("Failed to move %s: %s", record.path, e)
+        return Operation(record, category, wanted, f'Error: {str(e)}')
+    return Operation(record, category, destination)
 
-def generate_report(operations, report_path):
+def claim_destination(wanted, destination, name_index):
     """
-    Generate CSV report of file operations.
+    Atomically create an empty placeholder at the destination.
+    
+    The index only knows what this run has seen. If another process
+    created the same name in the meantime, O_EXCL fails and the next
+    free name is tried, so an existing file is never overwritten.
     
     Args:
-        operations: List of operation dictionaries
-        report_path: Path where report will be saved
-    """
-    try:
-        with open(report_path, 'w', newline='', encoding='utf-8') as f:
-            if operations:
-                fieldnames = operations[0].keys()
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(operations)
-        
-        logging.info(f"Report saved: {report_path}")
-        print(f"\n📄 Report saved: {report_path}")
+        wanted: Original target path (used to pick the next name)
+        destination: Name allocated by the index
+        name_index: NameIndex the name came from
         
-    except Exception as e:
-        logging.error(f"Error generating report: {e}")
-        print(f"✗ Error saving report: {e}")
+    Returns:
+        Path of the claimed placeholder
+    """
+    while True:
+        try:
+            name_index.fs.create(destination)
+        except FileExistsError:
+            with name_index.lock:
+                name_index.mark_taken(destination)
+                destination = name_index.allocate(wanted)
+            continue
+        return destination
 
-def display_summary(categorized, operations, dry_run=False):
-    """Display summary of operations."""
-    print("\n" + "="*50)
-    print("📊 SUMMARY")
-    print("="*50)
-    
-    total_files = sum(len(files) for files in categorized.values())
-    print(f"\nTotal files: {total_files}")
+def move_file(record, destination, dest_device=None, throttle=None, fs=None):
+    """
+    Move a file over a claimed placeholder, using the cheapest strategy.
     
-    print("\nBy category:")
-    for category, files in sorted(categorized.items()):
-        print(f"  {category}: {len(files)} files")
+    A rename is tried first unless the captured st_dev values already
+    show the move crosses filesystems; cross-device moves are copied
+    with the backend's copy (symlinks are recreated as links) and the
+    source is removed once the copy is in place.
     
-    if not dry_run:
-        successful = sum(1 for op in operations if op['status'] == 'Success')
-        failed = sum(1 for op in operations if op['status'].startswith('Error'))
+    Args:
+        record: FileRecord of the source
+        destination: Target path
+        dest_device: st_dev of the destination folder, if known
+        throttle: Optional Throttle for bytes copied across filesystems
+        fs: Filesystem backend (default: the local disk)
         
-        print(f"\n✓ Successfully moved: {successful}")
-        if failed > 0:
-            print(f"✗ Failed: {failed}")
+    Returns:
+        Name of the strategy that was used ('rename', 'copy_file_range',
+        'sendfile', 'copy' or 'symlink')
+    """
+    fs = fs or LOCAL_FS
+    if dest_device is None or record.device == dest_device:
+        try:
+            fs.rename(record.path, destination)
+            return 'rename'
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
     
-    print("="*50 + "\n")
+    strategy = fs.copy(record, destination, throttle)
+    fs.remove(record.path)
+    return strategy
 
-def main():
-    """Main function."""
-    parser = argparse.ArgumentParser(
-        description='🗂️  File Organizer - Automatically organize files by type',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  python organizer.py --folder ~/Downloads --dry-run
-  python organizer.py --folder ~/Desktop --report my-report.csv
-  python organizer.py --help
-        """
-    )
+class Operation:
+    """
+    One planned or finished move.
     
-    parser.add_argument(
-        '--folder',
-        default='./test_folder',
-        help='Folder to organize (default: ./test_folder)'
-    )
+    Kept deliberately small: it points at the scanned FileRecord instead
+    of copying its strings, and stores a raw time.time() value. The
+    report row dictionary and ISO timestamp are only built when the row
+    is written, by to_row().
+    """
     
-    parser.add_argument(
-        '--dry-run',
-        action='store_true',
-        help='Show what would happen without moving files'
+    __slots__ = (
+        'record', 'category', 'new_path', 'status', 'strategy', 'bytes_per_sec',
+        'duplicate_of', 'time'
     )
     
-    parser.add_argument(
-        '--report',
-        default='./reports/report.csv',
-        help='Output report path (default: ./reports/report.csv)'
-    )
+    def __init__(self, record, category, new_path, status='Pending'):
+        self.record = record
+        self.category = category
+        self.new_path = new_path
+        self.status = status
+        self.strategy = ''
+        self.bytes_per_sec = ''
+        self.duplicate_of = ''
+        self.time = time.time()
     
-    args = parser.parse_args()
+    def to_row(self):
+        """
+        Build the CSV report row for this operation.
+        
+        Returns:
+            Dictionary with the REPORT_FIELDS keys
+        """
+        record = self.record
+        return {
+            'timestamp': datetime.fromtimestamp(self.time).isoformat(),
+            'filename': record.name,
+            'original_path': record.path,
+            'new_path': self.new_path,
+            'category': self.category,
+            'size_bytes': record.size,
+            'status': self.status,
+            'strategy': self.strategy,
+            'bytes_per_sec': self.bytes_per_sec,
+            'duplicate_of': self.duplicate_of
+        }
+
+class DeviceLimiter:
+    """
+    Cap the number of concurrent moves touching each filesystem.
     
-    # Convert to absolute path
+    A move holds one slot on its source device and one on its destination
+    device, so a slow mount cannot take every worker thread.
+    """
+    
+    def __init__(self, per_device):
+        """
+        Args:
+            per_device: Max concurrent moves per filesystem
+        
+        Raises:
+            ValueError: If per_device is less than 1
+        """
+        if per_device < 1:
+            raise ValueError(f"per_device must be at least 1, not {per_device}")
+        self.per_device = per_device
+        self.semaphores = {}
+        self.lock = threading.Lock()
+    
+    def _semaphore(self, device):
+        with self.lock:
+            semaphore = self.semaphores.get(device)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_device)
+                self.semaphores[device] = semaphore
+            return semaphore
+    
+    def acquire(self, devices):
+        """
+        Take a slot on each device (in a fixed order to avoid deadlocks).
+        
+        Devices that are not known (None) take no slot.
+        
+        Returns:
+            List of semaphores to pass to release()
+        """
+        known = sorted({device for device in devices if device is not None})
+        semaphores = [self._semaphore(device) for device in known]
+        for semaphore in semaphores:
+            semaphore.acquire()
+        return semaphores
+    
+    def release(self, semaphores):
+        """Give back the slots taken by acquire()."""
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+
+def link_file(record, destination, link_to):
+    """
+    Replace a duplicate with a hard link to the copy already organized.
+    
+    Args:
+        record: FileRecord of the duplicate
+        destination: Target path (a claimed placeholder)
+        link_to: Path of the identical file to link to
+        
+    Returns:
+        'hardlink', or None if the filesystem can't link these paths
+    """
+    link_path = partial_copy_path(record, destination)
+    try:
+        os.link(link_to, link_path)
+    except OSError as e:
+        if e.errno in HARDLINK_UNSUPPORTED:
+            return None
+        raise
+    os.replace(link_path, destination)
+    os.remove(record.path)
+    return 'hardlink'
+
+def execute_move(operation, wanted, name_index, limiter=None, devices=(), link_to=None,
+                 link_mode=None, throttle=None):
+    """
+    Move one planned file and record the outcome on its operation.
+    
+    Errors are caught per file, so one failure never stops the run.
+    
+    Args:
+        operation: Operation to run (updated in place)
+        wanted: Target path before any numbered suffix
+        name_index: NameIndex used to resolve collisions
+        limiter: Optional DeviceLimiter
+        devices: (source, destination) device ids
+        link_to: Identical file to hard-link to instead of moving, if possible
+        link_mode: 'hard', 'sym' or 'reflink' to link the file into place
+            and leave the source where it is
+        throttle: Optional Throttle; waited on before any device slot is taken
+    """
+    from links import make_link
+    
+    record = operation.record
+    filepath = record.path
+    if throttle is not None:
+        throttle.operation()
+    slots = ()
+    claimed = None
+    try:
+        if limiter is not None:
+            slots = limiter.acquire(devices)
+        claimed = claim_destination(wanted, operation.new_path, name_index)
+        operation.new_path = destination = claimed
+        start = time.perf_counter()
+        strategy = None
+        if link_mode is not None:
+            strategy = make_link(record, destination, link_mode)
+        elif link_to is not None:
+            strategy = link_file(record, destination, link_to)
+        if strategy is None:
+            strategy = move_file(
+                record, destination, devices[1] if devices else None, throttle, name_index.fs
+            )
+        elapsed = time.perf_counter() - start
+        if throttle is not None and strategy not in ('copy_file_range', 'sendfile', 'copy'):
+            throttle.observe('move', elapsed)
+        operation.status = 'Success'
+        operation.strategy = strategy
+        operation.bytes_per_sec = round(record.size / elapsed) if elapsed > 0 else 0
+        file_logger.info("%s (%s): %s → %s", 'Linked' if link_mode else 'Moved',
+                         strategy, filepath, destination)
+    except Exception as e:
+        operation.status = f'Error: {str(e)}'
+        file_logger.error("Failed to %s %s: %s", 'link' if link_mode else 'move', filepath, e)
+        if claimed is not None:
+            remove_placeholder(claimed, name_index.fs)
+    finally:
+        if limiter is not None:
+            limiter.release(slots)
+
+class MoveRunner:
+    """
+    Run moves on the calling thread or a thread pool.
+    
+    Finished operations are passed to emit in the order they were
+    submitted, with at most a small window of moves in flight.
+    """
+    
+    def __init__(self, name_index, emit, workers=1, per_device=None, link_mode=None,
+                 throttle=None):
+        """
+        Args:
+            name_index: NameIndex used to resolve collisions
+            emit: Callable given each finished Operation
+            workers: Number of moves to run at the same time
+            per_device: Max concurrent moves per filesystem (None = workers)
+            link_mode: Link files into place instead of moving (see execute_move)
+            throttle: Optional Throttle shared by all workers
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.name_index = name_index
+        self.emit = emit
+        self.link_mode = link_mode
+        self.throttle = throttle
+        self.pending = deque()
+        self.window = max(workers, 1) * MOVE_WINDOW_PER_WORKER
+        self.pool = None
+        self.limiter = None
+        if workers > 1:
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+            self.limiter = DeviceLimiter(per_device) if per_device else None
+    
+    def run(self, operation, wanted, devices, link_to=None):
+        """Move one file (see execute_move)."""
+        if self.pool is None:
+            execute_move(
+                operation, wanted, self.name_index, devices=devices, link_to=link_to,
+                link_mode=self.link_mode, throttle=self.throttle
+            )
+            self.emit(operation)
+            return
+        
+        future = self.pool.submit(
+            execute_move, operation, wanted, self.name_index, self.limiter, devices, link_to,
+            self.link_mode, self.throttle
+        )
+        self.pending.append((future, operation))
+        if len(self.pending) >= self.window:
+            future, operation = self.pending.popleft()
+            future.result()
+            self.emit(operation)
+    
+    def drain(self):
+        """Wait for all moves in flight."""
+        while self.pending:
+            future, operation = self.pending.popleft()
+            future.result()
+            self.emit(operation)
+    
+    def close(self):
+        """Shut down the thread pool."""
+        if self.pool is not None:
+            self.pool.shutdown()
+
+def move_files(categorized, base_path, dry_run=False, name_index=None, workers=1,
+               per_device=None, sink=None, duplicates=None, duplicate_action='report',
+               link_mode=None, throttle=None, fs=None):
+    """
+    Move files to their category folders.
+    
+    Destinations are planned in order on the calling thread, then the
+    moves run on a thread pool when workers > 1. Finished operations are
+    passed on in plan order either way, with only a small window of moves
+    in flight. Duplicates to be hard-linked run after everything else, so
+    the copy they link to is already in place.
+    
+    With a link_mode, the category folders are built out of links and
+    the files themselves stay where they are.
+    
+    Renames, copies and name lookups go through the name index's
+    filesystem backend; links, duplicates and reports are local only.
+    
+    Args:
+        categorized: Dictionary of category -> list of FileRecord
+        base_path: Base directory
+        dry_run: If True, don't actually move files
+        name_index: NameIndex to reuse (a new one is built if None)
+        workers: Number of moves to run at the same time
+        per_device: Max concurrent moves per filesystem (None = workers)
+        sink: Optional ReportWriter, RunStats or SinkGroup fed each
+            operation as it finishes; when given, operations are not kept
+            in memory
+        duplicates: Optional dictionary from find_duplicates
+        duplicate_action: 'skip' to leave duplicates in place, 'hardlink'
+            to replace them with links to the kept copy, 'report' to move
+            them normally and only mark them in the report
+        link_mode: 'hard', 'sym' or 'reflink' to link files instead of
+            moving them (reflink falls back to a hard link)
+        throttle: Optional Throttle capping bytes and moves per second
+        fs: Filesystem backend for a new name index (default: the local disk)
+        
+    Returns:
+        List of Operation with move details (empty if a sink was given)
+    """
+    operations = []
+    emit = operations.append if sink is None else sink.write
+    if name_index is None:
+        name_index = NameIndex(fs)
+    fs = name_index.fs
+    
+    duplicates = duplicates or {}
+    kept = {}
+    if duplicate_action == 'hardlink':
+        kept = {original.path: None for original in duplicates.values()}
+    deferred = []
+    runner = MoveRunner(name_index, emit, 1 if dry_run else workers, per_device, link_mode, throttle)
+    
+    try:
+        for category, records in categorized.items():
+            category_folder = os.path.join(base_path, category)
+            
+            folder_device = None
+            if not dry_run:
+                try:
+                    folder_device = fs.stat(category_folder).st_dev
+                except OSError:
+                    pass
+            
+            for record in records:
+                filepath = record.path
+                original = duplicates.get(filepath)
+                
+                if original is not None and duplicate_action == 'skip':
+                    operation = Operation(record, category, '', 'Skipped (duplicate)')
+                    operation.duplicate_of = original.path
+                    file_logger.info("Skipped duplicate: %s (same as %s)", filepath, original.path)
+                    emit(operation)
+                    continue
+                
+                wanted = os.path.join(category_folder, record.name)
+                operation = plan_operation(record, category, wanted, name_index)
+                destination = operation.new_path
+                devices = (record.device, folder_device)
+                if original is not None:
+                    operation.duplicate_of = original.path
+                if filepath in kept:
+                    kept[filepath] = operation
+                
+                if operation.status != 'Pending':
+                    emit(operation)
+                elif dry_run:
+                    operation.status = 'Dry Run'
+                    file_logger.info("[DRY RUN] Would %s: %s → %s",
+                                     'link' if link_mode else 'move', filepath, destination)
+                    emit(operation)
+                elif original is not None and duplicate_action == 'hardlink':
+                    deferred.append((operation, wanted, devices, original.path))
+                else:
+                    runner.run(operation, wanted, devices)
+        
+        runner.drain()
+        
+        for operation, wanted, devices, original_path in deferred:
+            original = kept.get(original_path)
+            link_to = original.new_path if original and original.status == 'Success' else None
+            runner.run(operation, wanted, devices, link_to)
+        
+        runner.drain()
+    finally:
+        runner.close()
+    
+    return operations
+
+def remove_placeholder(path, fs=None):
+    """Remove a claimed placeholder left behind by a failed move."""
+    fs = fs or LOCAL_FS
+    try:
+        if fs.stat(path).st_size == 0:
+            fs.remove(path)
+    except OSError:
+        pass
+
+class RunStats:
+    """
+    Running totals of a run, updated as each operation is written.
+    
+    Lets the summary be printed without keeping every operation around.
+    """
+    
+    def __init__(self):
+        self.total = 0
+        self.total_bytes = 0
+        self.successful = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.bytes_saved = 0
+        self.throttled = 0.0
+        self.categories = {}
+    
+    def write(self, operation):
+        """Add one Operation to the totals."""
+        size = operation.record.size
+        self.total += 1
+        self.total_bytes += size
+        
+        counts = self.categories.get(operation.category)
+        if counts is None:
+            counts = self.categories[operation.category] = [0, 0]
+        counts[0] += 1
+        counts[1] += size
+        
+        status = operation.status
+        if status == 'Success':
+            self.successful += 1
+        elif status.startswith('Error'):
+            self.failed += 1
+        
+        if operation.duplicate_of:
+            self.duplicates += 1
+            self.duplicate_bytes += size
+            if operation.strategy == 'hardlink' or status == 'Skipped (duplicate)':
+                self.bytes_saved += size
+    
+    def merge(self, other):
+        """Add the totals of another RunStats (e.g. from a batch shard)."""
+        for name in ('total', 'total_bytes', 'successful', 'failed', 'duplicates',
+                     'duplicate_bytes', 'bytes_saved', 'throttled'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for category, (count, size) in other.categories.items():
+            counts = self.categories.setdefault(category, [0, 0])
+            counts[0] += count
+            counts[1] += size
+
+class SinkGroup:
+    """Pass each operation on to several sinks (report, state index, ...)."""
+    
+    def __init__(self, sinks):
+        self.sinks = sinks
+    
+    def write(self, operation):
+        for sink in self.sinks:
+            sink.write(operation)
+
+class ReportWriter:
+    """
+    CSV report written incrementally while files are being moved.
+    
+    Rows are buffered and written in batches, and the file is flushed
+    every few seconds, so memory stays flat and a crashed run still
+    leaves a usable report. Paths ending in .gz are gzip-compressed.
+    """
+    
+    def __init__(self, report_path, stats=None, compress=None,
+                 batch_size=REPORT_BATCH_SIZE, flush_interval=REPORT_FLUSH_INTERVAL):
+        """
+        Open the report and write the header.
+        
+        Args:
+            report_path: Path where report will be saved
+            stats: RunStats to update (a new one is created if None)
+            compress: Force gzip on/off (default: based on .gz suffix)
+            batch_size: Rows buffered before each write
+            flush_interval: Seconds between flushes to disk
+        """
+        import csv
+        import gzip
+        
+        if compress is None:
+            compress = report_path.endswith('.gz')
+        
+        self.report_path = report_path
+        self.stats = stats if stats is not None else RunStats()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.monotonic()
+        
+        if compress:
+            self.file = gzip.open(report_path, 'wt', newline='', encoding='utf-8')
+        else:
+            self.file = open(report_path, 'w', newline='', encoding='utf-8')
+        
+        self.writer = csv.DictWriter(self.file, fieldnames=REPORT_FIELDS)
+        self.writer.writeheader()
+    
+    def write(self, operation):
+        """
+        Add one Operation to the report.
+        
+        Buffered rows are written once a batch fills, or sooner when the
+        flush interval has passed, so a slow run doesn't hold them back.
+        """
+        self.stats.write(operation)
+        self.rows.append(operation)
+        if len(self.rows) >= self.batch_size:
+            self.write_batch()
+        elif time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def write_batch(self):
+        """Write buffered rows, flushing if the interval has passed."""
+        self.writer.writerows([operation.to_row() for operation in self.rows])
+        self.rows.clear()
+        
+        now = time.monotonic()
+        if now - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.last_flush = now
+    
+    def flush(self):
+        """Write buffered rows and flush them to disk now."""
+        if self.rows:
+            self.writer.writerows([operation.to_row() for operation in self.rows])
+            self.rows.clear()
+        self.file.flush()
+        self.last_flush = time.monotonic()
+    
+    def close(self):
+        """Write remaining rows and close the file."""
+        if self.rows:
+            self.writer.writerows([operation.to_row() for operation in self.rows])
+            self.rows.clear()
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def generate_report(operations, report_path):
+    """
+    Generate CSV report of file operations.
+    
+    Args:
+        operations: Iterable of Operation
+        report_path: Path where report will be saved
+    """
+    try:
+        with ReportWriter(report_path) as report:
+            for operation in operations:
+                report.write(operation)
+        
+        logger.info("Report saved: %s", report_path)
+        print(f"\n📄 Report saved: {report_path}")
+        
+    except Exception as e:
+        logger.error("Error generating report: %s", e)
+        print(f"✗ Error saving report: {e}")
+
+def open_report(report_path, stats):
+    """
+    Create the report folder and open a ReportWriter.
+    
+    Args:
+        report_path: Path where report will be saved
+        stats: RunStats the report should update
+        
+    Returns:
+        ReportWriter, or None if the report can't be written
+    """
+    report_dir = os.path.dirname(report_path)
+    try:
+        if report_dir and not os.path.exists(report_dir):
+            os.makedirs(report_dir, exist_ok=True)
+        return ReportWriter(report_path, stats=stats)
+    except Exception as e:
+        logger.error("Error generating report: %s", e)
+        print(f"✗ Error saving report: {e}")
+        return None
+
+def open_text(path, mode):
+    """Open a CSV file for text I/O, gzip-compressed if it ends in .gz."""
+    import gzip
+    
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='', encoding='utf-8')
+    return open(path, mode, newline='', encoding='utf-8')
+
+class PlanWriter:
+    """
+    Move plan saved from a dry run, to be executed later with apply_plan.
+    
+    One row per planned move, with the source's size, mtime and identity
+    so the plan can tell whether a file changed before it is applied.
+    Files the dry run would leave in place are not written.
+    """
+    
+    def __init__(self, plan_path, link_duplicates=False):
+        """
+        Open the plan and write the header.
+        
+        A checkpoint left by applying an earlier plan at the same path is
+        deleted, since its row numbers don't describe this plan.
+        
+        Args:
+            plan_path: Path of the plan file (gzip-compressed if it ends in .gz)
+            link_duplicates: If True, duplicates are planned as hard links
+                to the copy they duplicate
+        """
+        import csv
+        
+        self.plan_path = plan_path
+        self.link_duplicates = link_duplicates
+        self.rows = 0
+        try:
+            os.remove(plan_path + PLAN_CHECKPOINT_SUFFIX)
+        except FileNotFoundError:
+            pass
+        self.file = open_text(plan_path, 'w')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(PLAN_FIELDS)
+    
+    def write(self, operation):
+        """Add one planned Operation."""
+        if operation.status != 'Dry Run':
+            return
+        record = operation.record
+        link_to = operation.duplicate_of if self.link_duplicates else ''
+        self.writer.writerow((
+            record.path, operation.new_path, operation.category, record.size,
+            record.mtime_ns, record.inode, record.device, link_to
+        ))
+        self.rows += 1
+    
+    def close(self):
+        """Close the file."""
+        self.file.close()
+
+def read_plan(plan_path):
+    """
+    Load a plan saved by PlanWriter.
+    
+    Args:
+        plan_path: Path of the plan file
+        
+    Returns:
+        List of (FileRecord, category, destination, link_to)
+        
+    Raises:
+        ValueError: If the file is not a plan
+    """
+    import csv
+    
+    entries = []
+    with open_text(plan_path, 'r') as f:
+        reader = csv.reader(f)
+        if next(reader, None) != PLAN_FIELDS:
+            raise ValueError(f"{plan_path} is not a move plan")
+        for source, destination, category, size, mtime_ns, inode, device, link_to in reader:
+            record = FileRecord(
+                source, os.path.basename(source), int(size), int(mtime_ns), int(inode), int(device)
+            )
+            entries.append((record, category, destination, link_to))
+    return entries
+
+class PlanCheckpoint:
+    """
+    Progress of applying a plan, kept next to it as <plan>.done.
+    
+    Holds the row numbers that are finished (moved or skipped), appended
+    as they complete. Failed rows are not recorded, so they are tried
+    again when the plan is applied again. Writing a new plan to the same
+    path deletes the checkpoint, and so does an apply with no failures.
+    """
+    
+    def __init__(self, plan_path):
+        self.path = plan_path + PLAN_CHECKPOINT_SUFFIX
+        self.done = set()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                # A torn last line from a crash is ignored
+                self.done = {int(line) for line in f if line.strip().isdigit()}
+        except FileNotFoundError:
+            pass
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.pending = []
+    
+    def mark(self, index):
+        """Record that a plan row is finished."""
+        self.pending.append(f"{index}\n")
+        if len(self.pending) >= PLAN_CHECKPOINT_BATCH:
+            self.flush()
+    
+    def flush(self):
+        """Write recorded rows to disk."""
+        if self.pending:
+            self.file.write(''.join(self.pending))
+            self.file.flush()
+            self.pending.clear()
+    
+    def close(self):
+        """Flush and close the file."""
+        self.flush()
+        self.file.close()
+    
+    def remove(self):
+        """Close and delete the checkpoint, once the whole plan is done."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def check_planned_source(record, destination):
+    """
+    Check that a planned file is still the one that was planned.
+    
+    Args:
+        record: FileRecord saved in the plan
+        destination: Planned target path
+        
+    Returns:
+        None if the file can be moved, otherwise the status to report
+    """
+    try:
+        st = os.stat(record.path)
+    except FileNotFoundError:
+        # Moved by an interrupted run before its checkpoint was written?
+        try:
+            moved = os.stat(destination)
+        except OSError:
+            return 'Error: source missing'
+        if moved.st_size == record.size and moved.st_mtime_ns == record.mtime_ns:
+            return 'Skipped (already moved)'
+        return 'Error: source missing'
+    
+    if (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev) != record[2:]:
+        return 'Skipped (changed since plan)'
+    return None
+
+def apply_plan(plan_path, workers=1, per_device=None, sink=None, throttle=None):
+    """
+    Execute a plan saved by a dry run, without scanning again.
+    
+    Each source is checked against the plan first and skipped if it
+    changed. Progress is checkpointed, so applying the same plan again
+    after an interruption continues with the rows not yet finished; the
+    checkpoint is deleted once a run finishes with no failed rows.
+    Planned hard links run last, like in move_files.
+    
+    Args:
+        plan_path: Path of the plan file
+        workers: Number of moves to run at the same time
+        per_device: Max concurrent moves per filesystem (None = workers)
+        sink: Optional ReportWriter, RunStats or SinkGroup fed each operation
+        throttle: Optional Throttle capping bytes and moves per second
+        
+    Returns:
+        Tuple of (list of Operation, empty if a sink was given;
+        number of rows finished by earlier runs)
+    """
+    entries = read_plan(plan_path)
+    checkpoint = PlanCheckpoint(plan_path)
+    operations = []
+    output = operations.append if sink is None else sink.write
+    
+    # Planned names are reserved, so a collision never takes another row's name
+    name_index = NameIndex()
+    folder_devices = {}
+    for record, category, destination, link_to in entries:
+        folder = os.path.dirname(destination)
+        if folder not in folder_devices:
+            try:
+                os.makedirs(folder, exist_ok=True)
+                folder_devices[folder] = os.stat(folder).st_dev
+            except OSError as e:
+                logger.error("Error creating folder %s: %s", folder, e)
+                folder_devices[folder] = None
+        name_index.mark_taken(destination)
+    
+    kept = {link_to: None for _, _, _, link_to in entries if link_to}
+    rows = {}
+    failed = 0
+    
+    def emit(operation):
+        nonlocal failed
+        index = rows.pop(operation)
+        status = operation.status
+        if status == 'Success' or status.startswith('Skipped'):
+            checkpoint.mark(index)
+        else:
+            failed += 1
+        if operation.record.path in kept:
+            kept[operation.record.path] = operation
+        output(operation)
+    
+    runner = MoveRunner(name_index, emit, workers, per_device, throttle=throttle)
+    by_source = {record.path: destination for record, _, destination, _ in entries}
+    deferred = []
+    resumed = 0
+    finished = False
+    
+    try:
+        for index, (record, category, destination, link_to) in enumerate(entries):
+            if index in checkpoint.done:
+                resumed += 1
+                continue
+            
+            operation = Operation(record, category, destination)
+            rows[operation] = index
+            problem = check_planned_source(record, destination)
+            if problem is not None:
+                operation.status = problem
+                file_logger.info("%s: %s", problem, record.path)
+                emit(operation)
+                continue
+            
+            wanted = os.path.join(os.path.dirname(destination), record.name)
+            devices = (record.device, folder_devices[os.path.dirname(destination)])
+            if link_to:
+                operation.duplicate_of = link_to
+                deferred.append((operation, wanted, devices, link_to))
+            else:
+                runner.run(operation, wanted, devices)
+        
+        runner.drain()
+        
+        for operation, wanted, devices, original_path in deferred:
+            original = kept.get(original_path)
+            if original is not None and original.status == 'Success':
+                link_to = original.new_path
+            else:
+                # Moved by an earlier run of this plan, if it is in place
+                link_to = by_source.get(original_path)
+                if link_to is not None and not os.path.exists(link_to):
+                    link_to = None
+            runner.run(operation, wanted, devices, link_to)
+        
+        runner.drain()
+        finished = True
+    finally:
+        runner.close()
+        if finished and not failed:
+            checkpoint.remove()
+        else:
+            checkpoint.close()
+    
+    return operations, resumed
+
+class MoveJournal:
+    """
+    Append-only record of finished moves, used by undo_journal.
+    
+    Only successful moves are written, in batches, each batch synced to
+    disk. A crash loses at most the last batch, and a torn last line is
+    ignored when the journal is read back. Runs writing to an existing
+    journal append to it.
+    """
+    
+    def __init__(self, journal_path, batch_size=JOURNAL_BATCH_SIZE):
+        """
+        Open the journal, writing the header if it is new.
+        
+        Args:
+            journal_path: Path of the journal file
+            batch_size: Moves buffered before each write
+        """
+        import csv
+        
+        folder = os.path.dirname(journal_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.rows = []
+        self.moves = 0
+        self.file = open(journal_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if self.file.tell() == 0:
+            self.writer.writerow(JOURNAL_FIELDS)
+    
+    def write(self, operation):
+        """Add one Operation if it moved a file."""
+        if operation.status != 'Success':
+            return
+        record = operation.record
+        # A hard link shares the mtime of the file it links to
+        mtime_ns = '' if operation.strategy == 'hardlink' else record.mtime_ns
+        self.rows.append((record.path, operation.new_path, record.size, mtime_ns, operation.strategy))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered moves and sync them to disk."""
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.moves += len(self.rows)
+            self.rows.clear()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+    
+    def close(self):
+        """Flush and close the file."""
+        self.flush()
+        self.file.close()
+
+def read_journal(journal_path):
+    """
+    Load the moves recorded in a journal.
+    
+    Args:
+        journal_path: Path of the journal file
+        
+    Returns:
+        List of (source, destination, size, mtime_ns or None, strategy)
+        
+    Raises:
+        ValueError: If the file is not a journal
+    """
+    import csv
+    
+    moves = []
+    with open(journal_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        if next(reader, None) != JOURNAL_FIELDS:
+            raise ValueError(f"{journal_path} is not a move journal")
+        for row in reader:
+            if len(row) != len(JOURNAL_FIELDS) or not row[2].isdigit():
+                logger.warning("Ignoring incomplete journal line: %s", row)
+                continue
+            source, destination, size, mtime_ns, strategy = row
+            moves.append((source, destination, int(size), int(mtime_ns) if mtime_ns else None, strategy))
+    return moves
+
+def check_undo(source, destination, size, mtime_ns):
+    """
+    Check that a journaled move can be reverted.
+    
+    Args:
+        source: Original path of the file
+        destination: Where it was moved to
+        size: Size when it was moved
+        mtime_ns: mtime when it was moved (None to skip the check)
+        
+    Returns:
+        Tuple of (os.stat_result of the destination or None, status to
+        report instead of undoing or None)
+    """
+    try:
+        st = os.stat(destination)
+    except FileNotFoundError:
+        if os.path.lexists(source):
+            return None, 'Skipped (already undone)'
+        return None, 'Error: moved file is missing'
+    
+    if st.st_size != size or (mtime_ns is not None and st.st_mtime_ns != mtime_ns):
+        return None, 'Skipped (changed since move)'
+    if os.path.lexists(source):
+        return None, 'Skipped (original path taken)'
+    return st, None
+
+def undo_journal(journal_path, workers=1, per_device=None, sink=None, throttle=None):
+    """
+    Move files recorded in a journal back where they came from.
+    
+    Moves are undone newest first, through the same MoveRunner as
+    forward moves (renames where possible, parallel when workers > 1).
+    Files changed or removed since they were moved, and original paths
+    taken by a new file, are left alone. Undoing the same journal again
+    skips what is already back. Emptied category folders are removed.
+    
+    Args:
+        journal_path: Path of the journal file
+        workers: Number of moves to run at the same time
+        per_device: Max concurrent moves per filesystem (None = workers)
+        sink: Optional ReportWriter, RunStats or SinkGroup fed each operation
+        throttle: Optional Throttle capping bytes and moves per second
+        
+    Returns:
+        List of Operation (empty if a sink was given)
+    """
+    moves = read_journal(journal_path)
+    operations = []
+    emit = operations.append if sink is None else sink.write
+    runner = MoveRunner(NameIndex(), emit, workers, per_device, throttle=throttle)
+    folder_devices = {}
+    moved_from = set()
+    
+    try:
+        for source, destination, size, mtime_ns, strategy in reversed(moves):
+            st, problem = check_undo(source, destination, size, mtime_ns)
+            folder = os.path.dirname(destination)
+            record = FileRecord(
+                destination, os.path.basename(source), size,
+                st.st_mtime_ns if st else mtime_ns or 0,
+                st.st_ino if st else 0, st.st_dev if st else 0
+            )
+            operation = Operation(record, os.path.basename(folder), source)
+            if problem is not None:
+                operation.status = problem
+                file_logger.info("%s: %s", problem, destination)
+                emit(operation)
+                continue
+            
+            original_folder = os.path.dirname(source)
+            if original_folder not in folder_devices:
+                try:
+                    os.makedirs(original_folder, exist_ok=True)
+                    folder_devices[original_folder] = os.stat(original_folder).st_dev
+                except OSError as e:
+                    logger.error("Error creating folder %s: %s", original_folder, e)
+                    folder_devices[original_folder] = None
+            
+            moved_from.add(folder)
+            runner.run(operation, source, (record.device, folder_devices[original_folder]))
+        
+        runner.drain()
+    finally:
+        runner.close()
+    
+    for folder in moved_from:
+        try:
+            os.rmdir(folder)
+            logger.info("Removed empty folder: %s", folder)
+        except OSError:
+            pass
+    
+    return operations
+
+class Options:
+    """
+    Settings for organize() and iter_operations().
+    
+    Attribute names and defaults match the command-line options (dry_run
+    for --dry-run, and so on), except that no report is written unless
+    report is set. Anything with the same attributes, like the parsed
+    argparse Namespace, can be passed instead.
+    """
+    
+    dry_run = False
+    report = None
+    recursive = False
+    max_depth = None
+    symlinks = 'files'
+    workers = 1
+    per_device = None
+    incremental = False
+    rebuild_index = False
+    duplicates = 'keep'
+    sniff = False
+    journal = None
+    plan = None
+    rules = None
+    max_memory = None
+    link_mode = None
+    max_bytes_per_sec = None
+    max_ops_per_sec = None
+    burst = 1.0
+    adaptive_throttle = False
+    engine = 'sync'
+    in_flight = None
+    
+    NAMES = (
+        'dry_run', 'report', 'recursive', 'max_depth', 'symlinks', 'workers', 'per_device',
+        'incremental', 'rebuild_index', 'duplicates', 'sniff', 'journal', 'plan', 'rules',
+        'max_memory', 'link_mode', 'max_bytes_per_sec', 'max_ops_per_sec', 'burst',
+        'adaptive_throttle', 'engine', 'in_flight'
+    )
+    
+    def __init__(self, **options):
+        """
+        Args:
+            **options: Settings to change from the defaults
+            
+        Raises:
+            TypeError: For an unknown setting
+        """
+        for name, value in options.items():
+            if name not in self.NAMES:
+                raise TypeError(f"Unknown option: {name}")
+            setattr(self, name, value)
+    
+    @classmethod
+    def of(cls, options):
+        """
+        Get an Options from None, an Options, or an object with the same attributes.
+        """
+        if isinstance(options, cls):
+            return options
+        if options is None:
+            return cls()
+        return cls(**{name: getattr(options, name) for name in cls.NAMES if hasattr(options, name)})
+    
+    def replace(self, **changes):
+        """Return a copy with some settings changed."""
+        options = Options(**{name: getattr(self, name) for name in self.NAMES})
+        for name, value in Options(**changes).__dict__.items():
+            setattr(options, name, value)
+        return options
+
+OrganizeResult = namedtuple('OrganizeResult', ['folder', 'stats', 'report', 'journal', 'plan'])
+
+# What iter_operations found before moving anything (passed to on_scan).
+# files: files to organize; scanned: files found (before up-to-date links
+# are dropped); skipped_* and links_*/orphans are None when not in use
+ScanSummary = namedtuple('ScanSummary', [
+    'files', 'scanned', 'duplicates', 'skipped_folders', 'skipped_files',
+    'links_current', 'links_stale', 'orphans'
+])
+
+def split_batches(categorized, size):
+    """
+    Split categorized records into smaller dictionaries of the same shape.
+    
+    Args:
+        categorized: Dictionary of category -> list of FileRecord
+        size: Max records per batch
+        
+    Yields:
+        Dictionary of category -> list of FileRecord
+    """
+    batch = {}
+    count = 0
+    for category, records in categorized.items():
+        start = 0
+        while start < len(records):
+            part = records[start:start + size - count]
+            batch[category] = part
+            count += len(part)
+            start += len(part)
+            if count >= size:
+                yield batch
+                batch = {}
+                count = 0
+    if batch:
+        yield batch
+
+def list_folder(path, recursive=False, symlinks='files', fs=None):
+    """
+    List one folder for the async engine, without stat'ing its files.
+    
+    Entries are sorted like in iter_files, from the cached DirEntry
+    information.
+    
+    Args:
+        path: Folder to list
+        recursive: If True, also return its subfolders
+        symlinks: Symlink policy (see iter_files)
+        fs: Filesystem backend (default: the local disk)
+    
+    Returns:
+        (entries of files, list of (path, name) of subfolders), in listing order
+    
+    Raises:
+        OSError: If the folder can't be listed
+    """
+    fs = fs or LOCAL_FS
+    files = []
+    subfolders = []
+    with fs.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_symlink() and symlinks == 'ignore':
+                    continue
+                if entry.is_file():
+                    files.append(entry)
+                elif recursive and entry.is_dir(follow_symlinks=(symlinks == 'follow')):
+                    subfolders.append((entry.path, entry.name))
+            except OSError as e:
+                logger.error("Error reading entry %s: %s", entry.path, e)
+    return files, subfolders
+
+class HeldOperations:
+    """
+    Finished operations waiting for their turn, kept per category.
+    
+    Up to limit operations are kept in memory. Past that, every
+    category's list is appended to its own temporary file as pickled
+    batches, so memory stays flat however many files arrive before the
+    scan ends. batches() gives back the spilled batches, then the ones
+    still in memory, in the order they were added.
+    """
+    
+    def __init__(self, limit=PIPELINE_HOLD_LIMIT):
+        self.limit = limit
+        self.held = {}
+        self.count = 0
+        self.folder = None
+        self.files = {}
+    
+    def add(self, operation):
+        """
+        Hold one operation.
+        
+        Returns:
+            True once the held operations should be spilled (see spill)
+        """
+        self.held.setdefault(operation.category, []).append(operation)
+        self.count += 1
+        return self.count >= self.limit
+    
+    def spill(self):
+        """Append every held list to its category's file and clear it."""
+        import pickle
+        import tempfile
+        
+        if self.folder is None:
+            self.folder = tempfile.mkdtemp(prefix='organizer-held-')
+        for category, operations in self.held.items():
+            if not operations:
+                continue
+            path = self.files.get(category)
+            if path is None:
+                path = self.files[category] = os.path.join(self.folder, f"{len(self.files)}.pickle")
+            with open(path, 'ab') as f:
+                for start in range(0, len(operations), PIPELINE_BATCH_SIZE):
+                    pickle.dump(operations[start:start + PIPELINE_BATCH_SIZE], f,
+                                pickle.HIGHEST_PROTOCOL)
+            operations.clear()
+        self.count = 0
+    
+    def batches(self, category):
+        """
+        Get the held operations of a category, in order.
+        
+        Yields:
+            Lists of at most PIPELINE_BATCH_SIZE Operation
+        """
+        import pickle
+        
+        path = self.files.get(category)
+        if path is not None:
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        break
+        operations = self.held.get(category, [])
+        for start in range(0, len(operations), PIPELINE_BATCH_SIZE):
+            yield operations[start:start + PIPELINE_BATCH_SIZE]
+    
+    def close(self):
+        """Delete the temporary files."""
+        import shutil
+        
+        if self.folder is not None:
+            shutil.rmtree(self.folder, ignore_errors=True)
+
+class AsyncOrganizer:
+    """
+    A run split into concurrent stages for the async engine.
+    
+    scan lists folders (subfolders ahead of their turn) and stats many
+    files at once; classify sorts them into categories; resolve creates
+    the category folders and picks unique names; move runs the moves;
+    report emits the finished operations. Every stage keeps scan order,
+    so names come out as with move_files, and report restores the order
+    move_files gives (by category in order of first appearance, then
+    scan order). Operations after the first category are therefore held
+    until the scan ends, since an earlier category may still get files;
+    past PIPELINE_HOLD_LIMIT they wait in temporary files (see
+    HeldOperations).
+    
+    Blocking calls go through the pipeline, under its in-flight limit.
+    """
+    
+    def __init__(self, root, options, folder=None, rules=None, throttle=None, fs=None):
+        """
+        Args:
+            root: Folder to organize; category folders are created in it
+            options: Options (engine settings, dry_run, recursive, ...)
+            folder: Folder to scan if not root
+            rules: Optional RuleTable
+            throttle: Optional Throttle
+            fs: Filesystem backend (default: the local disk)
+        """
+        self.root = root
+        self.folder = folder or root
+        self.options = options
+        self.rules = rules
+        self.throttle = throttle
+        self.fs = fs or LOCAL_FS
+        self.dry_run = options.dry_run or bool(options.plan)
+        self.name_index = NameIndex(self.fs)
+        self.limiter = None
+        if options.per_device and not self.dry_run:
+            self.limiter = DeviceLimiter(options.per_device)
+        self.pipeline = None
+    
+    async def main(self, pipeline, emit):
+        """
+        Run all stages (see pipeline.iterate).
+        
+        Args:
+            pipeline: Pipeline to run on
+            emit: Callable given each list of finished Operation
+        """
+        self.pipeline = pipeline
+        scanned = pipeline.queue()
+        classified = pipeline.queue()
+        resolved = pipeline.queue()
+        moving = pipeline.queue(pipeline.in_flight)
+        await pipeline.run(
+            self.scan(scanned),
+            self.classify(scanned, classified),
+            self.resolve(classified, resolved),
+            self.move(resolved, moving),
+            self.report(moving, emit)
+        )
+    
+    async def list(self, path):
+        """Start listing a folder; returns a future."""
+        options = self.options
+        return await self.pipeline.submit(
+            list_folder, path, options.recursive, options.symlinks, self.fs
+        )
+    
+    async def scan(self, out):
+        """Stage 1: walk the folder like iter_files, putting batches of FileRecord."""
+        pipeline = self.pipeline
+        options = self.options
+        symlinks = options.symlinks
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"Unknown symlink policy: {symlinks}")
+        
+        exclude = set(organized_folders(self.rules)) if self.folder == self.root else set()
+        visited = set()
+        if symlinks == 'follow':
+            st = await pipeline.call(self.fs.stat, self.folder)
+            visited.add((st.st_dev, st.st_ino))
+        pending = [(await self.list(self.folder), self.folder, 0)]
+        
+        while pending:
+            listing, path, depth = pending.pop()
+            try:
+                entries, subfolders = await listing
+            except OSError as e:
+                logger.error("Error scanning folder %s: %s", path, e)
+                continue
+            await self.stat_files(entries, out)
+            
+            if options.max_depth is not None and depth >= options.max_depth:
+                continue
+            
+            subfolders = [
+                subfolder for subfolder, name in subfolders
+                if not (depth == 0 and name in exclude)
+            ]
+            if symlinks == 'follow':
+                # Guard against symlink loops, checking in the same order as iter_files
+                checks = [await pipeline.submit(self.fs.stat, subfolder) for subfolder in subfolders]
+                kept = []
+                for subfolder, check in reversed(list(zip(subfolders, checks))):
+                    try:
+                        st = await check
+                    except OSError as e:
+                        logger.error("Error reading folder %s: %s", subfolder, e)
+                        continue
+                    key = (st.st_dev, st.st_ino)
+                    if key in visited:
+                        continue
+                    visited.add(key)
+                    kept.append(subfolder)
+                subfolders = kept[::-1]
+            
+            # List subfolders now, in the order they will be visited
+            listings = [(await self.list(subfolder), subfolder) for subfolder in subfolders]
+            for listing, subfolder in reversed(listings):
+                pending.append((listing, subfolder, depth + 1))
+        
+        await out.put(None)
+    
+    async def stat_files(self, entries, out):
+        """Stat files with up to the in-flight limit at once, keeping their order."""
+        pipeline = self.pipeline
+        entries = iter(entries)
+        window = deque()
+        records = []
+        while True:
+            for entry in islice(entries, pipeline.in_flight - len(window)):
+                window.append((entry, await pipeline.submit(entry.stat)))
+            if not window:
+                break
+            entry, future = window.popleft()
+            try:
+                records.append(FileRecord.from_stat(entry.path, await future, entry.name))
+            except OSError as e:
+                logger.error("Error reading entry %s: %s", entry.path, e)
+            if len(records) >= PIPELINE_BATCH_SIZE:
+                await out.put(records)
+                records = []
+        if records:
+            await out.put(records)
+    
+    async def classify(self, inbox, out):
+        """Stage 2: classify each batch (see classify_batch)."""
+        classifier = get_classifier()
+        sniffer = None
+        if self.options.sniff:
+            sniffer = ContentSniffer(workers=max(self.options.workers, 8))
+        while True:
+            batch = await inbox.get()
+            if batch is None:
+                break
+            if sniffer is not None:
+                # Reading file headers blocks
+                batch = await self.pipeline.call(
+                    classify_batch, batch, classifier, None, sniffer, self.rules
+                )
+            else:
+                batch = classify_batch(batch, classifier, rules=self.rules)
+            await out.put(batch)
+        await out.put(None)
+    
+    def open_category(self, category):
+        """
+        Create a category folder (unless dry run) and list its names.
+        
+        Returns:
+            st_dev of the folder, or None if unknown
+        """
+        folder = os.path.join(self.root, category)
+        device = None
+        if not self.dry_run:
+            create_category_folders(self.root, [category], self.fs)
+            try:
+                device = self.fs.stat(folder).st_dev
+            except OSError:
+                pass
+        try:
+            with self.name_index.lock:
+                self.name_index.names(folder)
+        except OSError:
+            pass  # Each file reports it (see plan_operation)
+        return device
+    
+    async def resolve(self, inbox, out):
+        """Stage 3: plan an Operation with a unique destination for each file."""
+        devices = {}
+        while True:
+            batch = await inbox.get()
+            if batch is None:
+                break
+            planned = []
+            for record, category in zip(*batch):
+                if category not in devices:
+                    devices[category] = await self.pipeline.call(self.open_category, category)
+                wanted = os.path.join(self.root, category, record.name)
+                operation = plan_operation(record, category, wanted, self.name_index)
+                planned.append((operation, wanted, (record.device, devices[category])))
+            await out.put(planned)
+        await out.put(None)
+    
+    async def move(self, inbox, out):
+        """Stage 4: start each move once a slot is free (see execute_move)."""
+        while True:
+            planned = await inbox.get()
+            if planned is None:
+                break
+            for operation, wanted, devices in planned:
+                if operation.status != 'Pending':
+                    await out.put((None, operation))
+                    continue
+                if self.dry_run:
+                    operation.status = 'Dry Run'
+                    file_logger.info("[DRY RUN] Would move: %s → %s",
+                                     operation.record.path, operation.new_path)
+                    await out.put((None, operation))
+                    continue
+                future = await self.pipeline.submit(
+                    execute_move, operation, wanted, self.name_index, self.limiter, devices,
+                    None, None, self.throttle
+                )
+                await out.put((future, operation))
+        await out.put(None)
+    
+    async def report(self, inbox, emit):
+        """Stage 5: wait for moves in order and emit them in move_files order."""
+        pipeline = self.pipeline
+        order = []
+        held = HeldOperations()
+        ready = []
+        try:
+            while True:
+                item = await inbox.get()
+                if item is None:
+                    break
+                future, operation = item
+                if future is not None:
+                    await future
+                category = operation.category
+                if not order:
+                    order.append(category)
+                if category == order[0]:
+                    ready.append(operation)
+                else:
+                    if category not in order:
+                        order.append(category)
+                    if held.add(operation):
+                        await pipeline.write(held.spill)
+                if len(ready) >= PIPELINE_BATCH_SIZE or (ready and inbox.empty()):
+                    await pipeline.write(emit, ready)
+                    ready = []
+            
+            if ready:
+                await pipeline.write(emit, ready)
+            await pipeline.write(self.emit_held, held, order[1:], emit)
+        finally:
+            held.close()
+    
+    def emit_held(self, held, order, emit):
+        """Emit the held operations of each category in turn (on the writer thread)."""
+        for category in order:
+            for operations in held.batches(category):
+                emit(operations)
+
+def iter_pipeline(root, options=None, folder=None, rules=None, throttle=None, fs=None):
+    """
+    Organize a folder with the async engine, yielding each Operation.
+    
+    Gives the same operations, in the same order, as the synchronous
+    path of iter_operations, but scanning, classification, name
+    resolution, moves and report writing overlap, with up to
+    options.in_flight blocking calls running at once. Meant for mounts
+    where every stat and rename takes milliseconds.
+    
+    Args:
+        root: Folder to organize
+        options: Options, an object with the same attributes, or None for defaults
+        folder: Folder to scan if not root
+        rules: Optional RuleTable
+        throttle: Optional Throttle
+        fs: Filesystem backend (default: the local disk)
+        
+    Yields:
+        Operation for each file
+    """
+    from pipeline import IN_FLIGHT, iterate
+    
+    options = Options.of(options)
+    engine = AsyncOrganizer(os.path.abspath(root), options, folder, rules, throttle, fs)
+    return iterate(engine.main, options.in_flight or IN_FLIGHT)
+
+def iter_operations(root, options=None, folder=None, throttle=None, metrics=NULL_METRICS,
+                    on_scan=None):
+    """
+    Organize a folder, yielding each Operation as it finishes.
+    
+    Files are scanned and classified first, then moved in batches of
+    OPERATION_BATCH_SIZE (or all at once for hard-linked duplicates, which
+    need the file they link to). With max_memory (in MB) set, classified
+    files are spilled to sorted chunk files instead of kept in memory.
+    With a link_mode, files are linked into the category folders instead
+    and the link manifest is brought up to date (see links.LinkManifest).
+    With engine 'async', all stages run at once (see iter_pipeline).
+    Closing the generator early leaves the files of later batches where
+    they are. Nothing is printed.
+    
+    Args:
+        root: Folder to organize; category folders are created in it
+        options: Options, an object with the same attributes, or None for defaults
+        folder: Folder to scan if not root (e.g. one subfolder of root)
+        throttle: Throttle to use (default: one built from the options)
+        metrics: Metrics to record stage timings and counters in
+        on_scan: Optional callable given a ScanSummary once the files are
+            scanned and classified, before anything is moved (not called
+            by the async engine, which scans and moves at the same time)
+        
+    Yields:
+        Operation for each file
+        
+    Raises:
+        FileNotFoundError: If the folder does not exist
+        ValueError: If a rule is invalid, the memory ceiling is too low,
+            or options that can't be combined are set
+    """
+    from dedup import find_duplicates
+    from links import LinkManifest
+    
+    options = Options.of(options)
+    root = os.path.abspath(root)
+    folder = os.path.abspath(folder) if folder is not None else root
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(errno.ENOENT, "Folder does not exist", folder)
+    dry_run = options.dry_run or bool(options.plan)
+    rules = open_rules(options.rules, root)
+    if options.max_memory and options.duplicates != 'keep':
+        raise ValueError("Duplicates can't be found with a memory ceiling")
+    if options.link_mode and (options.max_memory or options.duplicates != 'keep'
+                              or options.incremental or options.rebuild_index):
+        raise ValueError("Link mode can't be combined with max_memory, duplicates or incremental")
+    if options.engine == 'async' and (options.max_memory or options.link_mode
+                                      or options.incremental or options.rebuild_index
+                                      or options.duplicates != 'keep'):
+        raise ValueError("The async engine can't be combined with max_memory, link_mode, "
+                         "incremental or duplicates")
+    if throttle is None:
+        throttle = open_throttle(options)
+    
+    if options.engine == 'async':
+        yield from iter_pipeline(root, options, folder, rules, throttle)
+        return
+    
+    state = None
+    spill = None
+    links = None
+    if options.incremental or options.rebuild_index:
+        state = StateIndex(root, rebuild=options.rebuild_index, read_only=dry_run)
+    
+    try:
+        files = iter_files(
+            folder,
+            recursive=options.recursive,
+            max_depth=options.max_depth,
+            symlinks=options.symlinks,
+            exclude=organized_folders(rules) if folder == root else (),
+            state=state
+        )
+        sniffer = None
+        if options.sniff:
+            sniffer = ContentSniffer(state=state, workers=max(options.workers, 8))
+        
+        with metrics.stage('categorize'):
+            files = metrics.timed_iter('scan', files, counter='files_scanned')
+            if options.max_memory:
+                spill = spill_categorized(
+                    files, int(options.max_memory * 1024 * 1024), state, sniffer, rules
+                )
+                categories = spill.categories()
+                total = spill.total
+                metrics.count('spill_chunks', spill.files)
+            else:
+                categorized = categorize_files(files, state, sniffer, rules)
+                categories = list(categorized)
+                total = sum(len(records) for records in categorized.values())
+        if sniffer is not None:
+            metrics.count('headers_read', sniffer.files_read)
+        scanned = total
+        
+        orphans = None
+        if options.link_mode:
+            # Keep links that are still current and drop those whose file is gone
+            with metrics.stage('refresh_links'):
+                links = LinkManifest(root, options.link_mode, dry_run=dry_run)
+                categorized = links.refresh(categorized)
+                orphans = links.remove_orphans()
+            categories = list(categorized)
+            total = sum(len(records) for records in categorized.values())
+        
+        # Find byte-identical files before anything is moved
+        duplicates = {}
+        if options.duplicates != 'keep' and total:
+            records = [record for records in categorized.values() for record in records]
+            with metrics.stage('duplicates'):
+                duplicates = find_duplicates(records, workers=max(options.workers, 4))
+        
+        if on_scan is not None:
+            on_scan(ScanSummary(
+                total, scanned, len(duplicates),
+                state.skipped_folders if state is not None else None,
+                state.skipped_files if state is not None else None,
+                links.current if links is not None else None,
+                links.stale if links is not None else None,
+                orphans
+            ))
+        if not total:
+            return
+        
+        if not dry_run:
+            with metrics.stage('create_folders'):
+                create_category_folders(root, categories)
+        
+        if spill is not None:
+            batches = spill.batches(OPERATION_BATCH_SIZE)
+            name_index = DiskNameIndex()
+        elif options.duplicates == 'hardlink':
+            batches = [categorized]
+            name_index = NameIndex()
+        else:
+            batches = split_batches(categorized, OPERATION_BATCH_SIZE)
+            name_index = NameIndex()
+        if metrics.enabled:
+            # Time collision resolution apart from the moves
+            name_index.allocate = metrics.wrap('resolve_names', name_index.allocate)
+        
+        with metrics.stage('move'):
+            for batch in batches:
+                operations = move_files(
+                    batch,
+                    root,
+                    dry_run=dry_run,
+                    name_index=name_index,
+                    workers=options.workers,
+                    per_device=options.per_device,
+                    duplicates=duplicates,
+                    duplicate_action=options.duplicates,
+                    link_mode=options.link_mode,
+                    throttle=throttle
+                )
+                for operation in operations:
+                    if state is not None and not dry_run:
+                        state.write(operation)
+                    if links is not None:
+                        links.write(operation)
+                    yield operation
+    finally:
+        if spill is not None:
+            spill.close()
+        if links is not None:
+            links.close()
+        if state is not None:
+            with metrics.stage('save_state'):
+                state.close(save=not dry_run)
+
+def organize(root, options=None, folder=None, stats=None):
+    """
+    Organize a folder and return the totals.
+    
+    The library entry point: no output is printed and no logging is
+    configured, so it can be called repeatedly from a long-running
+    process. Use iter_operations() to get each Operation instead.
+    
+    Args:
+        root: Folder to organize
+        options: Options, an object with the same attributes, or None for defaults
+        folder: Folder to scan if not root (e.g. one subfolder of root)
+        stats: RunStats to add to (a new one is created if None)
+        
+    Returns:
+        OrganizeResult with the folder, RunStats and the paths of the
+        report, journal and plan written (None if not requested)
+        
+    Raises:
+        FileNotFoundError: If the folder does not exist
+        OSError: If the report, journal or plan can't be written
+    
+    Example:
+        >>> result = organize('~/Downloads', Options(dry_run=True))
+        >>> result.stats.total
+    """
+    options = Options.of(options)
+    root = os.path.abspath(os.path.expanduser(root))
+    if stats is None:
+        stats = RunStats()
+    
+    throttle = open_throttle(options)
+    sinks = []
+    report = plan = journal = None
+    try:
+        if options.report:
+            report_dir = os.path.dirname(options.report)
+            if report_dir:
+                os.makedirs(report_dir, exist_ok=True)
+            report = ReportWriter(options.report, stats=stats)
+            sinks.append(report)
+        else:
+            sinks.append(stats)
+        if options.plan:
+            plan = PlanWriter(options.plan, link_duplicates=(options.duplicates == 'hardlink'))
+            sinks.append(plan)
+        if options.journal:
+            journal = MoveJournal(options.journal)
+            sinks.append(journal)
+        
+        sink = SinkGroup(sinks)
+        for operation in iter_operations(root, options, folder, throttle):
+            sink.write(operation)
+    finally:
+        if throttle is not None:
+            stats.throttled += throttle.throttled
+        for writer in (report, plan, journal):
+            if writer is not None:
+                writer.close()
+    
+    return OrganizeResult(root, stats, options.report, options.journal, options.plan)
+
+def load_jobs(jobs_path):
+    """
+    Read the folders listed in a jobs file.
+    
+    One folder per line; blank lines and lines starting with # are skipped.
+    
+    Args:
+        jobs_path: Path of the jobs file
+        
+    Returns:
+        List of folder paths
+    """
+    with open(jobs_path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def plan_shards(roots, recursive=False, max_depth=None, symlinks='files', split=True, rules=None):
+    """
+    Split the folders of a batch run into independent pieces of work.
+    
+    With recursive scanning, a folder becomes one shard for its own files
+    plus one shard per subfolder, so a single huge tree still spreads over
+    all processes. Every shard moves files into its root's category folders.
+    
+    Args:
+        roots: Folders to organize
+        recursive: If True, subfolders are organized too
+        max_depth: Deepest subfolder level to scan (None = no limit)
+        symlinks: Symlink policy (see iter_files)
+        split: If False, each root is a single shard
+        rules: Optional RuleTable whose destination folders are not split off
+        
+    Returns:
+        List of (root, folder, recursive, max_depth) tuples
+    """
+    excluded = set(organized_folders(rules))
+    shards = []
+    for root in roots:
+        root = os.path.abspath(root)
+        if not (split and recursive and max_depth != 0 and os.path.isdir(root)):
+            shards.append((root, root, recursive, max_depth))
+            continue
+        
+        shards.append((root, root, False, None))
+        sub_depth = None if max_depth is None else max_depth - 1
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.name in excluded:
+                        continue
+                    if entry.is_symlink() and symlinks != 'follow':
+                        continue
+                    if entry.is_dir():
+                        shards.append((root, entry.path, True, sub_depth))
+        except OSError as e:
+            logger.error("Error scanning folder %s: %s", root, e)
+    return shards
+
+def init_shard_process(log_queue, sample_every):
+    """Send a batch worker process's log messages to the main process."""
+    import logging.handlers
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    
+    for log_filter in list(file_logger.filters):
+        file_logger.removeFilter(log_filter)
+    file_logger.addFilter(SamplingFilter(sample_every))
+
+def organize_shard(shard, args, part_dir, index):
+    """
+    Organize one shard of a batch run in a worker process.
+    
+    Any error is caught and returned, so one bad folder never stops the
+    other shards. Report and journal rows go to part files in part_dir,
+    merged by the main process in shard order.
+    
+    Args:
+        shard: (root, folder, recursive, max_depth) from plan_shards
+        args: Parsed command-line options
+        part_dir: Folder for this run's part files
+        index: Shard number, used to name the part files
+        
+    Returns:
+        Tuple of (RunStats, error message or None)
+    """
+    root, folder, recursive, max_depth = shard
+    options = Options.of(args).replace(
+        recursive=recursive,
+        max_depth=max_depth,
+        report=os.path.join(part_dir, f"report-{index}.csv"),
+        journal=os.path.join(part_dir, f"journal-{index}.csv") if args.journal else None,
+        plan=None
+    )
+    stats = RunStats()
+    try:
+        organize(root, options, folder=folder, stats=stats)
+        error = None
+    except Exception as e:
+        logger.error("Error organizing %s: %s", folder, e)
+        error = str(e)
+    
+    return stats, error
+
+def merge_parts(part_paths, output, header):
+    """
+    Append CSV part files to an open output, skipping their header lines.
+    
+    Args:
+        part_paths: Part files in the order they should appear
+        output: Open text file to append to
+        header: Header line to write first, or None
+    """
+    import shutil
+    
+    if header is not None:
+        output.write(header)
+    for part_path in part_paths:
+        try:
+            with open(part_path, newline='', encoding='utf-8') as part:
+                part.readline()
+                shutil.copyfileobj(part, output)
+        except FileNotFoundError:
+            pass
+
+def check_settled(held, settle, left, ignore=(), symlinks='files'):
+    """
+    Pick the held files whose size and mtime have stopped changing.
+    
+    Symlinks are handled as in iter_files: skipped with 'ignore', and
+    otherwise organized if they point to a file.
+    
+    Args:
+        held: Dictionary of path -> ((size, mtime_ns), since) or None,
+            updated in place
+        settle: Seconds a file must stay unchanged
+        left: Dictionary of path -> (size, mtime_ns) for files already
+            handled and left in place
+        ignore: Paths never to organize (e.g. the report)
+        symlinks: Symlink policy (see iter_files)
+        
+    Returns:
+        List of FileRecord ready to be organized
+    """
+    ready = []
+    now = time.monotonic()
+    
+    for path in list(held):
+        try:
+            st = os.lstat(path)
+            if stat.S_ISLNK(st.st_mode):
+                if symlinks == 'ignore':
+                    del held[path]
+                    continue
+                st = os.stat(path)
+        except OSError:
+            del held[path]
+            continue
+        
+        signature = (st.st_size, st.st_mtime_ns)
+        if path in ignore or not stat.S_ISREG(st.st_mode) or left.get(path) == signature:
+            del held[path]
+            continue
+        
+        previous = held[path]
+        if previous is None or previous[0] != signature:
+            held[path] = (signature, now)
+        elif now - previous[1] >= settle:
+            ready.append(FileRecord.from_stat(path, st))
+            del held[path]
+    
+    return ready
+
+def watch_folder(folder_path, scan, args, sink, state=None, sniffer=None, ignore=(), rules=None,
+                 throttle=None):
+    """
+    Keep organizing a folder as files arrive, until interrupted.
+    
+    Changes come from inotify (or polling where it isn't available) and
+    are collected until the folder has been quiet for args.debounce
+    seconds. Files still being written are held until their size and
+    mtime have been stable for args.settle seconds. The classifier and
+    destination NameIndex stay warm between batches.
+    
+    Args:
+        folder_path: Folder to watch
+        scan: Callable returning FileRecords for the whole folder
+        args: Parsed command-line options
+        sink: ReportWriter, RunStats or SinkGroup fed each operation
+        state: Optional StateIndex
+        sniffer: Optional ContentSniffer
+        ignore: Paths never to organize (e.g. the report)
+        rules: Optional RuleTable
+        throttle: Optional Throttle
+    """
+    from dedup import find_duplicates
+    from watcher import open_watcher
+    
+    name_index = NameIndex()
+    created = set()
+    left = {}
+    watcher = open_watcher(
+        folder_path,
+        scan,
+        recursive=args.recursive,
+        exclude=organized_folders(rules),
+        interval=args.debounce,
+        polling=args.poll,
+        max_depth=args.max_depth,
+        symlinks=args.symlinks
+    )
+    
+    # Files already there are organized first, once they have settled
+    held = {record.path: None for record in scan()}
+    first_event = None
+    
+    try:
+        while True:
+            changed = watcher.poll(args.debounce)
+            now = time.monotonic()
+            
+            if changed:
+                for path in changed:
+                    held.setdefault(path, None)
+                if first_event is None:
+                    first_event = now
+                if now - first_event < WATCH_MAX_DELAY:
+                    continue
+            first_event = None
+            
+            records = check_settled(held, args.settle, left, ignore, args.symlinks)
+            if not records:
+                continue
+            
+            categorized = categorize_files(records, state, sniffer, rules)
+            new_categories = [category for category in categorized if category not in created]
+            if new_categories and not args.dry_run:
+                create_category_folders(folder_path, new_categories)
+                created.update(new_categories)
+            
+            duplicates = {}
+            if args.duplicates != 'keep':
+                duplicates = find_duplicates(records, workers=max(args.workers, 4))
+            
+            operations = move_files(
+                categorized,
+                folder_path,
+                dry_run=args.dry_run,
+                name_index=name_index,
+                workers=args.workers,
+                per_device=args.per_device,
+                duplicates=duplicates,
+                duplicate_action=args.duplicates,
+                throttle=throttle
+            )
+            
+            for operation in operations:
+                sink.write(operation)
+                if operation.status != 'Success':
+                    record = operation.record
+                    left[record.path] = (record.size, record.mtime_ns)
+            
+            for part in getattr(sink, 'sinks', [sink]):
+                if hasattr(part, 'flush'):
+                    part.flush()
+            
+            moved = sum(1 for operation in operations if operation.status == 'Success')
+            print(f"📦 {datetime.now():%H:%M:%S} Organized {moved} of {len(operations)} files")
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopped watching")
+    finally:
+        watcher.close()
+
+def format_size(size):
+    """Format a byte count for display (e.g., '1.5 MB')."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+
+def display_summary(stats, dry_run=False, linked=False):
+    """
+    Display summary of operations.
+    
+    Args:
+        stats: RunStats collected while moving
+        dry_run: If True, skip the moved/failed counts
+        linked: If True, files were linked rather than moved
+    """
+    print("\n" + "="*50)
+    print("📊 SUMMARY")
+    print("="*50)
+    
+    print(f"\nTotal files: {stats.total} ({format_size(stats.total_bytes)})")
+    
+    print("\nBy category:")
+    for category, (count, size) in sorted(stats.categories.items()):
+        print(f"  {category}: {count} files ({format_size(size)})")
+    
+    if not dry_run:
+        print(f"\n✓ Successfully {'linked' if linked else 'moved'}: {stats.successful}")
+        if stats.failed > 0:
+            print(f"✗ Failed: {stats.failed}")
+    
+    if stats.duplicates:
+        print(f"\n♻️  Duplicates: {stats.duplicates} files ({format_size(stats.duplicate_bytes)}), "
+              f"saved {format_size(stats.bytes_saved)}")
+    
+    if stats.throttled:
+        print(f"\n🐢 Throttled: {stats.throttled:.1f}s of worker time spent waiting for the I/O budget")
+    
+    print("="*50 + "\n")
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through one in every N per-file INFO messages.
+    
+    Warnings and errors always pass. The number of dropped messages is
+    kept so a summary line can be logged at the end. Worker threads log
+    at the same time, so the counters are updated under a lock.
+    """
+    
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(every, 1)
+        self.seen = 0
+        self.suppressed = 0
+        self.lock = threading.Lock()
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        with self.lock:
+            self.seen += 1
+            if (self.seen - 1) % self.every == 0:
+                return True
+            self.suppressed += 1
+            return False
+
+class LazyQueueHandler(logging.Handler):
+    """
+    Queue handler that leaves formatting to the background thread.
+    
+    The standard QueueHandler runs the full formatter before queueing
+    each record, which puts the timestamp and layout work on the caller.
+    Here only the message is merged with its arguments (so a mutable
+    argument can't change before the record is written) and a traceback
+    is turned into text; the formatter runs on the listener thread.
+    It is a plain Handler with the same queue protocol, so importing
+    this module doesn't load logging.handlers.
+    """
+    
+    def __init__(self, queue):
+        super().__init__()
+        self.queue = queue
+    
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+    
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(log_path='organizer.log', sample_every=1, max_bytes=10 * 1024 * 1024):
+    """
+    Send log messages to a rotating file through a background thread.
+    
+    Log calls only create a record and put it on a queue; formatting
+    and file writes happen on the listener thread.
+    
+    Args:
+        log_path: Log file path
+        sample_every: Keep one in this many per-file INFO messages
+        max_bytes: Rotate the log file at this size (0 = never)
+        
+    Returns:
+        Started QueueListener (pass to shutdown_logging)
+    """
+    import logging.handlers
+    import queue
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=max_bytes, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    
+    root = logging.getLogger()
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    
+    sampler = SamplingFilter(sample_every)
+    file_logger.addFilter(sampler)
+    listener.sampler = sampler
+    
+    listener.start()
+    return listener
+
+def shutdown_logging(listener):
+    """Log the sampling summary and wait for queued messages to be written."""
+    sampler = listener.sampler
+    if sampler.suppressed:
+        logger.info("%d per-file messages not logged (sampling 1 in %d)", sampler.suppressed, sampler.every)
+    file_logger.removeFilter(sampler)
+    listener.stop()
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, LazyQueueHandler):
+            root.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+
+def main():
+    """Main function."""
+    import argparse
+    import cProfile
+    from dedup import DUPLICATE_ACTIONS
+    from links import LINK_MODES
+    from rules import parse_size
+    
+    parser = argparse.ArgumentParser(
+        description='🗂️  File Organizer - Automatically organize files by type',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python organizer.py --folder ~/Downloads --dry-run
+  python organizer.py --folder ~/Desktop --report my-report.csv
+  python organizer.py --help
+        """
+    )
+    
+    parser.add_argument(
+        '--folder',
+        default='./test_folder',
+        help='Folder to organize (default: ./test_folder)'
+    )
+    
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show what would happen without moving files'
+    )
+    
+    parser.add_argument(
+        '--report',
+        default='./reports/report.csv',
+        help='Output report path, gzip-compressed if it ends in .gz (default: ./reports/report.csv)'
+    )
+    
+    parser.add_argument(
+        '--recursive',
+        action='store_true',
+        help='Also organize files in subfolders'
+    )
+    
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=None,
+        help='Deepest subfolder level to scan with --recursive (default: no limit)'
+    )
+    
+    parser.add_argument(
+        '--symlinks',
+        choices=SYMLINK_POLICIES,
+        default='files',
+        help="Symlink policy: 'files' keeps symlinked files, 'ignore' skips them, "
+             "'follow' also enters symlinked folders (default: files)"
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of files to move in parallel (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--per-device',
+        type=int,
+        default=None,
+        help='Max parallel moves per filesystem (default: same as --workers)'
+    )
+    
+    parser.add_argument(
+        '--max-bytes-per-sec',
+        default=None,
+        metavar='SIZE',
+        help="Cap the data copied per second across all workers, e.g. '50MB' "
+             "(renames on the same disk copy nothing)"
+    )
+    
+    parser.add_argument(
+        '--max-ops-per-sec',
+        type=float,
+        default=None,
+        help='Cap the files moved per second across all workers'
+    )
+    
+    parser.add_argument(
+        '--burst',
+        type=float,
+        default=1.0,
+        help="Seconds' worth of the --max-*-per-sec budgets that can be used at once "
+             "after a quiet spell (default: 1)"
+    )
+    
+    parser.add_argument(
+        '--adaptive-throttle',
+        action='store_true',
+        help='Slow down further while disk latency is well above normal, '
+             'and speed back up when it recovers'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=ENGINES,
+        default='sync',
+        help="'sync' scans, then classifies, then moves; 'async' runs all stages at once with "
+             "many calls in flight, for network mounts where each call is slow (default: sync)"
+    )
+    
+    parser.add_argument(
+        '--in-flight',
+        type=int,
+        default=None,
+        help='With --engine async, most filesystem calls running at once (default: 32)'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Remember earlier runs and skip unchanged files and folders'
+    )
+    
+    parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help='Forget what earlier runs remembered (implies --incremental)'
+    )
+    
+    parser.add_argument(
+        '--duplicates',
+        choices=DUPLICATE_ACTIONS,
+        default='keep',
+        help="Byte-identical files: 'keep' moves them all without checking, "
+             "'skip' leaves copies in place, 'hardlink' replaces copies with links, "
+             "'report' moves them but marks them in the report (default: keep)"
+    )
+    
+    parser.add_argument(
+        '--sniff',
+        action='store_true',
+        help='Look at file contents when the extension is missing or unknown'
+    )
+    
+    parser.add_argument(
+        '--rules',
+        default=None,
+        help='JSON file of rules on size, age, name or subfolder (default: RULES in config.py)'
+    )
+    
+    parser.add_argument(
+        '--link-mode',
+        choices=LINK_MODES,
+        default=None,
+        help="Build the category folders out of links and leave the files where they are: "
+             "'hard' links, 'sym' links, or 'reflink' copy-on-write clones (hard link where "
+             "unsupported). Rerun to refresh; links to deleted files are removed"
+    )
+    
+    parser.add_argument(
+        '--max-memory',
+        type=float,
+        default=None,
+        metavar='MB',
+        help='Keep memory use under this many MB however large the folder: classified '
+             'files are spilled to sorted temporary files (in TMPDIR) and moved in batches'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Keep running and organize new files as they arrive'
+    )
+    
+    parser.add_argument(
+        '--debounce',
+        type=float,
+        default=WATCH_DEBOUNCE,
+        help=f'With --watch, seconds of quiet before a batch runs (default: {WATCH_DEBOUNCE:g})'
+    )
+    
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=WATCH_SETTLE,
+        help=f"With --watch, seconds a file's size and mtime must stay unchanged "
+             f"before it is moved (default: {WATCH_SETTLE:g})"
+    )
+    
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='With --watch, scan the folder periodically instead of using inotify'
+    )
+    
+    parser.add_argument(
+        '--log-file',
+        default='organizer.log',
+        help='Log file path (default: organizer.log)'
+    )
+    
+    parser.add_argument(
+        '--log-sample',
+        type=int,
+        default=1,
+        help='Log only one in N per-file messages; errors are always logged (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--log-max-mb',
+        type=float,
+        default=10,
+        help='Rotate the log file at this size in MB, 0 to never rotate (default: 10)'
+    )
+    
+    parser.add_argument(
+        '--plan',
+        default=None,
+        help='Save the planned moves to this file instead of moving (implies --dry-run)'
+    )
+    
+    parser.add_argument(
+        '--apply-plan',
+        default=None,
+        help='Execute a plan saved with --plan without scanning again; '
+             'rerun to resume an interrupted run'
+    )
+    
+    parser.add_argument(
+        '--journal',
+        default=None,
+        help='Append every finished move to this journal, so the run can be undone'
+    )
+    
+    parser.add_argument(
+        '--undo',
+        default=None,
+        metavar='JOURNAL',
+        help='Move the files recorded in a journal back where they came from'
+    )
+    
+    parser.add_argument(
+        '--roots',
+        nargs='+',
+        default=None,
+        metavar='FOLDER',
+        help='Organize several folders in one run, spread over worker processes'
+    )
+    
+    parser.add_argument(
+        '--jobs',
+        default=None,
+        help='File listing folders to organize, one per line (like --roots)'
+    )
+    
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Worker processes for --roots/--jobs; recursive folders are split '
+             'by subfolder across them (default: number of CPUs)'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        default=None,
+        help='Write per-stage timings, counters and peak memory to this JSON file'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        default=None,
+        help='Write a cProfile dump of the run to this file (view with python -m pstats)'
+    )
+    
+    args = parser.parse_args()
+    if args.plan:
+        args.dry_run = True
+    if args.max_bytes_per_sec is not None:
+        try:
+            args.max_bytes_per_sec = parse_size(args.max_bytes_per_sec)
+        except ValueError as e:
+            parser.error(f'--max-bytes-per-sec: {e}')
+        if args.max_bytes_per_sec <= 0:
+            parser.error('--max-bytes-per-sec must be more than 0')
+    if args.max_ops_per_sec is not None and args.max_ops_per_sec <= 0:
+        parser.error('--max-ops-per-sec must be more than 0')
+    if args.adaptive_throttle and not (args.max_bytes_per_sec or args.max_ops_per_sec):
+        parser.error('--adaptive-throttle needs --max-bytes-per-sec or --max-ops-per-sec')
+    if args.burst <= 0:
+        parser.error('--burst must be more than 0')
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.per_device is not None and args.per_device < 1:
+        parser.error('--per-device must be at least 1')
+    if args.apply_plan and (args.plan or args.watch or args.dry_run):
+        parser.error('--apply-plan cannot be combined with --plan, --watch or --dry-run')
+    if args.undo and (args.apply_plan or args.plan or args.watch or args.dry_run):
+        parser.error('--undo cannot be combined with --apply-plan, --plan, --watch or --dry-run')
+    if (args.roots or args.jobs) and (args.watch or args.plan or args.apply_plan or args.undo):
+        parser.error('--roots/--jobs cannot be combined with --watch, --plan, --apply-plan or --undo')
+    if args.journal and args.dry_run:
+        parser.error('--journal has nothing to record with --dry-run or --plan')
+    if args.max_memory and (args.watch or args.duplicates != 'keep'):
+        parser.error('--max-memory cannot be combined with --watch or --duplicates')
+    if args.link_mode and (args.watch or args.plan or args.apply_plan or args.undo or args.journal
+                           or args.roots or args.jobs or args.max_memory or args.incremental
+                           or args.rebuild_index or args.duplicates != 'keep'):
+        parser.error('--link-mode cannot be combined with --watch, --plan, --apply-plan, --undo, '
+                     '--journal, --roots/--jobs, --max-memory, --incremental or --duplicates')
+    if args.in_flight is not None and (args.in_flight < 1 or args.engine != 'async'):
+        parser.error('--in-flight needs --engine async and must be at least 1')
+    if args.engine == 'async' and (args.watch or args.apply_plan or args.undo or args.max_memory
+                                   or args.link_mode or args.incremental or args.rebuild_index
+                                   or args.duplicates != 'keep'):
+        parser.error('--engine async cannot be combined with --watch, --apply-plan, --undo, '
+                     '--max-memory, --link-mode, --incremental or --duplicates')
+    
+    listener = setup_logging(
+        args.log_file,
+        sample_every=args.log_sample,
+        max_bytes=int(args.log_max_mb * 1024 * 1024)
+    )
+    metrics = Metrics() if args.metrics_json else NULL_METRICS
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            run(args, metrics)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+                print(f"⏱️  Profile saved: {args.profile}")
+            if metrics.enabled:
+                metrics.save(args.metrics_json)
+                print(f"📊 Metrics saved: {args.metrics_json}")
+    finally:
+        shutdown_logging(listener)
+
+def record_throttle(throttle, stats, metrics=NULL_METRICS):
+    """
+    Add the time a run spent throttled to its totals and metrics.
+    
+    Args:
+        throttle: Throttle used by the run, or None
+        stats: RunStats of the run
+        metrics: Metrics to count the waits in
+    """
+    if throttle is None:
+        return
+    stats.throttled += throttle.throttled
+    metrics.count('throttled_seconds', round(throttle.throttled, 3))
+    metrics.count('throttle_waits', throttle.waits)
+    if throttle.lowest_scale < 1.0:
+        print(f"🐢 Disk latency rose; the I/O budget went down to {throttle.lowest_scale:.0%}")
+
+def run(args, metrics=NULL_METRICS):
+    """
+    Organize a folder according to parsed command-line options.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        metrics: Metrics to record stage timings and counters in
+    """
+    # Convert to absolute path
     folder_path = os.path.abspath(args.folder)
     
     # Print header
@@ -243,6 +3406,18 @@ Examples:
     if args.dry_run:
         print("\n🧪 DRY RUN MODE (no files will be moved)\n")
     
+    if args.apply_plan:
+        run_plan(args, metrics)
+        return
+    
+    if args.undo:
+        run_undo(args, metrics)
+        return
+    
+    if args.roots or args.jobs:
+        run_batch(args, metrics)
+        return
+    
     # Check if folder exists
     if not os.path.exists(folder_path):
         print(f"\n✗ Error: Folder '{folder_path}' does not exist!")
@@ -250,37 +3425,455 @@ Examples:
     
     # Scan folder
     print(f"\n📁 Scanning: {folder_path}")
-    files = scan_folder(folder_path)
+    for suffix, first, second in get_classifier().conflicts:
+        logger.warning("Extension %s listed under %s and %s, using %s", suffix, first, second, first)
     
-    if not files:
-        print("\n📭 No files found in this folder!")
+    try:
+        rules = open_rules(args.rules, folder_path)
+    except (OSError, ValueError) as e:
+        print(f"\n✗ Error: Invalid rules: {e}")
+        return
+    
+    if args.engine == 'async':
+        run_async(args, metrics)
+        return
+    
+    throttle = open_throttle(args)
+    if args.watch:
+        run_watch(args, rules, throttle, metrics)
         return
     
-    print(f"Found {len(files)} files")
+    # Scanning, classification, links, duplicates and moves all happen in
+    # iter_operations; this only prints progress and writes the outputs
+    stats = RunStats()
+    report = plan = journal = sink = None
     
-    # Categorize files
-    categorized = categorize_files(files)
+    def on_scan(summary):
+        """Print what the scan found and open the outputs before any move."""
+        nonlocal report, plan, journal, sink
+        if summary.orphans is not None:
+            print(f"🔗 {summary.links_current} links up to date, {summary.links_stale} changed, "
+                  f"{summary.orphans} orphaned links {'to remove' if args.dry_run else 'removed'}")
+            if summary.scanned and not summary.files:
+                print("\n✅ Nothing to link, the category folders are up to date\n")
+                return
+        logger.info("Scanned folder: %s, found %d files", folder_path, summary.files)
+        
+        if summary.skipped_folders is not None:
+            print(f"⏭️  Skipped {summary.skipped_folders} unchanged folders, "
+                  f"{summary.skipped_files} unchanged files")
+        
+        if not summary.files:
+            print("\n📭 No files found in this folder!")
+            return
+        
+        print(f"Found {summary.files} files")
+        if args.duplicates != 'keep':
+            print(f"♻️  Found {summary.duplicates} duplicate files")
+        
+        # Open the report before moving so rows are written as they happen
+        report = open_report(args.report, stats)
+        sink = report if report is not None else stats
+        if args.plan:
+            plan = PlanWriter(args.plan, link_duplicates=(args.duplicates == 'hardlink'))
+            sink = SinkGroup([sink, plan])
+        if args.journal:
+            journal = MoveJournal(args.journal)
+            sink = SinkGroup([sink, journal])
+        if metrics.enabled:
+            # Time report writing apart from the moves
+            sink = SinkGroup([sink, metrics])
+            sink.write = metrics.wrap('report', sink.write)
+        
+        if args.dry_run:
+            print("\n📋 Preview...")
+        else:
+            print(f"\n{'🔗 Linking files' if args.link_mode else '📦 Organizing files'}...")
     
-    # Create category folders (skip in dry-run)
-    if not args.dry_run:
-        categories = list(categorized.keys())
-        create_category_folders(folder_path, categories)
+    operations = iter_operations(folder_path, Options.of(args), throttle=throttle,
+                                 metrics=metrics, on_scan=on_scan)
+    try:
+        for operation in operations:
+            sink.write(operation)
+    except ValueError as e:
+        # E.g. a memory ceiling too low for the spill sort
+        print(f"\n✗ Error: {e}")
+        return
+    finally:
+        record_throttle(throttle, stats, metrics)
+        if report is not None:
+            with metrics.stage('report'):
+                report.close()
+        if plan is not None:
+            plan.close()
+        if journal is not None:
+            journal.close()
     
-    # Move files
-    print(f"\n{'📋 Preview' if args.dry_run else '📦 Organizing files'}...")
-    operations = move_files(categorized, folder_path, dry_run=args.dry_run)
+    if sink is None:
+        return
     
     # Display summary
-    display_summary(categorized, operations, args.dry_run)
+    display_summary(stats, args.dry_run, linked=bool(args.link_mode))
+    display_outputs(args, report, journal, plan)
+
+def run_watch(args, rules, throttle, metrics=NULL_METRICS):
+    """
+    Keep organizing a folder as files arrive (--watch), until interrupted.
     
-    # Generate report
-    if operations:
-        # Ensure reports directory exists
-        report_dir = os.path.dirname(args.report)
-        if report_dir and not os.path.exists(report_dir):
-            os.makedirs(report_dir, exist_ok=True)
+    Args:
+        args: Namespace from the argument parser in main()
+        rules: RuleTable from open_rules(), or None
+        throttle: Throttle from open_throttle(), or None
+        metrics: Metrics to record stage timings and counters in
+    """
+    folder_path = os.path.abspath(args.folder)
+    state = None
+    if args.incremental or args.rebuild_index:
+        state = StateIndex(folder_path, rebuild=args.rebuild_index, read_only=args.dry_run)
+    sniffer = None
+    if args.sniff:
+        sniffer = ContentSniffer(state=state, workers=max(args.workers, 8))
+    
+    stats = RunStats()
+    report = open_report(args.report, stats)
+    sink = report if report is not None else stats
+    if state is not None and not args.dry_run:
+        sink = SinkGroup([sink, state])
+    journal = MoveJournal(args.journal) if args.journal else None
+    if journal is not None:
+        sink = SinkGroup([sink, journal])
+    if metrics.enabled:
+        sink = SinkGroup([sink, metrics])
+    
+    scan = lambda: iter_files(
+        folder_path,
+        recursive=args.recursive,
+        max_depth=args.max_depth,
+        symlinks=args.symlinks,
+        exclude=organized_folders(rules)
+    )
+    print("👀 Watching for new files (Ctrl+C to stop)...")
+    try:
+        with metrics.stage('watch'):
+            watch_folder(
+                folder_path, scan, args, sink, state, sniffer,
+                ignore={os.path.abspath(args.report)},
+                rules=rules,
+                throttle=throttle
+            )
+    finally:
+        record_throttle(throttle, stats, metrics)
+        if report is not None:
+            report.close()
+        if journal is not None:
+            journal.close()
+        if state is not None:
+            with metrics.stage('save_state'):
+                state.close(save=not args.dry_run)
+    
+    display_summary(stats, args.dry_run)
+    if report is not None:
+        print(f"\n📄 Report saved: {args.report}")
+
+def display_outputs(args, report, journal, plan):
+    """
+    Print where the report, journal and plan of a run went, and what's next.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        report: ReportWriter of the run, or None
+        journal: MoveJournal of the run, or None
+        plan: PlanWriter of the run, or None
+    """
+    if report is not None:
+        logger.info("Report saved: %s", args.report)
+        print(f"\n📄 Report saved: {args.report}")
+    
+    if journal is not None:
+        print(f"📓 Journal saved: {args.journal} (undo with --undo {args.journal})")
+    
+    if plan is not None:
+        logger.info("Plan saved: %s (%d moves)", args.plan, plan.rows)
+        print(f"🗺️  Plan saved: {args.plan} ({plan.rows} moves)")
+        print(f"💡 Run with --apply-plan {args.plan} to carry it out\n")
+    elif args.dry_run:
+        print("💡 Run without --dry-run to actually organize files\n")
+    else:
+        print("✅ Done! Your files are organized! 🎉\n")
+
+def run_async(args, metrics=NULL_METRICS):
+    """
+    Organize a folder with the async engine (--engine async).
+    
+    Scanning, moving and report writing overlap, so the number of files
+    is only known once everything is done.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        metrics: Metrics to record stage timings and counters in
+    """
+    from pipeline import IN_FLIGHT
+    
+    folder_path = os.path.abspath(args.folder)
+    throttle = open_throttle(args)
+    
+    stats = RunStats()
+    report = open_report(args.report, stats)
+    sink = report if report is not None else stats
+    plan = None
+    if args.plan:
+        plan = PlanWriter(args.plan)
+        sink = SinkGroup([sink, plan])
+    journal = MoveJournal(args.journal) if args.journal else None
+    if journal is not None:
+        sink = SinkGroup([sink, journal])
+    if metrics.enabled:
+        sink = SinkGroup([sink, metrics])
+    
+    in_flight = args.in_flight or IN_FLIGHT
+    if args.dry_run:
+        print("\n📋 Preview...")
+    else:
+        print(f"\n⚡ Organizing files ({in_flight} calls in flight)...")
+    try:
+        with metrics.stage('pipeline'):
+            for operation in iter_operations(folder_path, Options.of(args), throttle=throttle):
+                sink.write(operation)
+    finally:
+        record_throttle(throttle, stats, metrics)
+        if report is not None:
+            with metrics.stage('report'):
+                report.close()
+        if plan is not None:
+            plan.close()
+        if journal is not None:
+            journal.close()
+    
+    logger.info("Scanned folder: %s, found %d files", folder_path, stats.total)
+    if not stats.total:
+        print("\n📭 No files found in this folder!")
+        return
+    
+    display_summary(stats, args.dry_run)
+    display_outputs(args, report, journal, plan)
+
+def run_plan(args, metrics=NULL_METRICS):
+    """
+    Apply a saved plan according to parsed command-line options.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        metrics: Metrics to record stage timings and counters in
+    """
+    print(f"\n🗺️  Applying plan: {args.apply_plan}")
+    
+    stats = RunStats()
+    report = open_report(args.report, stats)
+    sink = report if report is not None else stats
+    journal = MoveJournal(args.journal) if args.journal else None
+    if journal is not None:
+        sink = SinkGroup([sink, journal])
+    if metrics.enabled:
+        sink = SinkGroup([sink, metrics])
+    throttle = open_throttle(args)
+    
+    try:
+        with metrics.stage('apply'):
+            _, resumed = apply_plan(
+                args.apply_plan,
+                workers=args.workers,
+                per_device=args.per_device,
+                sink=sink,
+                throttle=throttle
+            )
+    except (OSError, ValueError) as e:
+        logger.error("Error reading plan %s: %s", args.apply_plan, e)
+        print(f"\n✗ Error: {e}")
+        return
+    finally:
+        record_throttle(throttle, stats, metrics)
+        if report is not None:
+            report.close()
+        if journal is not None:
+            journal.close()
+    
+    if resumed:
+        print(f"⏭️  {resumed} planned moves were already done by an earlier run")
+    
+    display_summary(stats)
+    if report is not None:
+        print(f"\n📄 Report saved: {args.report}")
+    print("✅ Done! Your files are organized! 🎉\n")
+
+def run_undo(args, metrics=NULL_METRICS):
+    """
+    Undo the moves in a journal according to parsed command-line options.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        metrics: Metrics to record stage timings and counters in
+    """
+    print(f"\n↩️  Undoing moves from: {args.undo}")
+    
+    stats = RunStats()
+    report = open_report(args.report, stats)
+    sink = report if report is not None else stats
+    if metrics.enabled:
+        sink = SinkGroup([sink, metrics])
+    throttle = open_throttle(args)
+    
+    try:
+        with metrics.stage('undo'):
+            undo_journal(
+                args.undo, workers=args.workers, per_device=args.per_device, sink=sink,
+                throttle=throttle
+            )
+    except (OSError, ValueError) as e:
+        logger.error("Error reading journal %s: %s", args.undo, e)
+        print(f"\n✗ Error: {e}")
+        return
+    finally:
+        record_throttle(throttle, stats, metrics)
+        if report is not None:
+            report.close()
+    
+    skipped = stats.total - stats.successful - stats.failed
+    print(f"\n↩️  Moved back: {stats.successful}")
+    if skipped:
+        print(f"⏭️  Left in place: {skipped} (see report for why)")
+    if stats.failed:
+        print(f"✗ Failed: {stats.failed}")
+    if stats.throttled:
+        print(f"🐢 Throttled: {stats.throttled:.1f}s of worker time spent waiting for the I/O budget")
+    if report is not None:
+        print(f"\n📄 Report saved: {args.report}")
+    print("✅ Done!\n")
+
+def run_batch(args, metrics=NULL_METRICS):
+    """
+    Organize many folders on a process pool according to parsed options.
+    
+    Each shard reports into its own part files; they are merged into one
+    report (and journal) in shard order, and the shard totals into one
+    summary. A failing shard is listed but doesn't stop the others.
+    
+    Args:
+        args: Namespace from the argument parser in main()
+        metrics: Metrics to record stage timings and counters in
+    """
+    import copy
+    import logging.handlers
+    import multiprocessing
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    roots = list(args.roots or [])
+    if args.jobs:
+        try:
+            roots.extend(load_jobs(args.jobs))
+        except OSError as e:
+            print(f"\n✗ Error: Cannot read jobs file: {e}")
+            return
+    
+    # One state index per folder can't be shared by several processes
+    split = not (args.incremental or args.rebuild_index)
+    try:
+        rules = open_rules(args.rules, '.')
+    except (OSError, ValueError) as e:
+        print(f"\n✗ Error: Invalid rules: {e}")
+        return
+    
+    with metrics.stage('plan_shards'):
+        shards = plan_shards(roots, args.recursive, args.max_depth, args.symlinks, split, rules)
+    processes = max(1, min(args.processes, len(shards)))
+    print(f"\n📁 Organizing {len(roots)} folders as {len(shards)} shards on {processes} processes")
+    
+    # The I/O budget is for the whole run, so each process gets an equal share
+    shard_args = copy.copy(args)
+    if args.max_bytes_per_sec:
+        shard_args.max_bytes_per_sec = args.max_bytes_per_sec / processes
+    if args.max_ops_per_sec:
+        shard_args.max_ops_per_sec = args.max_ops_per_sec / processes
+    
+    part_dir = tempfile.mkdtemp(prefix='organizer-batch-')
+    stats = RunStats()
+    errors = {}
+    
+    # Worker processes log through a queue to this process's log file
+    log_queue = multiprocessing.get_context('spawn').Queue()
+    file_handlers = [
+        handler for handler in logging.getLogger().handlers
+        if isinstance(handler, LazyQueueHandler)
+    ]
+    relay = logging.handlers.QueueListener(log_queue, *file_handlers)
+    relay.start()
+    
+    try:
+        with metrics.stage('shards'):
+            with ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_shard_process,
+                initargs=(log_queue, args.log_sample)
+            ) as pool:
+                futures = {
+                    pool.submit(organize_shard, shard, shard_args, part_dir, index): index
+                    for index, shard in enumerate(shards)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    index = futures[future]
+                    try:
+                        shard_stats, error = future.result()
+                        stats.merge(shard_stats)
+                    except Exception as e:
+                        error = f"worker process failed: {e}"
+                    if error is not None:
+                        errors[index] = error
+                    print(f"  {done}/{len(shards)} shards done", end='\r')
+        print()
+        metrics.count('shards', len(shards))
+        metrics.count('failed_shards', len(errors))
+        metrics.count('throttled_seconds', round(stats.throttled, 3))
         
-        generate_report(operations, args.report)
+        with metrics.stage('merge'):
+            report_dir = os.path.dirname(args.report)
+            try:
+                if report_dir:
+                    os.makedirs(report_dir, exist_ok=True)
+                with open_text(args.report, 'w') as output:
+                    merge_parts(
+                        [os.path.join(part_dir, f"report-{i}.csv") for i in range(len(shards))],
+                        output, ','.join(REPORT_FIELDS) + '\r\n'
+                    )
+                report_saved = True
+            except OSError as e:
+                logger.error("Error generating report: %s", e)
+                print(f"✗ Error saving report: {e}")
+                report_saved = False
+            
+            if args.journal:
+                journal = MoveJournal(args.journal)
+                journal.flush()
+                merge_parts(
+                    [os.path.join(part_dir, f"journal-{i}.csv") for i in range(len(shards))],
+                    journal.file, None
+                )
+                journal.close()
+    finally:
+        relay.stop()
+        shutil.rmtree(part_dir, ignore_errors=True)
+    
+    if errors:
+        print(f"\n✗ {len(errors)} shards failed:")
+        for index in sorted(errors):
+            print(f"  {shards[index][1]}: {errors[index]}")
+    
+    display_summary(stats, args.dry_run)
+    if report_saved:
+        print(f"\n📄 Report saved: {args.report}")
+    if args.journal:
+        print(f"📓 Journal saved: {args.journal} (undo with --undo {args.journal})")
     
     if args.dry_run:
         print("💡 Run without --dry-run to actually organize files\n")
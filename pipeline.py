@@ -0,0 +1,167 @@
+"""
+Async pipeline engine for File Organizer
+Runs stages as asyncio tasks connected by bounded queues, sends blocking
+calls to a thread pool under one in-flight limit, and hands the results
+to synchronous code
+"""
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Default for the most blocking calls running at once
+IN_FLIGHT = 32
+
+# Items a queue between two stages holds before the stage feeding it waits
+QUEUE_SIZE = 4
+
+# Batches of results waiting for a synchronous consumer
+RESULT_QUEUE_SIZE = 16
+
+# Seconds between checks for a consumer that stopped early
+STOP_POLL_INTERVAL = 0.1
+
+class PipelineStopped(Exception):
+    """Raised inside a pipeline whose consumer stopped reading."""
+
+class Failure:
+    """An exception on its way from the pipeline thread to the consumer."""
+    
+    def __init__(self, error):
+        self.error = error
+
+END = object()
+
+class Pipeline:
+    """
+    Concurrent stages with backpressure and one in-flight limit.
+    
+    Stages are coroutines that read from one bounded queue and write to
+    the next; None is put on a queue after the last item. A full queue
+    makes the stage feeding it wait, so a slow stage holds back the ones
+    before it instead of letting work pile up.
+    
+    Blocking calls go through submit() or call(), which run them on a
+    thread pool once one of in_flight slots is free; slots are shared by
+    every stage. write() runs calls one at a time, in order, on a thread
+    of their own (for reports).
+    """
+    
+    def __init__(self, in_flight=IN_FLIGHT):
+        """
+        Args:
+            in_flight: Most blocking calls running at once
+        """
+        if in_flight < 1:
+            raise ValueError(f"in_flight must be at least 1, not {in_flight}")
+        self.in_flight = in_flight
+        self.slots = None
+        self.executor = None
+        self.writer = None
+    
+    def queue(self, size=QUEUE_SIZE):
+        """Make a bounded queue to connect two stages."""
+        return asyncio.Queue(size)
+    
+    async def submit(self, func, *args):
+        """
+        Start a blocking call once a slot is free.
+        
+        Returns:
+            Future for the result; the slot is given back when it finishes
+        """
+        await self.slots.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+    
+    async def call(self, func, *args):
+        """Run a blocking call under the in-flight limit and wait for it."""
+        return await (await self.submit(func, *args))
+    
+    async def write(self, func, *args):
+        """Run a blocking call on the writer thread, after any earlier ones."""
+        return await asyncio.get_running_loop().run_in_executor(self.writer, func, *args)
+    
+    async def run(self, *stages):
+        """
+        Run stage coroutines together until all of them finish.
+        
+        If one fails, the others are cancelled and the error is raised
+        once calls already running have finished.
+        """
+        self.slots = asyncio.Semaphore(self.in_flight)
+        self.executor = ThreadPoolExecutor(self.in_flight, thread_name_prefix='organizer-io')
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='organizer-writer')
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            self.executor.shutdown(wait=True)
+            self.writer.shutdown(wait=True)
+
+def iterate(main, in_flight=IN_FLIGHT):
+    """
+    Run a pipeline on a background thread and yield what it emits.
+    
+    main is called as main(pipeline, emit) and must return a coroutine;
+    emit(items) blocks while the consumer is behind, so the pipeline never
+    runs more than a few batches ahead. Closing the generator early stops
+    the pipeline after the calls already running.
+    
+    Args:
+        main: Coroutine function that builds and runs the stages
+        in_flight: Most blocking calls running at once
+    
+    Yields:
+        Each item passed to emit, in order
+    """
+    results = queue.Queue(RESULT_QUEUE_SIZE)
+    stop = threading.Event()
+    
+    def emit(items):
+        while True:
+            if stop.is_set():
+                raise PipelineStopped()
+            try:
+                results.put(items, timeout=STOP_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+    
+    def target():
+        try:
+            asyncio.run(main(Pipeline(in_flight), emit))
+        except BaseException as e:
+            results.put(Failure(e))
+        else:
+            results.put(END)
+    
+    thread = threading.Thread(target=target, name='organizer-pipeline')
+    thread.start()
+    try:
+        while True:
+            items = results.get()
+            if items is END:
+                break
+            if isinstance(items, Failure):
+                raise items.error
+            yield from items
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=STOP_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        thread.join()
@@ -0,0 +1,309 @@
+"""
+Rule engine for File Organizer
+Sends files to other folders based on size, age, name and location
+"""
+
+import fnmatch
+import os
+import re
+import time
+
+# Keys a rule may have
+RULE_CONDITIONS = (
+    'category', 'min_size', 'max_size', 'older_than_days', 'newer_than_days',
+    'glob', 'regex', 'subdir'
+)
+
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+DAY_NS = 24 * 60 * 60 * 10 ** 9
+
+def parse_size(value):
+    """
+    Convert a size from a rule to bytes.
+    
+    Args:
+        value: Number of bytes, or a string like '2 GB' or '500MB'
+    
+    Returns:
+        Size in bytes
+    
+    Raises:
+        ValueError: If the string can't be parsed
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B)?\s*', value.upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) or 'B'])
+
+class Rule:
+    """
+    One compiled rule: a row of the decision table.
+    
+    Sizes and ages become plain integer bounds (None = no bound) and
+    name patterns become compiled regular expressions, so checking a
+    file is a few comparisons. Age bounds are relative to a point in
+    time and are moved forward with set_time().
+    """
+    
+    __slots__ = (
+        'destination', 'category', 'min_size', 'max_size', 'min_mtime_ns', 'max_mtime_ns',
+        'older_than_ns', 'newer_than_ns', 'name', 'subdir'
+    )
+    
+    def __init__(self, spec, now_ns):
+        """
+        Compile a rule from its configuration.
+        
+        Args:
+            spec: Dictionary from RULES or a rules file
+            now_ns: Current time in nanoseconds, for age conditions
+        
+        Raises:
+            ValueError: If the rule is invalid
+        """
+        unknown = set(spec) - set(RULE_CONDITIONS) - {'destination'}
+        if unknown:
+            raise ValueError(f"Unknown rule fields: {', '.join(sorted(unknown))}")
+        if not spec.get('destination'):
+            raise ValueError(f"Rule without a destination: {spec}")
+        if 'glob' in spec and 'regex' in spec:
+            raise ValueError(f"Rule has both glob and regex: {spec}")
+        
+        # Destinations are folders inside the organized folder
+        destination = spec['destination']
+        parts = destination.replace(os.sep, '/').split('/')
+        if os.path.isabs(destination) or os.path.splitdrive(destination)[0] or '..' in parts:
+            raise ValueError(f"Rule destination must be a folder inside the organized folder: "
+                             f"{destination!r}")
+        self.destination = '/'.join(part for part in parts if part not in ('', '.'))
+        if not self.destination:
+            raise ValueError(f"Rule destination must name a folder: {destination!r}")
+        
+        self.category = spec.get('category')
+        self.min_size = parse_size(spec['min_size']) if 'min_size' in spec else None
+        self.max_size = parse_size(spec['max_size']) if 'max_size' in spec else None
+        
+        self.older_than_ns = None
+        if 'older_than_days' in spec:
+            self.older_than_ns = int(spec['older_than_days'] * DAY_NS)
+        self.newer_than_ns = None
+        if 'newer_than_days' in spec:
+            self.newer_than_ns = int(spec['newer_than_days'] * DAY_NS)
+        self.set_time(now_ns)
+        
+        # A glob must match the whole name and ignores case, like extensions;
+        # a regex may match anywhere in the name
+        self.name = None
+        if 'glob' in spec:
+            self.name = re.compile(fnmatch.translate(spec['glob']), re.IGNORECASE).match
+        elif 'regex' in spec:
+            self.name = re.compile(spec['regex']).search
+        
+        self.subdir = None
+        if 'subdir' in spec:
+            self.subdir = re.compile(fnmatch.translate(spec['subdir'].strip('/'))).match
+    
+    def set_time(self, now_ns):
+        """
+        Measure ages from a new point in time.
+        
+        Args:
+            now_ns: Current time in nanoseconds
+        """
+        # Older than N days = modified at or before now - N days
+        self.max_mtime_ns = None
+        if self.older_than_ns is not None:
+            self.max_mtime_ns = now_ns - self.older_than_ns
+        self.min_mtime_ns = None
+        if self.newer_than_ns is not None:
+            self.min_mtime_ns = now_ns - self.newer_than_ns
+    
+    def matches(self, record, category, subdir):
+        """
+        Check one file against this rule.
+        
+        Args:
+            record: FileRecord
+            category: Category from classification
+            subdir: Source folder relative to the root ('' for the root)
+        """
+        if self.category is not None and category != self.category:
+            return False
+        if self.min_size is not None and record.size < self.min_size:
+            return False
+        if self.max_size is not None and record.size > self.max_size:
+            return False
+        if self.min_mtime_ns is not None and record.mtime_ns < self.min_mtime_ns:
+            return False
+        if self.max_mtime_ns is not None and record.mtime_ns > self.max_mtime_ns:
+            return False
+        if self.name is not None and not self.name(record.name):
+            return False
+        if self.subdir is not None and not self.subdir(subdir):
+            return False
+        return True
+
+class RuleTable:
+    """
+    Rules compiled once into a decision table and applied to batches.
+    
+    With NumPy installed, each rule's size, age and category conditions
+    are checked for a whole batch at once with array comparisons; name
+    and folder patterns are only tried on files still in the running.
+    Without NumPy, every file is checked rule by rule in Python. Both
+    give the same result: the first matching rule wins, and files no
+    rule matches keep their category.
+    """
+    
+    def __init__(self, rules, root, now=None, use_numpy=None):
+        """
+        Compile the rules.
+        
+        Args:
+            rules: List of rule dictionaries (see config.RULES)
+            root: Folder being organized (for subdir conditions)
+            now: Time to measure ages from, in seconds (default: the time
+                of each apply() call, so long watch sessions stay current)
+            use_numpy: True/False to force a path (default: NumPy if installed)
+        
+        Raises:
+            ValueError: If a rule is invalid
+        """
+        now_ns = time.time_ns() if now is None else int(now * 10 ** 9)
+        self.rules = [Rule(spec, now_ns) for spec in rules]
+        self.fixed_time = now is not None
+        self.uses_age = any(
+            rule.older_than_ns is not None or rule.newer_than_ns is not None
+            for rule in self.rules
+        )
+        self.root = os.path.abspath(root)
+        self.uses_subdir = any(rule.subdir is not None for rule in self.rules)
+        
+        self.numpy = None
+        if use_numpy is not False:
+            try:
+                import numpy
+                self.numpy = numpy
+            except ImportError:
+                if use_numpy:
+                    raise
+    
+    @property
+    def destinations(self):
+        """Folders rules can send files to."""
+        return [rule.destination for rule in self.rules]
+    
+    def subdir(self, path):
+        """Get a file's folder relative to the root, with '/' separators."""
+        folder = os.path.dirname(path)
+        if folder == self.root:
+            return ''
+        return os.path.relpath(folder, self.root).replace(os.sep, '/')
+    
+    def apply(self, records, categories):
+        """
+        Apply the rules to a batch.
+        
+        Args:
+            records: List of FileRecord
+            categories: Category of each record from classification
+        
+        Returns:
+            List of final categories (destinations), same order
+        """
+        if not self.rules or not records:
+            return categories
+        if self.uses_age and not self.fixed_time:
+            now_ns = time.time_ns()
+            for rule in self.rules:
+                rule.set_time(now_ns)
+        if self.numpy is not None:
+            return self.apply_arrays(records, categories)
+        return self.apply_python(records, categories)
+    
+    def apply_python(self, records, categories):
+        """Pure-Python path of apply()."""
+        result = list(categories)
+        rules = self.rules
+        for i, record in enumerate(records):
+            subdir = self.subdir(record.path) if self.uses_subdir else ''
+            for rule in rules:
+                if rule.matches(record, categories[i], subdir):
+                    result[i] = rule.destination
+                    break
+        return result
+    
+    def apply_arrays(self, records, categories):
+        """NumPy path of apply()."""
+        np = self.numpy
+        count = len(records)
+        sizes = np.fromiter((record.size for record in records), dtype=np.int64, count=count)
+        mtimes = np.fromiter((record.mtime_ns for record in records), dtype=np.int64, count=count)
+        
+        codes = {}
+        category_codes = np.fromiter(
+            (codes.setdefault(category, len(codes)) for category in categories),
+            dtype=np.int32, count=count
+        )
+        
+        undecided = np.ones(count, dtype=bool)
+        chosen = np.full(count, -1, dtype=np.int32)
+        subdirs = {}
+        
+        for number, rule in enumerate(self.rules):
+            match = undecided.copy()
+            if rule.category is not None:
+                match &= category_codes == codes.get(rule.category, -1)
+            if rule.min_size is not None:
+                match &= sizes >= rule.min_size
+            if rule.max_size is not None:
+                match &= sizes <= rule.max_size
+            if rule.min_mtime_ns is not None:
+                match &= mtimes >= rule.min_mtime_ns
+            if rule.max_mtime_ns is not None:
+                match &= mtimes <= rule.max_mtime_ns
+            
+            if rule.name is not None or rule.subdir is not None:
+                for i in np.flatnonzero(match):
+                    record = records[i]
+                    if rule.name is not None and not rule.name(record.name):
+                        match[i] = False
+                        continue
+                    if rule.subdir is not None:
+                        subdir = subdirs.get(i)
+                        if subdir is None:
+                            subdir = subdirs[i] = self.subdir(record.path)
+                        if not rule.subdir(subdir):
+                            match[i] = False
+            
+            chosen[match] = number
+            undecided &= ~match
+            if not undecided.any():
+                break
+        
+        result = list(categories)
+        for i in np.flatnonzero(chosen >= 0):
+            result[i] = self.rules[chosen[i]].destination
+        return result
+
+def load_rules(source=None):
+    """
+    Get rule dictionaries from config or a JSON file.
+    
+    Args:
+        source: None for config.RULES, a list of rules, or a JSON file path
+    
+    Returns:
+        List of rule dictionaries
+    """
+    if source is None:
+        from config import RULES
+        return RULES
+    if isinstance(source, str):
+        import json
+        with open(source, encoding='utf-8') as f:
+            return json.load(f)
+    return list(source)
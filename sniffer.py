@@ -0,0 +1,126 @@
+"""
+Content sniffing for File Organizer
+Classifies files with a missing or unknown extension by their first bytes
+"""
+
+import logging
+import os
+from config import CONTENT_SIGNATURES
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of each file (enough for the tar magic at 257)
+SNIFF_SIZE = 512
+
+def read_header(path, size=SNIFF_SIZE):
+    """
+    Read the first bytes of a file.
+    
+    Args:
+        path: File path
+        size: Number of bytes to read
+        
+    Returns:
+        Header bytes, or None if the file can't be read
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            return os.read(fd, size)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.error("Error reading header of %s: %s", path, e)
+        return None
+
+class ContentSniffer:
+    """
+    Match file headers against a signature table.
+    
+    Results are cached by (device, inode, mtime_ns) in memory and, when a
+    StateIndex is given, on disk (except on dry runs, where the index is
+    read-only), so a file is only read again after it changes.
+    """
+    
+    def __init__(self, signatures=CONTENT_SIGNATURES, state=None, workers=8,
+                 header_size=SNIFF_SIZE):
+        """
+        Set up the sniffer.
+        
+        Args:
+            signatures: List of (category, [(offset, bytes), ...])
+            state: Optional StateIndex used as a persistent cache
+            workers: Number of headers read in parallel
+            header_size: Bytes read from each file
+        """
+        self.signatures = signatures
+        self.state = state
+        self.workers = max(workers, 1)
+        self.header_size = header_size
+        self.cache = {}
+        self.files_read = 0
+    
+    def match(self, header):
+        """
+        Find the category for a file header.
+        
+        Args:
+            header: First bytes of a file
+            
+        Returns:
+            Category name, or None if no signature matches
+        """
+        for category, patterns in self.signatures:
+            for offset, magic in patterns:
+                if offset is None:
+                    if magic not in header:
+                        break
+                elif header[offset:offset + len(magic)] != magic:
+                    break
+            else:
+                return category
+        return None
+    
+    def sniff_many(self, records):
+        """
+        Classify a batch of files by content.
+        
+        Args:
+            records: List of FileRecord
+            
+        Returns:
+            List of category names (None where nothing matched)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        keys = [(record.device, record.inode, record.mtime_ns) for record in records]
+        missing = [key for key in keys if key not in self.cache]
+        
+        if missing and self.state is not None:
+            self.cache.update(self.state.sniffed_many(missing))
+        
+        to_read = {}
+        for record, key in zip(records, keys):
+            if key not in self.cache and key not in to_read:
+                to_read[key] = record
+        
+        if to_read:
+            read = lambda record: read_header(record.path, self.header_size)
+            if self.workers > 1 and len(to_read) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(to_read))) as pool:
+                    headers = list(pool.map(read, to_read.values()))
+            else:
+                headers = [read(record) for record in to_read.values()]
+            
+            found = {}
+            for key, header in zip(to_read, headers):
+                if header is None:
+                    continue
+                found[key] = self.match(header) or ''
+            
+            self.files_read += len(to_read)
+            self.cache.update(found)
+            if self.state is not None:
+                self.state.remember_sniffed(found)
+        
+        return [self.cache.get(key) or None for key in keys]
@@ -0,0 +1,303 @@
+"""
+Persistent state index for incremental runs
+Remembers files and folders seen by earlier runs in a small SQLite database
+"""
+
+import os
+
+# Hidden folder inside the organized folder that holds run state
+STATE_DIRNAME = '.organizer'
+INDEX_FILENAME = 'index.sqlite'
+
+# Rows looked up per SQL query (two variables each, SQLite allows 999)
+LOOKUP_CHUNK_SIZE = 400
+
+# Operations buffered before they are written to the database
+WRITE_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    category TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subfolders TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sniffed (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (device, inode, mtime_ns)
+);
+"""
+
+def open_database(path, schema, read_only=False):
+    """
+    Open a SQLite database and create its tables if missing.
+    
+    A read-only database (for dry runs) is never created or written: an
+    existing file is opened through a mode=ro URI, and a missing one, or
+    one without every table, is replaced by an empty database in memory.
+    
+    Args:
+        path: Database file, or None for an empty database in memory
+        schema: CREATE TABLE IF NOT EXISTS statements
+        read_only: If True, don't create or change the file
+    
+    Returns:
+        sqlite3.Connection
+    """
+    import sqlite3
+    from urllib.parse import quote
+    
+    if path is not None and not read_only:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path)
+        db.executescript(schema)
+        return db
+    
+    if path is not None and os.path.isfile(path):
+        db = None
+        try:
+            db = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+            db.executescript(schema)
+            return db
+        except sqlite3.OperationalError:
+            # Unreadable, or written by an older version without every table
+            if db is not None:
+                db.close()
+    
+    db = sqlite3.connect(':memory:')
+    db.executescript(schema)
+    return db
+
+def get_index_path(folder_path):
+    """
+    Get the location of the state index for an organized folder.
+    
+    Args:
+        folder_path: Folder being organized
+    
+    Returns:
+        Path to the SQLite file
+    """
+    return os.path.join(folder_path, STATE_DIRNAME, INDEX_FILENAME)
+
+class StateIndex:
+    """
+    On-disk memory of earlier runs, used to skip work on reruns.
+    
+    Files are keyed by (device, inode) and only trusted when size and
+    mtime still match. Folders are remembered with their mtime and
+    subfolder names: a folder whose mtime hasn't changed has had no
+    entries added or removed, so it doesn't need to be listed again.
+    
+    A read-only index (for dry runs) never touches the file: it is read
+    if it exists and nothing is written back.
+    """
+    
+    def __init__(self, folder_path, rebuild=False, read_only=False):
+        """
+        Open (or create) the index for a folder.
+        
+        Args:
+            folder_path: Folder being organized
+            rebuild: If True, forget everything stored so far
+            read_only: If True, don't create, rebuild or write the file;
+                a missing index or a rebuild starts from an empty one in memory
+        """
+        self.path = get_index_path(folder_path)
+        self.read_only = read_only
+        
+        # A rebuild preview starts from an empty index without touching the file
+        self.db = open_database(None if rebuild and read_only else self.path, SCHEMA, read_only)
+        if rebuild and not read_only:
+            self.db.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS folders; "
+                "DROP TABLE IF EXISTS sniffed;"
+            )
+            self.db.executescript(SCHEMA)
+        
+        self.pending = []
+        self.scanned = set()
+        self.skipped_files = 0
+        self.skipped_folders = 0
+    
+    def unchanged_folder(self, path, mtime_ns):
+        """
+        Check whether a folder is unchanged since the last run.
+        
+        Args:
+            path: Folder path
+            mtime_ns: Current st_mtime_ns of the folder
+        
+        Returns:
+            List of stored subfolder names if unchanged, otherwise None
+        """
+        row = self.db.execute(
+            "SELECT mtime_ns, subfolders FROM folders WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != mtime_ns:
+            self.scanned.add(path)
+            return None
+        
+        self.skipped_folders += 1
+        return row[1].split('\n') if row[1] else []
+    
+    def check_batch(self, records):
+        """
+        Split a batch of scanned files into new work and known files.
+        
+        Files left in place by an earlier run (failed or skipped) and not
+        changed since are dropped. Other known files keep their stored
+        category so they don't need to be classified again.
+        
+        Args:
+            records: List of FileRecord
+        
+        Returns:
+            Tuple of (records to process, dict of (device, inode) -> category)
+        """
+        stored = {}
+        for start in range(0, len(records), LOOKUP_CHUNK_SIZE):
+            chunk = records[start:start + LOOKUP_CHUNK_SIZE]
+            where = ' OR '.join(['(device = ? AND inode = ?)'] * len(chunk))
+            params = [value for record in chunk for value in (record.device, record.inode)]
+            for row in self.db.execute(
+                f"SELECT device, inode, size, mtime_ns, path, category, status FROM files WHERE {where}",
+                params
+            ):
+                stored[(row[0], row[1])] = row[2:]
+        
+        todo = []
+        categories = {}
+        for record in records:
+            key = (record.device, record.inode)
+            row = stored.get(key)
+            if row is None or row[0] != record.size or row[1] != record.mtime_ns:
+                todo.append(record)
+                continue
+            
+            size, mtime_ns, path, category, status = row
+            if path == record.path and status != 'Success':
+                self.skipped_files += 1
+                continue
+            
+            categories[key] = category
+            todo.append(record)
+        
+        return todo, categories
+    
+    def sniffed_many(self, keys):
+        """
+        Look up cached content-sniffing results.
+        
+        Args:
+            keys: List of (device, inode, mtime_ns)
+            
+        Returns:
+            Dictionary of key -> category ('' if nothing matched)
+        """
+        found = {}
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE // 2):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE // 2]
+            where = ' OR '.join(['(device = ? AND inode = ? AND mtime_ns = ?)'] * len(chunk))
+            params = [value for key in chunk for value in key]
+            for row in self.db.execute(
+                f"SELECT device, inode, mtime_ns, category FROM sniffed WHERE {where}", params
+            ):
+                found[row[:3]] = row[3]
+        return found
+    
+    def remember_sniffed(self, results):
+        """
+        Store content-sniffing results.
+        
+        These are a cache rather than decisions, so they are written
+        right away instead of at close(). A read-only index (dry run)
+        keeps nothing.
+        
+        Args:
+            results: Dictionary of (device, inode, mtime_ns) -> category
+        """
+        if self.read_only:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO sniffed VALUES (?, ?, ?, ?)",
+                [key + (category,) for key, category in results.items()]
+            )
+    
+    def write(self, operation):
+        """Remember the decision and outcome for one Operation."""
+        if self.read_only:
+            return
+        record = operation.record
+        self.pending.append((
+            record.device, record.inode, record.size, record.mtime_ns,
+            record.path, operation.category, operation.new_path, operation.status
+        ))
+        if len(self.pending) >= WRITE_BATCH_SIZE:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered operations to the database."""
+        if self.pending:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self.pending
+                )
+            self.pending.clear()
+    
+    def close(self, save=True):
+        """
+        Save folder state and close the database.
+        
+        Each scanned folder is stat'ed and then listed again. Its mtime is
+        only stored if no files are left in it: a leftover file could still
+        change without touching the folder mtime, and a file that arrived
+        during the run must be picked up next time.
+        
+        Args:
+            save: If False (e.g. dry run), close without writing anything
+        """
+        if not save or self.read_only:
+            self.db.close()
+            return
+        
+        self.flush()
+        folders = []
+        
+        for path in self.scanned:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+                subfolders = []
+                complete = True
+                
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            subfolders.append(entry.name)
+                        else:
+                            complete = False
+                            break
+            except OSError:
+                continue
+            
+            if complete:
+                folders.append((path, mtime_ns, '\n'.join(subfolders)))
+        
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", folders)
+        self.db.close()
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from backends import LocalBackend, partial_copy_path
+from organizer import FileRecord
+
+
+def scanned(path):
+    return FileRecord.from_stat(str(path), os.stat(path))
+
+
+@pytest.mark.parametrize('data', [b'grown since the scan', b'x'])
+def test_copy_refuses_source_changed_since_scan(tmp_path, data):
+    source = tmp_path / 'a.txt'
+    source.write_bytes(b'scanned')
+    record = scanned(source)
+    source.write_bytes(data)
+    os.utime(source, ns=(record.mtime_ns, record.mtime_ns + 1))
+    destination = tmp_path / 'dest' / 'a.txt'
+    destination.parent.mkdir()
+    
+    with pytest.raises(OSError):
+        LocalBackend().copy(record, str(destination))
+    assert not os.path.exists(partial_copy_path(record, str(destination)))
+    assert source.read_bytes() == data
+
+
+def test_copy_unchanged_source(tmp_path):
+    source = tmp_path / 'a.txt'
+    source.write_bytes(b'scanned')
+    destination = tmp_path / 'dest' / 'a.txt'
+    destination.parent.mkdir()
+    
+    LocalBackend().copy(scanned(source), str(destination))
+    assert destination.read_bytes() == b'scanned'
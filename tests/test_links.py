@@ -0,0 +1,21 @@
+import os
+
+import organizer
+from links import LinkManifest, get_manifest_path
+from organizer import Options
+
+
+def test_dry_run_manifest_creates_nothing(tmp_path):
+    manifest = LinkManifest(str(tmp_path), 'sym', dry_run=True)
+    manifest.close()
+    assert not os.path.exists(os.path.dirname(get_manifest_path(str(tmp_path))))
+
+
+def test_dry_run_link_mode_creates_nothing(tmp_path):
+    (tmp_path / 'a.jpg').write_text('a')
+    
+    operations = list(organizer.iter_operations(
+        str(tmp_path), Options(dry_run=True, link_mode='sym')))
+    
+    assert [op.status for op in operations] == ['Dry Run']
+    assert sorted(os.listdir(tmp_path)) == ['a.jpg']
@@ -0,0 +1,32 @@
+import tracemalloc
+
+import benchmark
+import organizer
+
+FILES = 25000
+MAX_MEMORY = 9
+
+
+def organize_peak(tmp_path, name, max_memory):
+    tree = tmp_path / name
+    tree.mkdir()
+    benchmark.generate_tree(str(tree), FILES, collisions=0.3)
+    options = organizer.Options(max_memory=max_memory, report=str(tmp_path / f"{name}.csv"))
+    
+    tracemalloc.start()
+    try:
+        result = organizer.organize(str(tree), options)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert result.stats.total == FILES
+    assert not [path for path in tree.iterdir() if path.is_file()]
+    return peak
+
+
+def test_max_memory_ceiling_holds(tmp_path):
+    ceiling = MAX_MEMORY * 1024 * 1024
+    assert organize_peak(tmp_path, 'bounded', MAX_MEMORY) <= ceiling
+    # Without the ceiling the same tree needs more, so the check means something
+    assert organize_peak(tmp_path, 'unbounded', None) > ceiling
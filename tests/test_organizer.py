@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import organizer
+from organizer import FileRecord, HeldOperations, Operation, Options
+
+
+def make_files(folder, names):
+    folder.mkdir(exist_ok=True)
+    for name in names:
+        (folder / name).write_text(name)
+
+
+@pytest.mark.parametrize('engine', ['sync', 'async'])
+def test_blocked_category_folder_fails_only_its_files(tmp_path, engine):
+    # A plain file where the Images folder should go
+    make_files(tmp_path, ['Images', 'a.jpg', 'b.txt'])
+    
+    operations = {op.record.name: op for op in organizer.iter_operations(
+        str(tmp_path), Options(engine=engine))}
+    
+    assert operations['a.jpg'].status.startswith('Error:')
+    assert operations['b.txt'].status == 'Success'
+    assert (tmp_path / 'a.jpg').exists()
+    assert (tmp_path / 'Documents' / 'b.txt').exists()
+
+
+def test_async_spilled_report_matches_sync(tmp_path, monkeypatch):
+    names = [f"file{i}.{ext}" for i in range(300) for ext in ('jpg', 'txt', 'mp3')]
+    make_files(tmp_path / 'sync', names)
+    make_files(tmp_path / 'async', names)
+    monkeypatch.setattr(HeldOperations.__init__, '__defaults__', (10,))
+    
+    def run(engine):
+        root = tmp_path / engine
+        return [(op.category, os.path.relpath(op.new_path, root), op.status)
+                for op in organizer.iter_operations(str(root), Options(engine=engine))]
+    
+    assert run('async') == run('sync')
+
+
+def test_held_operations_round_trip(tmp_path):
+    record = FileRecord(str(tmp_path / 'a'), 'a', 0, 0, 1, 1)
+    held = HeldOperations(limit=3)
+    added = []
+    try:
+        for i in range(10):
+            operation = Operation(record, 'Images' if i % 2 else 'Documents', str(i))
+            added.append(operation)
+            if held.add(operation):
+                held.spill()
+        assert held.folder is not None
+        for category in ('Images', 'Documents'):
+            got = [op.new_path for batch in held.batches(category) for op in batch]
+            assert got == [op.new_path for op in added if op.category == category]
+    finally:
+        held.close()
+    assert not os.path.exists(held.folder)
+
+
+def test_on_scan_summary(tmp_path):
+    make_files(tmp_path, ['a.jpg', 'b.txt'])
+    summaries = []
+    
+    list(organizer.iter_operations(str(tmp_path), Options(dry_run=True),
+                                   on_scan=summaries.append))
+    
+    assert [(s.files, s.scanned) for s in summaries] == [(2, 2)]
+    assert (tmp_path / 'a.jpg').exists()
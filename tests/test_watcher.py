@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import organizer
+import watcher
+
+
+def test_check_settled_symlink_policy(tmp_path):
+    target = tmp_path / 'a.txt'
+    target.write_text('a')
+    link = tmp_path / 'link.txt'
+    link.symlink_to(target)
+    
+    for symlinks, expected in (('ignore', []), ('files', [str(link)])):
+        held = {str(link): None}
+        organizer.check_settled(held, 0, {}, symlinks=symlinks)
+        ready = organizer.check_settled(held, 0, {}, symlinks=symlinks)
+        assert [record.path for record in ready] == expected
+        assert held == {}
+
+
+def test_inotify_max_depth(tmp_path):
+    (tmp_path / 'one' / 'two').mkdir(parents=True)
+    try:
+        inotify = watcher.InotifyWatcher(str(tmp_path), lambda: [], recursive=True, max_depth=1)
+    except OSError:
+        pytest.skip("inotify is not available")
+    try:
+        assert sorted(inotify.depths.items()) == [(str(tmp_path), 0),
+                                                  (str(tmp_path / 'one'), 1)]
+    finally:
+        inotify.close()
+
+
+def test_inotify_symlink_loop_watched_once(tmp_path):
+    (tmp_path / 'real').mkdir()
+    (tmp_path / 'loop').symlink_to(tmp_path)
+    try:
+        inotify = watcher.InotifyWatcher(str(tmp_path), lambda: [], recursive=True,
+                                         symlinks='follow')
+    except OSError:
+        pytest.skip("inotify is not available")
+    try:
+        # The link back to the root is the same folder, so it isn't watched twice
+        assert sorted(inotify.depths) == [str(tmp_path), str(tmp_path / 'real')]
+    finally:
+        inotify.close()
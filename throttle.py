@@ -0,0 +1,213 @@
+"""
+I/O throttling for File Organizer
+Token buckets that cap bytes and operations per second across all workers
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A throttled copy moves at most this many seconds' worth of bytes per chunk
+THROTTLE_SLICE = 0.1
+
+# Smallest chunk a throttled copy is split into
+MIN_CHUNK_SIZE = 256 * 1024
+
+# Adaptive mode: weight of each new latency sample, samples before the
+# best latency is trusted as a baseline, and seconds between rate changes
+LATENCY_SMOOTHING = 0.2
+LATENCY_WARMUP = 20
+ADAPT_INTERVAL = 1.0
+
+# Adaptive mode: latency ratio (against the baseline) that triggers a
+# back-off, ratio under which the rate recovers, and how fast each goes
+BACKOFF_RATIO = 2.0
+RECOVER_RATIO = 1.25
+BACKOFF_FACTOR = 0.5
+RECOVER_FACTOR = 1.2
+
+# Adaptive mode never goes below this share of the configured rates
+MIN_SCALE = 0.05
+
+class TokenBucket:
+    """
+    Tokens refill at a fixed rate, up to a burst allowance.
+    
+    Takers reserve tokens and are told how long to wait for them; the
+    bucket may go into debt, so a request bigger than the burst is never
+    stuck, it just waits longer. Callers serialize access.
+    """
+    
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Most tokens that can pile up while idle
+        """
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+    
+    def reserve(self, amount, now):
+        """
+        Take tokens.
+        
+        Args:
+            amount: Tokens wanted
+            now: Current time.monotonic()
+        
+        Returns:
+            Seconds to wait before using them
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class LatencyMonitor:
+    """Smoothed latency of one kind of I/O, compared with the best seen."""
+    
+    def __init__(self):
+        self.average = None
+        self.baseline = None
+        self.samples = 0
+    
+    def add(self, seconds):
+        """Add one latency sample."""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += LATENCY_SMOOTHING * (seconds - self.average)
+        self.samples += 1
+        if self.samples >= LATENCY_WARMUP and (self.baseline is None or self.average < self.baseline):
+            self.baseline = self.average
+    
+    def ratio(self):
+        """Current latency over the baseline (None until warmed up)."""
+        if not self.baseline:
+            return None
+        return self.average / self.baseline
+
+class Throttle:
+    """
+    Shared bytes-per-second and operations-per-second budgets.
+    
+    One Throttle is shared by every worker thread of a run. Each move
+    takes one operation token before it starts, and copies take byte
+    tokens chunk by chunk as data is written; renames and links move no
+    data, so they only count as operations.
+    
+    In adaptive mode, the latency of moves and copied chunks is watched:
+    when it climbs well above the best seen (the disk is busy), both
+    rates are halved, and they creep back up once latency recovers.
+    """
+    
+    def __init__(self, bytes_per_sec=None, ops_per_sec=None, burst=1.0, adaptive=False):
+        """
+        Args:
+            bytes_per_sec: Byte budget (None = unlimited)
+            ops_per_sec: Operation budget (None = unlimited)
+            burst: Seconds' worth of budget that can be used at once after
+                an idle spell
+            adaptive: If True, back off when latency rises
+        
+        Raises:
+            ValueError: If a budget or the burst isn't more than 0
+        """
+        if bytes_per_sec is not None and bytes_per_sec <= 0:
+            raise ValueError(f"bytes_per_sec must be more than 0, not {bytes_per_sec}")
+        if ops_per_sec is not None and ops_per_sec <= 0:
+            raise ValueError(f"ops_per_sec must be more than 0, not {ops_per_sec}")
+        if burst <= 0:
+            raise ValueError(f"burst must be more than 0, not {burst}")
+        
+        self.bytes_per_sec = bytes_per_sec
+        self.ops_per_sec = ops_per_sec
+        self.adaptive = adaptive
+        self.bytes = None
+        if bytes_per_sec is not None:
+            self.bytes = TokenBucket(bytes_per_sec, bytes_per_sec * burst)
+        self.ops = None
+        if ops_per_sec is not None:
+            self.ops = TokenBucket(ops_per_sec, max(ops_per_sec * burst, 1))
+        self.lock = threading.Lock()
+        
+        self.throttled = 0.0
+        self.waits = 0
+        self.scale = 1.0
+        self.lowest_scale = 1.0
+        self.monitors = {}
+        self.next_adapt = time.monotonic() + ADAPT_INTERVAL
+    
+    @property
+    def chunk_size(self):
+        """Bytes a throttled copy should move per call (None = no byte budget)."""
+        if self.bytes is None:
+            return None
+        return max(MIN_CHUNK_SIZE, int(self.bytes.rate * THROTTLE_SLICE))
+    
+    def _take(self, bucket, amount):
+        with self.lock:
+            delay = bucket.reserve(amount, time.monotonic())
+            if delay > 0:
+                self.throttled += delay
+                self.waits += 1
+        if delay > 0:
+            time.sleep(delay)
+    
+    def operation(self):
+        """Wait for an operation token."""
+        if self.ops is not None:
+            self._take(self.ops, 1)
+    
+    def transfer(self, size):
+        """Wait for byte tokens before copying size bytes."""
+        if self.bytes is not None and size > 0:
+            self._take(self.bytes, size)
+    
+    def observe(self, kind, seconds):
+        """
+        Report how long one piece of I/O took (adaptive mode only).
+        
+        Args:
+            kind: What was measured ('move' or 'copy'); each kind has its
+                own baseline, since a rename and a copied chunk take very
+                different times
+            seconds: Time it took
+        """
+        if not self.adaptive:
+            return
+        with self.lock:
+            monitor = self.monitors.get(kind)
+            if monitor is None:
+                monitor = self.monitors[kind] = LatencyMonitor()
+            monitor.add(seconds)
+            
+            now = time.monotonic()
+            if now < self.next_adapt:
+                return
+            self.next_adapt = now + ADAPT_INTERVAL
+            
+            ratios = [ratio for ratio in (m.ratio() for m in self.monitors.values()) if ratio]
+            if not ratios:
+                return
+            if max(ratios) > BACKOFF_RATIO:
+                scale = max(self.scale * BACKOFF_FACTOR, MIN_SCALE)
+            elif max(ratios) < RECOVER_RATIO:
+                scale = min(self.scale * RECOVER_FACTOR, 1.0)
+            else:
+                return
+            self._set_scale(scale)
+    
+    def _set_scale(self, scale):
+        if scale < self.scale:
+            logger.info("Disk latency is up, throttling to %d%% of the budget", scale * 100)
+        self.scale = scale
+        self.lowest_scale = min(self.lowest_scale, scale)
+        if self.bytes is not None:
+            self.bytes.rate = self.bytes_per_sec * scale
+        if self.ops is not None:
+            self.ops.rate = self.ops_per_sec * scale
@@ -0,0 +1,277 @@
+"""
+Folder watching for File Organizer
+Reports changed paths using inotify on Linux, or by polling elsewhere
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# inotify event flags (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+class InotifyWatcher:
+    """
+    Watch a folder with Linux inotify, called through ctypes.
+    
+    Only changed paths are reported, so the organizer never has to list
+    the whole folder again. If the kernel event queue overflows, every
+    file is reported once as a fallback. Subfolders are watched down to
+    max_depth, and symlinks are treated as in organizer.iter_files.
+    """
+    
+    def __init__(self, folder_path, scan, recursive=False, exclude=(), max_depth=None,
+                 symlinks='files'):
+        """
+        Start watching.
+        
+        Args:
+            folder_path: Folder to watch
+            scan: Callable returning FileRecords for the whole folder
+            recursive: If True, also watch subfolders
+            exclude: Folder names not to watch at the top level
+            max_depth: Deepest subfolder level to watch (None = no limit)
+            symlinks: 'files', 'ignore' or 'follow' (see organizer.iter_files)
+        
+        Raises:
+            OSError: If inotify is not available
+        """
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        self.folder_path = folder_path
+        self.scan = scan
+        self.recursive = recursive
+        self.exclude = set(exclude)
+        self.max_depth = max_depth
+        self.symlinks = symlinks
+        self.watches = {}
+        self.depths = {}
+        self.add_tree(folder_path, 0)
+    
+    def add_watch(self, path, depth):
+        """
+        Watch one folder, depth levels below the watched folder.
+        
+        Returns:
+            True if the folder is newly watched (or was moved); False if it
+            couldn't be watched or is already watched under another path
+            (a symlink loop)
+        """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            logger.error("Cannot watch %s: %s", path, os.strerror(error))
+            return False
+        previous = self.watches.get(wd)
+        if previous is not None:
+            try:
+                if os.path.samefile(previous, path):
+                    return False
+            except OSError:
+                pass
+            # The folder was moved; events now come from its new path
+            self.depths.pop(previous, None)
+        self.watches[wd] = path
+        self.depths[path] = depth
+        return True
+    
+    def descends(self, depth):
+        """Check whether subfolders of a folder at this depth are watched."""
+        return self.recursive and (self.max_depth is None or depth < self.max_depth)
+    
+    def add_tree(self, path, depth):
+        """
+        Watch a folder and, if recursive, its subfolders down to max_depth.
+        
+        Args:
+            path: Folder to watch
+            depth: Its level below the watched folder
+        
+        Returns:
+            List of files already inside newly watched subfolders
+        """
+        follow = self.symlinks == 'follow'
+        files = []
+        pending = [(path, depth)]
+        while pending:
+            folder, level = pending.pop()
+            if not self.add_watch(folder, level) or not self.descends(level):
+                continue
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_symlink() and self.symlinks == 'ignore':
+                            continue
+                        if entry.is_dir(follow_symlinks=follow):
+                            if folder == self.folder_path and entry.name in self.exclude:
+                                continue
+                            pending.append((entry.path, level + 1))
+                        elif folder != path:
+                            files.append(entry.path)
+            except OSError as e:
+                logger.error("Error scanning folder %s: %s", folder, e)
+        return files
+    
+    def poll(self, timeout):
+        """
+        Wait for changes.
+        
+        Args:
+            timeout: Seconds to wait for the first event
+        
+        Returns:
+            Set of file paths that were created or changed
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("Watch event queue overflowed, rescanning")
+                    changed.update(record.path for record in self.scan())
+                    continue
+                if mask & IN_IGNORED:
+                    folder = self.watches.pop(wd, None)
+                    self.depths.pop(folder, None)
+                    continue
+                
+                folder = self.watches.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                
+                is_dir = mask & IN_ISDIR or (
+                    self.symlinks == 'follow' and mask & (IN_CREATE | IN_MOVED_TO)
+                    and os.path.isdir(path)
+                )
+                if is_dir:
+                    depth = self.depths[folder]
+                    if self.descends(depth) and mask & (IN_CREATE | IN_MOVED_TO):
+                        if not (folder == self.folder_path and os.path.basename(path) in self.exclude):
+                            changed.update(self.add_tree(path, depth + 1))
+                    continue
+                
+                changed.add(path)
+        
+        return changed
+    
+    def close(self):
+        """Stop watching."""
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Watch a folder by scanning it at a fixed interval.
+    
+    Used where inotify is not available (macOS, Windows, some network
+    mounts). Each poll compares sizes and mtimes with the previous scan.
+    """
+    
+    def __init__(self, scan, interval=2.0):
+        """
+        Start watching.
+        
+        Args:
+            scan: Callable returning FileRecords for the whole folder
+            interval: Seconds between scans
+        """
+        self.scan = scan
+        self.interval = interval
+        self.snapshot = {record.path: (record.size, record.mtime_ns) for record in scan()}
+        self.next_scan = time.monotonic() + interval
+    
+    def poll(self, timeout):
+        """
+        Wait for changes.
+        
+        Args:
+            timeout: Max seconds to wait
+        
+        Returns:
+            Set of file paths that were created or changed
+        """
+        now = time.monotonic()
+        if now < self.next_scan:
+            time.sleep(min(timeout, self.next_scan - now))
+            if time.monotonic() < self.next_scan:
+                return set()
+        
+        snapshot = {record.path: (record.size, record.mtime_ns) for record in self.scan()}
+        changed = {
+            path for path, signature in snapshot.items()
+            if self.snapshot.get(path) != signature
+        }
+        self.snapshot = snapshot
+        self.next_scan = time.monotonic() + self.interval
+        return changed
+    
+    def close(self):
+        """Stop watching."""
+
+def open_watcher(folder_path, scan, recursive=False, exclude=(), interval=2.0, polling=False,
+                 max_depth=None, symlinks='files'):
+    """
+    Start watching a folder, preferring inotify.
+    
+    Polling relies on scan to apply the depth limit and symlink policy.
+    
+    Args:
+        folder_path: Folder to watch
+        scan: Callable returning FileRecords for the whole folder
+        recursive: If True, also watch subfolders
+        exclude: Folder names not to watch at the top level
+        interval: Seconds between scans when polling
+        polling: If True, always poll
+        max_depth: Deepest subfolder level to watch (None = no limit)
+        symlinks: 'files', 'ignore' or 'follow' (see organizer.iter_files)
+    
+    Returns:
+        InotifyWatcher or PollingWatcher
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(folder_path, scan, recursive, exclude, max_depth, symlinks)
+        except (OSError, AttributeError, TypeError) as e:
+            logger.info("inotify not available (%s), polling every %ss", e, interval)
+    return PollingWatcher(scan, interval)